@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark the NumPy simplifiers against the recursive Douglas-Peucker
+Runs on the real settlement rings (settlements_a1_viewer.geojson) and reports time,
+kept vertices and speedup per tolerance, plus Visvalingam and vertex-budget runs
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from coordinate_transform import (
+    ring_significance,
+    rings_to_ragged,
+    simplify_coordinates,
+    simplify_rings,
+)
+
+
+DEFAULT_GEOJSON = Path(__file__).resolve().parents[3] / 'derived' / 'settlements_a1_viewer.geojson'
+
+
+def recursive_simplify(coords: List[Tuple[float, float]],
+                       tolerance: float) -> List[Tuple[float, float]]:
+    """The former recursive simplify_coordinates, kept here as the baseline"""
+    if len(coords) < 3:
+        return coords
+    
+    def perpendicular_distance(point, line_start, line_end) -> float:
+        x0, y0 = point
+        x1, y1 = line_start
+        x2, y2 = line_end
+        if x1 == x2 and y1 == y2:
+            return ((x0 - x1)**2 + (y0 - y1)**2) ** 0.5
+        num = abs((y2 - y1) * x0 - (x2 - x1) * y0 + x2 * y1 - y2 * x1)
+        den = ((y2 - y1)**2 + (x2 - x1)**2) ** 0.5
+        return num / den
+    
+    def douglas_peucker(points, tol):
+        if len(points) < 3:
+            return points
+        max_dist = 0
+        max_index = 0
+        for i in range(1, len(points) - 1):
+            dist = perpendicular_distance(points[i], points[0], points[-1])
+            if dist > max_dist:
+                max_dist = dist
+                max_index = i
+        if max_dist > tol:
+            left = douglas_peucker(points[:max_index + 1], tol)
+            right = douglas_peucker(points[max_index:], tol)
+            return left[:-1] + right
+        return [points[0], points[-1]]
+    
+    return douglas_peucker(coords, tolerance)
+
+
+def load_rings(geojson_path: Path, densify: int = 0) -> List[List[Tuple[float, float]]]:
+    """
+    All polygon rings of a GeoJSON layer as lists of (x, y) tuples
+    
+    Args:
+        geojson_path: Polygon/MultiPolygon layer
+        densify: Extra vertices inserted evenly on every segment (emulates high-resolution borders)
+    """
+    with open(geojson_path, 'r', encoding='utf-8') as f:
+        features = json.load(f).get('features', [])
+    rings = []
+    for feature in features:
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') == 'Polygon':
+            polygons = [geometry['coordinates']]
+        elif geometry.get('type') == 'MultiPolygon':
+            polygons = geometry['coordinates']
+        else:
+            continue
+        for polygon in polygons:
+            for ring in polygon:
+                points = np.asarray(ring, dtype=np.float64)[:, :2]
+                if densify > 0 and len(points) > 1:
+                    steps = np.arange(densify + 1) / (densify + 1)
+                    segments = points[:-1, None, :] + (points[1:] - points[:-1])[:, None, :] * steps[None, :, None]
+                    points = np.vstack([segments.reshape(-1, 2), points[-1:]])
+                rings.append(list(map(tuple, points.tolist())))
+    return rings
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark NumPy simplifiers against the recursive Douglas-Peucker')
+    parser.add_argument('--geojson', type=Path, default=DEFAULT_GEOJSON,
+                        help='Polygon layer to take rings from (default: data/derived/settlements_a1_viewer.geojson)')
+    parser.add_argument('--tolerances', default='0.05,0.25,1.0',
+                        help='Comma-separated Douglas-Peucker tolerances (default: 0.05,0.25,1.0)')
+    parser.add_argument('--densify', type=int, default=0,
+                        help='Extra vertices per segment, to emulate high-resolution borders (default: 0)')
+    parser.add_argument('--max-vertices', type=int, default=16,
+                        help='Per-ring vertex budget for the budget runs (default: 16)')
+    args = parser.parse_args()
+    
+    if not args.geojson.exists():
+        print(f"ERROR: {args.geojson} not found", file=sys.stderr)
+        sys.exit(1)
+    
+    rings = load_rings(args.geojson, args.densify)
+    coords, offsets = rings_to_ragged(rings)
+    print(f"{len(rings)} rings, {len(coords)} vertices (longest {max(map(len, rings))}) from {args.geojson}")
+    print()
+    
+    print(f"{'tolerance':>10} {'kept':>8} {'recursive':>11} {'iterative':>11} {'batch':>9} {'speedup':>8}  match")
+    for tolerance in [float(t) for t in args.tolerances.split(',') if t.strip()]:
+        try:
+            baseline, baseline_seconds = timed(lambda: [recursive_simplify(r, tolerance) for r in rings])
+        except RecursionError:
+            baseline, baseline_seconds = None, float('nan')
+        iterative, iterative_seconds = timed(lambda: [simplify_coordinates(r, tolerance) for r in rings])
+        (batch, batch_offsets), batch_seconds = timed(simplify_rings, coords, offsets, tolerance, None, 'douglas_peucker', 0)
+        kept = len(batch)
+        match = baseline is None or (iterative == baseline and kept == sum(map(len, baseline)))
+        match_text = 'recursion limit' if baseline is None else ('yes' if match else 'NO')
+        print(f"{tolerance:>10g} {kept:>8} {baseline_seconds:>10.3f}s {iterative_seconds:>10.3f}s "
+              f"{batch_seconds:>8.3f}s {baseline_seconds / batch_seconds:>7.1f}x  {match_text}")
+    print()
+    
+    for method in ('douglas_peucker', 'visvalingam'):
+        significance, seconds = timed(ring_significance, coords, offsets, method)
+        (budgeted, _), budget_seconds = timed(simplify_rings, coords, offsets, None, args.max_vertices, method)
+        print(f"{method}: significance for all rings in {seconds:.3f}s; "
+              f"budget {args.max_vertices}/ring keeps {len(budgeted)} vertices in {budget_seconds:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
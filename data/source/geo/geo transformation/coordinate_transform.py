@@ -2,11 +2,177 @@
 """
 Coordinate Transformation Utilities
 Handles conversion between SVG coordinates and geographic lat/lng
+
+Coordinates can be given as lists of (x, y) tuples or as (N, 2) float64 NumPy
+arrays; arrays are transformed in one vectorized operation. Multi-ring inputs
+use the ragged layout of a flat (N, 2) coordinate array plus an offsets array
+(ring i is coords[offsets[i]:offsets[i + 1]]).
+
+The georeferencing transforms in data/derived/georef (svg_to_world_transform.json,
+world_to_svg_transform.json) are loaded with load_georef_transform or
+CoordinateTransformer.from_georef.
 """
 
-from typing import List, Tuple, Dict, Optional
+from pathlib import Path
+from typing import List, Tuple, Dict, Optional, Sequence, Union
+import heapq
+import json
 import math
 
+import numpy as np
+
+
+Coordinates = Union[np.ndarray, Sequence[Tuple[float, float]]]
+
+# Rows of anchor-distance matrix evaluated at once by ThinPlateSplineTransform
+TPS_CHUNK_SIZE = 16384
+
+EARTH_RADIUS_KM = 6371.0
+# Default bytes for the temporaries of one block of batch haversine distances
+HAVERSINE_MEMORY_BUDGET = 256 * 1024 * 1024
+# Block-sized arrays alive at once: two in _haversine plus the block the caller still holds
+HAVERSINE_BLOCK_TEMPORARIES = 3
+
+
+def as_coordinate_array(coords: Coordinates) -> np.ndarray:
+    """
+    Convert coordinates to a contiguous (N, 2) float64 array
+    
+    Args:
+        coords: (N, 2) array or sequence of (x, y) tuples
+    
+    Returns:
+        (N, 2) float64 array (the input itself if it already is one)
+    """
+    array = np.ascontiguousarray(coords, dtype=np.float64)
+    if array.size == 0:
+        return array.reshape(0, 2)
+    if array.ndim != 2 or array.shape[1] < 2:
+        raise ValueError(f"Expected (N, 2) coordinates, got shape {array.shape}")
+    return array[:, :2] if array.shape[1] > 2 else array
+
+
+def rings_to_ragged(rings: Sequence[Coordinates]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pack a sequence of rings into the ragged (coords, offsets) layout
+    
+    Args:
+        rings: Sequence of rings, each an (N, 2) array or list of (x, y) tuples
+    
+    Returns:
+        (flat (N, 2) coordinates, int64 offsets of length len(rings) + 1)
+    """
+    arrays = [as_coordinate_array(ring) for ring in rings]
+    offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(a) for a in arrays])
+    coords = np.concatenate(arrays) if arrays else np.empty((0, 2))
+    return coords, offsets
+
+
+def ragged_to_rings(coords: np.ndarray, offsets: np.ndarray) -> List[np.ndarray]:
+    """Split ragged (coords, offsets) back into one array per ring"""
+    return np.split(coords, offsets[1:-1])
+
+
+def _check_offsets(coords: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    offsets = np.asarray(offsets, dtype=np.int64)
+    if offsets.ndim != 1 or len(offsets) == 0 or offsets[0] != 0 or offsets[-1] != len(coords) or np.any(np.diff(offsets) < 0):
+        raise ValueError("offsets must start at 0, be non-decreasing and end at len(coords)")
+    return offsets
+
+
+class AffineTransform:
+    """
+    2D affine transform [x', y'] = M[:, :2] @ [x, y] + M[:, 2]
+    """
+    
+    method = 'affine'
+    
+    def __init__(self, matrix: Sequence[Sequence[float]]):
+        """
+        Args:
+            matrix: 2x3 matrix [[a, b, c], [d, e, f]] (x' = a*x + b*y + c, y' = d*x + e*y + f)
+        """
+        self.matrix = np.asarray(matrix, dtype=np.float64).reshape(2, 3)
+    
+    @classmethod
+    def from_params(cls, params: Sequence[float]) -> 'AffineTransform':
+        """Build from the flat [a, b, c, d, e, f] list used by the georef JSON files"""
+        return cls(np.asarray(params, dtype=np.float64).reshape(2, 3))
+    
+    def apply(self, coords: Coordinates) -> np.ndarray:
+        """Transform (N, 2) coordinates; returns a new (N, 2) array"""
+        points = as_coordinate_array(coords)
+        return points @ self.matrix[:, :2].T + self.matrix[:, 2]
+    
+    def inverse(self) -> 'AffineTransform':
+        """The inverse transform"""
+        linear = np.linalg.inv(self.matrix[:, :2])
+        return AffineTransform(np.column_stack([linear, -linear @ self.matrix[:, 2]]))
+
+
+class ThinPlateSplineTransform:
+    """
+    Thin plate spline f(p) = a0 + a1*x + a2*y + sum_i w_i * U(|p - p_i|), U(r) = r^2 log r,
+    as fitted by scripts/map/phase_h6_0_build_svg_to_world_georef.ts
+    and applied by scripts/map/lib/tps.ts
+    """
+    
+    method = 'tps'
+    
+    def __init__(self, pts: Sequence[Sequence[float]], wx: Sequence[float], wy: Sequence[float],
+                 ax: Sequence[float], ay: Sequence[float]):
+        self.pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+        self.weights = np.column_stack([np.asarray(wx, dtype=np.float64), np.asarray(wy, dtype=np.float64)])
+        # Affine part as a 3x2 matrix applied to [1, x, y]
+        self.affine = np.column_stack([np.asarray(ax, dtype=np.float64), np.asarray(ay, dtype=np.float64)])
+    
+    def apply(self, coords: Coordinates, chunk_size: int = TPS_CHUNK_SIZE) -> np.ndarray:
+        """
+        Transform (N, 2) coordinates; returns a new (N, 2) array
+        
+        The point-to-anchor kernel matrix is built chunk_size rows at a time, so memory
+        stays at chunk_size * anchor_count floats regardless of N.
+        """
+        points = as_coordinate_array(coords)
+        result = self.affine[0] + points @ self.affine[1:]
+        anchor_norms = np.einsum('ij,ij->i', self.pts, self.pts)
+        for start in range(0, len(points), chunk_size):
+            block = points[start:start + chunk_size]
+            # |p - c|^2 = |p|^2 + |c|^2 - 2 p.c, as one matrix product per chunk
+            r2 = np.einsum('ij,ij->i', block, block)[:, None] + anchor_norms[None, :] - 2.0 * (block @ self.pts.T)
+            np.maximum(r2, 0.0, out=r2)
+            # r^2 log r = r^2 log(r^2) / 2; U(r) = 0 for r < 1e-10 as in scripts/map/lib/tps.ts
+            kernel = np.zeros_like(r2)
+            np.log(r2, out=kernel, where=r2 >= 1e-20)
+            kernel *= 0.5 * r2
+            result[start:start + chunk_size] += kernel @ self.weights
+        return result
+
+
+def load_georef_transform(path: Union[str, Path]) -> Union[AffineTransform, ThinPlateSplineTransform]:
+    """
+    Load a georef transform JSON (data/derived/georef/*_transform.json)
+    
+    Args:
+        path: Path to svg_to_world_transform.json or world_to_svg_transform.json
+    
+    Returns:
+        ThinPlateSplineTransform for method 'tps', AffineTransform for method 'affine'
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    method = data.get('method')
+    coefficients = data.get('coefficients')
+    if method == 'tps':
+        return ThinPlateSplineTransform(
+            coefficients['pts'], coefficients['wx'], coefficients['wy'],
+            coefficients['ax'], coefficients['ay']
+        )
+    if method == 'affine' and coefficients:
+        return AffineTransform.from_params(coefficients)
+    raise ValueError(f"{path}: unsupported or empty transform (method {method!r})")
+
 
 class CoordinateTransformer:
     """
@@ -14,7 +180,8 @@ class CoordinateTransformer:
     """
     
     def __init__(self, svg_width: float = 1000, svg_height: float = 800,
-                 bbox: Optional[Dict[str, float]] = None):
+                 bbox: Optional[Dict[str, float]] = None,
+                 to_latlng=None, to_svg=None):
         """
         Initialize transformer with SVG dimensions and geographic bounds
         
@@ -22,6 +189,10 @@ class CoordinateTransformer:
             svg_width: Width of SVG canvas in pixels
             svg_height: Height of SVG canvas in pixels
             bbox: Geographic bounding box {min_lat, max_lat, min_lng, max_lng}
+            to_latlng: Optional SVG->lng/lat transform (AffineTransform or
+                ThinPlateSplineTransform) replacing the linear bbox mapping
+            to_svg: Optional lng/lat->SVG transform; defaults to the inverse of
+                the bbox mapping, or of to_latlng if that is affine
         """
         self.svg_width = svg_width
         self.svg_height = svg_height
@@ -36,6 +207,36 @@ class CoordinateTransformer:
         
         self.lat_range = self.bbox['max_lat'] - self.bbox['min_lat']
         self.lng_range = self.bbox['max_lng'] - self.bbox['min_lng']
+        
+        # Linear bbox mapping as a precomputed affine matrix (Y axis inverted)
+        self.matrix = np.array([
+            [self.lng_range / self.svg_width, 0.0, self.bbox['min_lng']],
+            [0.0, -self.lat_range / self.svg_height, self.bbox['min_lat'] + self.lat_range]
+        ])
+        self.georeferenced = to_latlng is not None or to_svg is not None
+        self.to_latlng = to_latlng or AffineTransform(self.matrix)
+        if to_svg is None:
+            if not isinstance(self.to_latlng, AffineTransform):
+                raise ValueError("to_svg is required when to_latlng is not affine")
+            to_svg = self.to_latlng.inverse()
+        self.to_svg = to_svg
+    
+    @classmethod
+    def from_georef(cls, georef_dir: Union[str, Path], **kwargs) -> 'CoordinateTransformer':
+        """
+        Transformer using the fitted georef transforms instead of the bbox mapping
+        
+        Args:
+            georef_dir: Directory holding svg_to_world_transform.json and
+                world_to_svg_transform.json (data/derived/georef)
+            **kwargs: Passed on to the constructor (svg_width, svg_height, bbox)
+        """
+        georef_dir = Path(georef_dir)
+        return cls(
+            to_latlng=load_georef_transform(georef_dir / 'svg_to_world_transform.json'),
+            to_svg=load_georef_transform(georef_dir / 'world_to_svg_transform.json'),
+            **kwargs
+        )
     
     def svg_to_latlng(self, x: float, y: float) -> Tuple[float, float]:
         """
@@ -48,6 +249,10 @@ class CoordinateTransformer:
         Returns:
             (longitude, latitude) tuple
         """
+        if self.georeferenced:
+            lng, lat = self.to_latlng.apply([(x, y)])[0]
+            return (float(lng), float(lat))
+        
         # Normalize to 0-1 range
         norm_x = x / self.svg_width
         norm_y = 1 - (y / self.svg_height)  # Invert Y axis
@@ -69,6 +274,10 @@ class CoordinateTransformer:
         Returns:
             (x, y) SVG coordinate tuple
         """
+        if self.georeferenced:
+            x, y = self.to_svg.apply([(lng, lat)])[0]
+            return (float(x), float(y))
+        
         # Normalize to 0-1 range
         norm_lng = (lng - self.bbox['min_lng']) / self.lng_range
         norm_lat = (lat - self.bbox['min_lat']) / self.lat_range
@@ -79,22 +288,70 @@ class CoordinateTransformer:
         
         return (x, y)
     
-    def transform_coordinates(self, coords: List[Tuple[float, float]], 
-                            to_latlng: bool = True) -> List[Tuple[float, float]]:
+    def transform_coordinates(self, coords: Coordinates, 
+                            to_latlng: bool = True) -> Coordinates:
         """
-        Transform a list of coordinates
+        Transform a list or array of coordinates in one vectorized operation
         
         Args:
-            coords: List of (x,y) or (lng,lat) tuples
+            coords: (N, 2) array, or list of (x,y) or (lng,lat) tuples
             to_latlng: If True, convert SVG->lat/lng; if False, convert lat/lng->SVG
             
         Returns:
-            List of transformed coordinates
+            (N, 2) float64 array for array input, list of tuples otherwise
         """
-        if to_latlng:
-            return [self.svg_to_latlng(x, y) for x, y in coords]
-        else:
-            return [self.latlng_to_svg(lng, lat) for lng, lat in coords]
+        transform = self.to_latlng if to_latlng else self.to_svg
+        result = transform.apply(coords)
+        if isinstance(coords, np.ndarray):
+            return result
+        return list(map(tuple, result.tolist()))
+    
+    def transform_ragged(self, coords: Coordinates, offsets: Sequence[int],
+                         to_latlng: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Transform multi-ring coordinates in the ragged (coords, offsets) layout
+        
+        Args:
+            coords: Flat (N, 2) coordinates of all rings
+            offsets: Ring offsets into coords (length ring_count + 1)
+            to_latlng: If True, convert SVG->lat/lng; if False, convert lat/lng->SVG
+        
+        Returns:
+            (transformed (N, 2) coordinates, int64 offsets)
+        """
+        points = as_coordinate_array(coords)
+        offsets = _check_offsets(points, offsets)
+        transform = self.to_latlng if to_latlng else self.to_svg
+        return transform.apply(points), offsets
+    
+    def transform_geojson(self, obj: Dict, to_latlng: bool = True) -> Dict:
+        """
+        Reproject a GeoJSON FeatureCollection, Feature or geometry
+        
+        All positions are gathered into one array and transformed in a single call;
+        a new object is returned (properties are shared, not copied).
+        
+        Args:
+            obj: GeoJSON dict
+            to_latlng: If True, convert SVG->lat/lng; if False, convert lat/lng->SVG
+        
+        Returns:
+            GeoJSON dict of the same shape with transformed coordinates
+        """
+        positions, sequences = _collect_positions(obj)
+        transform = self.to_latlng if to_latlng else self.to_svg
+        transformed = transform.apply(positions)
+        rows = []
+        start = 0
+        for sequence in sequences:
+            stop = start + len(sequence)
+            if sequence.shape[1] > 2:
+                # Keep extra ordinates (e.g. elevation)
+                rows.append(np.column_stack([transformed[start:stop], sequence[:, 2:]]).tolist())
+            else:
+                rows.append(transformed[start:stop].tolist())
+            start = stop
+        return _replace_positions(obj, iter(rows))
     
     def get_bounds_info(self) -> Dict:
         """Return information about current coordinate bounds"""
@@ -109,6 +366,99 @@ class CoordinateTransformer:
         }
 
 
+# Nesting depth of the position sequences in each GeoJSON geometry type's coordinates
+_SEQUENCE_DEPTH = {
+    'Point': 0,
+    'MultiPoint': 1,
+    'LineString': 1,
+    'MultiLineString': 2,
+    'Polygon': 2,
+    'MultiPolygon': 3,
+}
+
+
+def _geometries(obj):
+    """Yield the non-collection geometries of a GeoJSON object, in document order"""
+    if not isinstance(obj, dict):
+        return
+    kind = obj.get('type')
+    if kind == 'FeatureCollection':
+        for feature in obj.get('features', []):
+            yield from _geometries(feature)
+    elif kind == 'Feature':
+        yield from _geometries(obj.get('geometry'))
+    elif kind == 'GeometryCollection':
+        for geometry in obj.get('geometries', []):
+            yield from _geometries(geometry)
+    elif kind in _SEQUENCE_DEPTH and obj.get('coordinates') is not None:
+        yield obj
+
+
+def _position_sequences(coords, depth: int):
+    """Yield the innermost position lists (rings, lines) of a coordinates value"""
+    if depth <= 1:
+        yield coords
+    else:
+        for item in coords:
+            yield from _position_sequences(item, depth - 1)
+
+
+def _position_array(sequence) -> np.ndarray:
+    """One position sequence as a (n, dims) array; empty sequences (empty geometries) are (0, 2)"""
+    if not len(sequence):
+        return np.empty((0, 2))
+    return np.asarray(sequence, dtype=np.float64).reshape(len(sequence), -1)
+
+
+def _collect_positions(obj) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Gather every position of a GeoJSON object into one (N, 2) array
+    
+    Returns:
+        (positions, per-sequence arrays in document order; extra ordinates are kept
+        in the per-sequence arrays only)
+    """
+    sequences = []
+    for geometry in _geometries(obj):
+        depth = _SEQUENCE_DEPTH[geometry['type']]
+        if depth == 0:
+            sequences.append(_position_array([geometry['coordinates']] if len(geometry['coordinates']) else []))
+            continue
+        for sequence in _position_sequences(geometry['coordinates'], depth):
+            sequences.append(_position_array(sequence))
+    if not sequences:
+        return np.empty((0, 2)), sequences
+    return np.concatenate([sequence[:, :2] for sequence in sequences]), sequences
+
+
+def _replace_coordinates(coords, depth: int, rows):
+    if depth <= 1:
+        return next(rows)
+    return [_replace_coordinates(item, depth - 1, rows) for item in coords]
+
+
+def _replace_positions(obj, rows):
+    """Copy of a GeoJSON object whose position sequences are taken, in document order, from rows"""
+    if not isinstance(obj, dict):
+        return obj
+    kind = obj.get('type')
+    result = dict(obj)
+    if kind == 'FeatureCollection':
+        result['features'] = [_replace_positions(feature, rows) for feature in obj.get('features', [])]
+    elif kind == 'Feature':
+        result['geometry'] = _replace_positions(obj.get('geometry'), rows)
+    elif kind == 'GeometryCollection':
+        result['geometries'] = [_replace_positions(geometry, rows) for geometry in obj.get('geometries', [])]
+    elif kind in _SEQUENCE_DEPTH and obj.get('coordinates') is not None:
+        depth = _SEQUENCE_DEPTH[kind]
+        if depth == 0:
+            row = next(rows)
+            result['coordinates'] = row[0] if row else []
+        else:
+            result['coordinates'] = _replace_coordinates(obj['coordinates'], depth, rows)
+    return result
+
+
 class BoundsCalculator:
     """Calculate geographic bounds from coordinate sets"""
     
@@ -199,11 +549,471 @@ def haversine_distance(coord1: Tuple[float, float],
     return c * r
 
 
+def _haversine_inputs(coords: Coordinates, dtype,
+                      origin: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (lat, lng relative to origin in radians, cos lat, origin) of (lng, lat) coordinates in dtype
+    
+    Only differences of lat/lng enter the formula, so both sides are shifted by the same
+    origin (default: mean of these coordinates); float32 then keeps its precision for the
+    small differences instead of spending it on the absolute angle.
+    """
+    points = np.radians(as_coordinate_array(coords))
+    if origin is None:
+        origin = points.mean(axis=0) if len(points) else np.zeros(2)
+    relative = (points - origin).astype(dtype, copy=False)
+    return relative[:, 1], relative[:, 0], np.cos(points[:, 1]).astype(dtype, copy=False), origin
+
+
+def _haversine(lat1, lng1, cos1, lat2, lng2, cos2) -> np.ndarray:
+    """Broadcasting haversine core with at most two result-sized temporaries; returns kilometers"""
+    a = np.subtract(lat2, lat1)
+    a *= 0.5
+    np.sin(a, out=a)
+    a *= a
+    b = np.subtract(lng2, lng1)
+    b *= 0.5
+    np.sin(b, out=b)
+    b *= b
+    b *= cos1
+    b *= cos2
+    a += b
+    del b
+    np.clip(a, 0.0, 1.0, out=a)
+    np.sqrt(a, out=a)
+    np.arcsin(a, out=a)
+    a *= 2 * EARTH_RADIUS_KM
+    return a
+
+
+def haversine_block_rows(column_count: int, memory_budget: int = HAVERSINE_MEMORY_BUDGET,
+                         dtype=np.float64) -> int:
+    """
+    Rows of an (rows, column_count) distance block that fit in memory_budget bytes
+    
+    A block needs HAVERSINE_BLOCK_TEMPORARIES arrays of its size alive at once.
+    """
+    per_row = max(1, column_count) * np.dtype(dtype).itemsize * HAVERSINE_BLOCK_TEMPORARIES
+    return max(1, int(memory_budget // per_row))
+
+
+def haversine_paired(coords1: Coordinates, coords2: Coordinates, dtype=np.float64) -> np.ndarray:
+    """
+    Distance between coords1[i] and coords2[i] for every row (e.g. the two ends of an edge list)
+    
+    Args:
+        coords1: (N, 2) array or list of (lng, lat)
+        coords2: (N, 2) array or list of (lng, lat)
+        dtype: np.float64 or np.float32 (halves memory, ~1e-7 relative error)
+    
+    Returns:
+        (N,) distances in kilometers
+    """
+    lat1, lng1, cos1, origin = _haversine_inputs(coords1, dtype)
+    lat2, lng2, cos2, _ = _haversine_inputs(coords2, dtype, origin)
+    if len(lat1) != len(lat2):
+        raise ValueError(f"Paired inputs differ in length: {len(lat1)} vs {len(lat2)}")
+    return _haversine(lat1, lng1, cos1, lat2, lng2, cos2)
+
+
+def iter_haversine_blocks(coords1: Coordinates, coords2: Optional[Coordinates] = None,
+                          memory_budget: int = HAVERSINE_MEMORY_BUDGET,
+                          dtype=np.float64):
+    """
+    All-pairs distances as row blocks, never holding more than memory_budget bytes of temporaries
+    
+    Args:
+        coords1: (N, 2) array or list of (lng, lat)
+        coords2: (M, 2) array or list of (lng, lat); None means coords1
+        memory_budget: Bytes available for one block and its temporaries
+        dtype: np.float64 or np.float32
+    
+    Yields:
+        (row_start, (rows, M) block of distances in kilometers)
+    """
+    lat1, lng1, cos1, origin = _haversine_inputs(coords1, dtype)
+    lat2, lng2, cos2, _ = (lat1, lng1, cos1, origin) if coords2 is None else _haversine_inputs(coords2, dtype, origin)
+    rows = haversine_block_rows(len(lat2), memory_budget, dtype)
+    for start in range(0, len(lat1), rows):
+        stop = start + rows
+        yield start, _haversine(
+            lat1[start:stop, None], lng1[start:stop, None], cos1[start:stop, None],
+            lat2[None, :], lng2[None, :], cos2[None, :]
+        )
+
+
+def haversine_matrix(coords1: Coordinates, coords2: Optional[Coordinates] = None,
+                     memory_budget: int = HAVERSINE_MEMORY_BUDGET,
+                     dtype=np.float64) -> np.ndarray:
+    """
+    Full (N, M) distance matrix in kilometers
+    
+    The result itself is N * M * itemsize bytes; only the temporaries are bounded by
+    memory_budget. Use iter_haversine_blocks or haversine_within when N * M is too
+    large to hold.
+    """
+    n = len(as_coordinate_array(coords1))
+    m = n if coords2 is None else len(as_coordinate_array(coords2))
+    result = np.empty((n, m), dtype=dtype)
+    for start, block in iter_haversine_blocks(coords1, coords2, memory_budget, dtype):
+        result[start:start + len(block)] = block
+    return result
+
+
+def _latitude_band(sorted_lat: np.ndarray, lat_min: float, lat_max: float, reach: float) -> Tuple[int, int]:
+    """Index range of sorted_lat within reach of [lat_min, lat_max]"""
+    return (int(np.searchsorted(sorted_lat, lat_min - reach, side='left')),
+            int(np.searchsorted(sorted_lat, lat_max + reach, side='right')))
+
+
+def haversine_within(coords1: Coordinates, coords2: Optional[Coordinates] = None,
+                     radius_km: float = 10.0, k: Optional[int] = None,
+                     memory_budget: int = HAVERSINE_MEMORY_BUDGET,
+                     dtype=np.float64) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pairs within radius_km (optionally only the k nearest per query point)
+    
+    Targets are sorted by latitude, so each block of query rows (also taken in latitude
+    order) is only compared with the latitude band radius_km can reach; blocks are
+    sized to memory_budget as in iter_haversine_blocks.
+    
+    Args:
+        coords1: (N, 2) query points (lng, lat)
+        coords2: (M, 2) target points (lng, lat); None means coords1, without self pairs
+        radius_km: Search radius in kilometers
+        k: Keep at most the k nearest targets per query point (None keeps all)
+        memory_budget: Bytes available for one block and its temporaries
+        dtype: np.float64 or np.float32
+    
+    Returns:
+        (query indices, target indices, distances in km) sorted by query, distance, target
+    """
+    if radius_km < 0:
+        raise ValueError("radius_km must be non-negative")
+    if k is not None and k < 1:
+        raise ValueError("k must be at least 1")
+    lat1, lng1, cos1, origin = _haversine_inputs(coords1, dtype)
+    lat2, lng2, cos2, _ = (lat1, lng1, cos1, origin) if coords2 is None else _haversine_inputs(coords2, dtype, origin)
+    
+    query_order = np.argsort(lat1, kind='stable')
+    target_order = np.argsort(lat2, kind='stable')
+    target_lat = lat2[target_order]
+    # Latitude reach of the radius (plus a little slack for float32 rounding)
+    reach = radius_km / EARTH_RADIUS_KM * (1 + 1e-6) + 1e-9
+    
+    found_q = []
+    found_t = []
+    found_d = []
+    start = 0
+    while start < len(query_order):
+        # Double the block while the latitude band it needs still fits in the budget
+        rows = 1
+        while start + rows < len(query_order):
+            grown = min(2 * rows, len(query_order) - start)
+            lo, hi = _latitude_band(target_lat, lat1[query_order[start]], lat1[query_order[start + grown - 1]], reach)
+            if grown > haversine_block_rows(hi - lo, memory_budget, dtype):
+                break
+            rows = grown
+        queries = query_order[start:start + rows]
+        lo, hi = _latitude_band(target_lat, lat1[queries[0]], lat1[queries[-1]], reach)
+        start += rows
+        if hi <= lo:
+            continue
+        targets = target_order[lo:hi]
+        distances = _haversine(
+            lat1[queries, None], lng1[queries, None], cos1[queries, None],
+            lat2[None, targets], lng2[None, targets], cos2[None, targets]
+        )
+        inside = distances <= radius_km
+        if coords2 is None:
+            inside &= queries[:, None] != targets[None, :]
+        qi, ti = np.nonzero(inside)
+        q, t, d = _sorted_hits(queries[qi], targets[ti], distances[qi, ti], k)
+        found_q.append(q)
+        found_t.append(t)
+        found_d.append(d)
+    
+    q = np.concatenate(found_q) if found_q else np.empty(0, dtype=np.int64)
+    t = np.concatenate(found_t) if found_t else np.empty(0, dtype=np.int64)
+    d = np.concatenate(found_d) if found_d else np.empty(0, dtype=dtype)
+    # Every query lies in exactly one block, so k was already applied per block
+    return _sorted_hits(q, t, d, None)
+
+
+def _sorted_hits(q: np.ndarray, t: np.ndarray, d: np.ndarray, k: Optional[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sort hits by (query, distance, target) and keep the first k per query (None keeps all)"""
+    order = np.lexsort((t, d, q))
+    q, t, d = q[order], t[order], d[order]
+    if k is not None and len(q):
+        # Rank within each query's run of hits
+        run_start = np.flatnonzero(np.r_[True, q[1:] != q[:-1]])
+        rank = np.arange(len(q)) - np.repeat(run_start, np.diff(np.r_[run_start, len(q)]))
+        keep = rank < k
+        q, t, d = q[keep], t[keep], d[keep]
+    return q, t, d
+
+
+SIMPLIFY_METHODS = ('douglas_peucker', 'visvalingam')
+# Lines at least this long are simplified with NumPy; shorter ones with a plain loop
+SIMPLIFY_VECTORIZE_MIN = 256
+
+
+def _douglas_peucker_indices(coords: Sequence[Tuple[float, float]], tolerance: float) -> List[int]:
+    """
+    Indices kept by Douglas-Peucker, iteratively with an explicit stack of index ranges
+    (no recursion, no slicing copies); used for short lines
+    """
+    keep = [0]
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        first, last = stack.pop()
+        x1, y1 = coords[first][0], coords[first][1]
+        x2, y2 = coords[last][0], coords[last][1]
+        dx = x2 - x1
+        dy = y2 - y1
+        den = math.sqrt(dx * dx + dy * dy)
+        max_dist = 0
+        max_index = first
+        for i in range(first + 1, last):
+            x0, y0 = coords[i][0], coords[i][1]
+            if den == 0:
+                dist = math.sqrt((x0 - x1)**2 + (y0 - y1)**2)
+            else:
+                dist = abs(dy * x0 - dx * y0 + x2 * y1 - y2 * x1) / den
+            if dist > max_dist:
+                max_dist = dist
+                max_index = i
+        if max_dist > tolerance:
+            # Right half pushed first so the left half is finished first
+            stack.append((max_index, last))
+            stack.append((first, max_index))
+        else:
+            keep.append(last)
+    return keep
+
+
+def _douglas_peucker_ragged(coords: np.ndarray, offsets: np.ndarray,
+                            tolerance: float = 0.0) -> np.ndarray:
+    """
+    Douglas-Peucker significance of every vertex of every line in the ragged layout
+    
+    Iterative and level-synchronous: each pass takes all pending segments of all lines,
+    computes the perpendicular distances of their interior vertices in one vectorized
+    operation and splits every segment at its farthest vertex. A vertex's significance
+    is the largest tolerance at which Douglas-Peucker keeps it; endpoints are inf.
+    Segments whose farthest vertex is within tolerance are not split further, exactly
+    where the recursive algorithm stops; their interior vertices stay at 0.
+    """
+    significance = np.zeros(len(coords))
+    lengths = np.diff(offsets)
+    significance[offsets[:-1][lengths > 0]] = np.inf
+    significance[offsets[1:][lengths > 0] - 1] = np.inf
+    
+    lines = lengths >= 3
+    start = offsets[:-1][lines]
+    end = offsets[1:][lines] - 1
+    parent = np.full(len(start), np.inf)
+    x = coords[:, 0]
+    y = coords[:, 1]
+    while len(start):
+        interior = end - start - 1
+        segment = np.repeat(np.arange(len(start)), interior)
+        first = np.cumsum(interior) - interior
+        index = start[segment] + 1 + (np.arange(len(segment)) - first[segment])
+        
+        x1 = x[start][segment]
+        y1 = y[start][segment]
+        x2 = x[end][segment]
+        y2 = y[end][segment]
+        dx = x2 - x1
+        dy = y2 - y1
+        den = np.hypot(dx, dy)
+        num = np.abs(dy * x[index] - dx * y[index] + x2 * y1 - y2 * x1)
+        # Degenerate segment (closed ring): distance to the shared endpoint
+        distance = np.where(
+            den > 0,
+            num / np.where(den > 0, den, 1.0),
+            np.hypot(x[index] - x1, y[index] - y1)
+        )
+        
+        # First farthest vertex per segment
+        farthest = np.maximum.reduceat(distance, first)
+        hits = np.flatnonzero(distance == farthest[segment])
+        hits = hits[np.r_[True, segment[hits][1:] != segment[hits][:-1]]]
+        split = index[hits]
+        # Clamp to the parent so significance never increases down the split tree
+        value = np.minimum(farthest, parent)
+        significance[split] = value
+        
+        start, end, parent = (
+            np.concatenate([start, split]),
+            np.concatenate([split, end]),
+            np.concatenate([value, value])
+        )
+        pending = (end - start >= 2) & (parent > tolerance)
+        start, end, parent = start[pending], end[pending], parent[pending]
+    return significance
+
+
+def _triangle_areas(x: np.ndarray, y: np.ndarray, a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    return 0.5 * np.abs(x[a] * (y[b] - y[c]) + x[b] * (y[c] - y[a]) + x[c] * (y[a] - y[b]))
+
+
+def _visvalingam_line(coords: np.ndarray) -> np.ndarray:
+    """
+    Visvalingam-Whyatt effective area of every vertex of one line (endpoints inf)
+    
+    Vertices are eliminated smallest area first from a heap over a linked list, and
+    each neighbour's area is recomputed after an elimination. A vertex's significance
+    is the largest area eliminated up to and including it, so keeping the vertices
+    with significance above a threshold gives exactly the Visvalingam result.
+    """
+    n = len(coords)
+    significance = np.full(n, np.inf)
+    if n < 3:
+        return significance
+    x = coords[:, 0]
+    y = coords[:, 1]
+    middle = np.arange(1, n - 1)
+    area = np.full(n, np.inf)
+    area[middle] = _triangle_areas(x, y, middle - 1, middle, middle + 1)
+    previous = list(range(-1, n - 1))
+    following = list(range(1, n + 1))
+    heap = [(float(area[i]), i) for i in range(1, n - 1)]
+    heapq.heapify(heap)
+    x = x.tolist()
+    y = y.tolist()
+    area = area.tolist()
+    eliminated = 0.0
+    while heap:
+        value, i = heapq.heappop(heap)
+        if value != area[i]:
+            continue  # Stale entry: the area changed after a neighbour was eliminated
+        eliminated = max(eliminated, value)
+        significance[i] = eliminated
+        area[i] = None
+        p, q = previous[i], following[i]
+        following[p] = q
+        previous[q] = p
+        for j in (p, q):
+            if 0 < j < n - 1:
+                a, c = previous[j], following[j]
+                area[j] = 0.5 * abs(x[a] * (y[j] - y[c]) + x[j] * (y[c] - y[a]) + x[c] * (y[a] - y[j]))
+                heapq.heappush(heap, (area[j], j))
+    return significance
+
+
+def ring_significance(coords: Coordinates, offsets: Sequence[int],
+                      method: str = 'douglas_peucker',
+                      tolerance: float = 0.0) -> np.ndarray:
+    """
+    Per-vertex significance of every line or ring in the ragged (coords, offsets) layout
+    
+    Args:
+        coords: Flat (N, 2) coordinates
+        offsets: Line offsets into coords (length line_count + 1)
+        method: 'douglas_peucker' (distance tolerance) or 'visvalingam' (area tolerance)
+        tolerance: Douglas-Peucker only: significances at or below this are left
+            unresolved (0), which saves work when only this tolerance is needed
+    
+    Returns:
+        (N,) significance; a vertex survives a tolerance t iff its significance > t,
+        endpoints are inf
+    """
+    points = as_coordinate_array(coords)
+    offsets = _check_offsets(points, offsets)
+    if method == 'douglas_peucker':
+        return _douglas_peucker_ragged(points, offsets, tolerance)
+    if method == 'visvalingam':
+        significance = np.empty(len(points))
+        for lo, hi in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            significance[lo:hi] = _visvalingam_line(points[lo:hi])
+        return significance
+    raise ValueError(f"Unknown simplification method {method!r} (expected one of {SIMPLIFY_METHODS})")
+
+
+def simplify_rings(coords: Coordinates, offsets: Sequence[int],
+                   tolerance: Optional[float] = None,
+                   max_vertices: Optional[int] = None,
+                   method: str = 'douglas_peucker',
+                   min_ring_vertices: int = 4) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Simplify many lines or rings at once in the ragged (coords, offsets) layout
+    
+    Args:
+        coords: Flat (N, 2) coordinates
+        offsets: Line offsets into coords (length line_count + 1)
+        tolerance: Keep vertices whose significance exceeds this (distance for
+            Douglas-Peucker, area for Visvalingam); None keeps all
+        max_vertices: Vertex budget per line; the most significant vertices are kept
+        method: 'douglas_peucker' or 'visvalingam'
+        min_ring_vertices: Closed rings (first == last) keep at least this many
+            vertices, so they do not collapse to a line
+    
+    Returns:
+        (simplified flat coordinates, new offsets)
+    """
+    points = as_coordinate_array(coords)
+    offsets = _check_offsets(points, offsets)
+    lengths = np.diff(offsets)
+    line = np.repeat(np.arange(len(lengths)), lengths)
+    closed = np.zeros(len(lengths), dtype=bool)
+    nonempty = lengths > 0
+    closed[nonempty] = np.all(points[offsets[:-1][nonempty]] == points[offsets[1:][nonempty] - 1], axis=1)
+    
+    if tolerance is not None and max_vertices is None and method == 'douglas_peucker':
+        # Only the tolerance matters: leave the significance below it unresolved, except
+        # on closed rings that fall short of min_ring_vertices and need the full ranking
+        significance = ring_significance(points, offsets, method, tolerance)
+        short = closed & (np.bincount(line, weights=significance > tolerance, minlength=len(lengths)) < min_ring_vertices)
+        for lo, hi in zip(offsets[:-1][short].tolist(), offsets[1:][short].tolist()):
+            significance[lo:hi] = ring_significance(points[lo:hi], [0, hi - lo], method)
+    else:
+        significance = ring_significance(points, offsets, method)
+    keep = significance > tolerance if tolerance is not None else np.ones(len(points), dtype=bool)
+    
+    if max_vertices is not None or min_ring_vertices:
+        # Rank of each vertex within its line, most significant first (ties: lower index)
+        order = np.lexsort((np.arange(len(points)), -significance, line))
+        rank = np.empty(len(points), dtype=np.int64)
+        rank[order] = np.arange(len(points)) - offsets[:-1][line[order]]
+        if max_vertices is not None:
+            keep &= rank < max(2, max_vertices)
+        keep |= closed[line] & (rank < min_ring_vertices)
+    
+    new_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    new_offsets[1:] = np.cumsum(np.bincount(line[keep], minlength=len(lengths)))
+    return points[keep], new_offsets
+
+
+def simplify_line(coords: Coordinates, tolerance: Optional[float] = None,
+                  max_vertices: Optional[int] = None,
+                  method: str = 'douglas_peucker') -> np.ndarray:
+    """
+    Simplify one line (or ring) given as an array or list of tuples
+    
+    Args:
+        coords: (N, 2) array or list of (x, y) tuples
+        tolerance: Distance (Douglas-Peucker) or area (Visvalingam) tolerance
+        max_vertices: Vertex budget instead of (or on top of) a tolerance
+        method: 'douglas_peucker' or 'visvalingam'
+    
+    Returns:
+        Simplified (M, 2) array
+    """
+    points = as_coordinate_array(coords)
+    simplified, _ = simplify_rings(points, [0, len(points)], tolerance, max_vertices, method, min_ring_vertices=0)
+    return simplified
+
+
 def simplify_coordinates(coords: List[Tuple[float, float]], 
                         tolerance: float = 0.0001) -> List[Tuple[float, float]]:
     """
     Simplify coordinate list using Douglas-Peucker algorithm
     
+    Iterative (see ring_significance), so long borders cannot hit the recursion limit;
+    the result is the same as the classic recursive algorithm.
+    
     Args:
         coords: List of (lng, lat) tuples
         tolerance: Distance tolerance in degrees (~10m at 45°N)
@@ -214,49 +1024,11 @@ def simplify_coordinates(coords: List[Tuple[float, float]],
     if len(coords) < 3:
         return coords
     
-    def perpendicular_distance(point: Tuple[float, float], 
-                              line_start: Tuple[float, float],
-                              line_end: Tuple[float, float]) -> float:
-        """Calculate perpendicular distance from point to line"""
-        x0, y0 = point
-        x1, y1 = line_start
-        x2, y2 = line_end
-        
-        if x1 == x2 and y1 == y2:
-            return math.sqrt((x0 - x1)**2 + (y0 - y1)**2)
-        
-        num = abs((y2 - y1) * x0 - (x2 - x1) * y0 + x2 * y1 - y2 * x1)
-        den = math.sqrt((y2 - y1)**2 + (x2 - x1)**2)
-        
-        return num / den
-    
-    def douglas_peucker(points: List[Tuple[float, float]], 
-                       tol: float) -> List[Tuple[float, float]]:
-        """Recursive Douglas-Peucker implementation"""
-        if len(points) < 3:
-            return points
-        
-        # Find point with maximum distance from line
-        max_dist = 0
-        max_index = 0
-        
-        for i in range(1, len(points) - 1):
-            dist = perpendicular_distance(points[i], points[0], points[-1])
-            if dist > max_dist:
-                max_dist = dist
-                max_index = i
-        
-        # If max distance is greater than tolerance, recursively simplify
-        if max_dist > tol:
-            left = douglas_peucker(points[:max_index + 1], tol)
-            right = douglas_peucker(points[max_index:], tol)
-            
-            # Combine results (avoiding duplicate at join point)
-            return left[:-1] + right
-        else:
-            return [points[0], points[-1]]
-    
-    return douglas_peucker(coords, tolerance)
+    if len(coords) < SIMPLIFY_VECTORIZE_MIN:
+        # Short lines: the NumPy passes cost more than they save
+        return [coords[i] for i in _douglas_peucker_indices(coords, tolerance)]
+    significance = ring_significance(coords, [0, len(coords)], tolerance=tolerance)
+    return [coords[i] for i in np.flatnonzero(significance > tolerance).tolist()]
 
 
 if __name__ == '__main__':
@@ -284,3 +1056,7 @@ if __name__ == '__main__':
     banja_luka = (17.1910, 44.7722)
     dist = haversine_distance(sarajevo, banja_luka)
     print(f"Distance Sarajevo to Banja Luka: {dist:.1f} km")
+    
+    # Batch distances over arrays
+    cities = np.array([sarajevo, banja_luka])
+    print(f"Batch matrix (km): {haversine_matrix(cities).round(1).tolist()}")
@@ -11,6 +11,8 @@ from typing import Dict, List, Tuple, Optional
 from dataclasses import dataclass, asdict
 import sys
 
+from coordinate_transform import CoordinateTransformer
+
 
 @dataclass
 class ValidationResult:
@@ -98,34 +100,13 @@ class SVGPathParser:
         
         Default Bosnia bounds: approximately 42.5°N to 45.3°N, 15.7°E to 19.6°E
         """
-        if not coords:
+        if len(coords) == 0:
             return []
         
-        # Default Bosnia bounding box
-        if bbox is None:
-            bbox = {
-                'min_lat': 42.5,
-                'max_lat': 45.3,
-                'min_lng': 15.7,
-                'max_lng': 19.6
-            }
-        
-        lat_range = bbox['max_lat'] - bbox['min_lat']
-        lng_range = bbox['max_lng'] - bbox['min_lng']
-        
-        latlng_coords = []
-        for x, y in coords:
-            # Normalize to 0-1 range
-            norm_x = x / svg_width
-            norm_y = 1 - (y / svg_height)  # Invert Y
-            
-            # Scale to geographic bounds
-            lng = bbox['min_lng'] + (norm_x * lng_range)
-            lat = bbox['min_lat'] + (norm_y * lat_range)
-            
-            latlng_coords.append((lng, lat))
-        
-        return latlng_coords
+        # Same linear mapping as CoordinateTransformer (default Bosnia bbox when None),
+        # applied to all points at once
+        transformer = CoordinateTransformer(svg_width, svg_height, bbox)
+        return transformer.transform_coordinates(coords)
 
 
 class GeometryValidator:
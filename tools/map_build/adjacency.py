@@ -8,19 +8,75 @@ Uses shapely STRtree for efficient spatial queries.
 Calibration mode:
   python tools/map_build/adjacency.py --calibrate
   Generates adjacency_calibration.json with distance quantiles and suggested GAP_TOLERANCE.
+
+Engines:
+  --engine bulk (default): one STRtree dwithin query over all geometries, classification on pair arrays.
+  --engine loop: original per-settlement loop, kept as the reference implementation.
+  Both engines produce byte-identical settlement_edges.json. --workers > 1 and --incremental
+  classify with the bulk engine, so --engine loop is rejected in combination with them.
+
+Sharded mode:
+  python tools/map_build/adjacency.py --workers 4
+  Splits the extent into tiles with a GAP_TOLERANCE halo and processes them in a process pool.
+  Output is identical for any worker count; adjacency_report.json gains a "sharding" block with per-tile timings.
+
+Incremental mode:
+  python tools/map_build/adjacency.py --incremental
+  Keeps adjacency_cache.json (geometry fingerprint per sid + last edge list) and only recomputes
+  edges for changed, added or removed settlements. Outputs are identical to a cold run.
+
+CSR output:
+  settlement_edges.csr.bin holds the same graph as sorted sids + uint32 CSR indptr/indices
+  with a checksummed header; read it with read_edges_csr().
+
+Geometry cache:
+  Parsed geometries are cached in settlements_polygons.<properties>.geomcache.npz (one file per
+  kept property set), keyed by the GeoJSON's SHA-256.
+  A stale cache is rebuilt automatically; --no-geometry-cache bypasses it.
+
+Weighted sidecar:
+  python tools/map_build/adjacency.py --weighted
+  Also writes settlement_edges_weighted.json with method, shared_length and min_distance per edge.
+  shared_length counts only border segments that overlap to within SNAP_GRID (float error);
+  method is derived from it: line (shared_length > EPSILON), touch (boundaries meet, no
+  shared border) or distance. A sample of edges is re-measured by boundary intersection
+  snap-rounded to SNAP_GRID and the agreement is recorded in the sidecar.
+
+Tracing:
+  python tools/map_build/adjacency.py --trace trace.json [--trace-progress progress.ndjson]
+  Writes phase and per-criterion timings, a candidate-set size histogram and the slowest
+  settlements; --engine loop times every settlement, bulk ranks them by vertices x candidates.
+  Sharded and incremental runs record the same criteria (summed over the workers, or for the
+  re-queried settlements only).
+
+Municipality rollup:
+  python tools/map_build/adjacency.py --mun-rollup [--weighted]
+  Also writes mun_adjacency_rollup.json: settlement edges aggregated by mun1990_id and mun_code,
+  with summed shared border length per municipality pair when --weighted is given.
+
+Sweep mode:
+  python tools/map_build/adjacency.py --sweep 0,0.25,0.5,1,2
+  Queries candidates once at the largest tolerance and writes adjacency_sweep.json with edge and
+  orphan counts, degree distribution and added edges per tolerance.
 """
 
 import hashlib
+import heapq
 import json
+import struct
 import sys
 import time
 import argparse
 import math
 import subprocess
 from pathlib import Path
-from typing import Dict, List, Set, Tuple, Union, Optional
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Set, Tuple, Union, Optional
 
 try:
+    import numpy as np
+    import shapely
     from shapely.geometry import Polygon, MultiPolygon, LineString, Point, box, MultiLineString
     from shapely.strtree import STRtree
     from shapely.ops import unary_union
@@ -34,6 +90,15 @@ EPSILON = 0.001  # Threshold to ignore point-touches (in coordinate units)
 GAP_TOLERANCE = 1.0  # Maximum distance between boundaries to consider adjacent (in map units)
 SCRIPT_VERSION = "adjacency.py v2"  # Version identifier for self-identification
 
+SNAP_GRID = 1e-9  # Float-error tolerance for ring vertices on another ring's segment when indexing shared segments
+WEIGHT_CHECK_SAMPLE = 1000  # Weighted edges re-measured by boundary intersection as a consistency check
+
+# Edge source methods, indexed by the integer codes used on pair arrays
+EDGE_METHODS = ("touch", "line", "distance")
+METHOD_TOUCH = 0
+METHOD_LINE = 1
+METHOD_DISTANCE = 2
+
 
 def get_git_commit() -> Optional[str]:
     """
@@ -55,21 +120,101 @@ def get_git_commit() -> Optional[str]:
     return None
 
 
-def load_polygons(geojson_path: Path) -> Tuple[Dict[str, Union[Polygon, MultiPolygon]], Dict[str, dict], int]:
+def iter_geojson_features(geojson_path: Path, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """
+    Yield the features of a GeoJSON FeatureCollection one at a time.
+
+    The file is read in chunks and each feature is decoded with JSONDecoder.raw_decode as
+    soon as it is complete, so only one feature (plus the read buffer) is held in memory.
+    Top-level members other than "features" are decoded and discarded.
+    """
+    decoder = json.JSONDecoder()
+    with open(geojson_path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+
+        def fill() -> None:
+            nonlocal buffer, pos, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        def peek() -> str:
+            # Next non-whitespace character (advances past whitespace), '' at end of file
+            nonlocal pos
+            while True:
+                while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    return buffer[pos] if pos < len(buffer) else ''
+                fill()
+
+        def expect(char: str) -> None:
+            nonlocal pos
+            if peek() != char:
+                raise ValueError(f"Malformed GeoJSON in {geojson_path}: expected '{char}'")
+            pos += 1
+
+        def decode_value():
+            # Decode one JSON value, reading more input until it is complete
+            nonlocal pos
+            peek()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    if end < len(buffer) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        expect('{')
+        while peek() != '}':
+            key = decode_value()
+            expect(':')
+            if key != 'features':
+                decode_value()
+            else:
+                expect('[')
+                while peek() != ']':
+                    yield decode_value()
+                    if peek() == ',':
+                        pos += 1
+                expect(']')
+            if peek() == ',':
+                pos += 1
+
+
+def load_polygons(geojson_path: Path, property_keys: Optional[Sequence[str]] = None) -> Tuple[Dict[str, Union[Polygon, MultiPolygon]], Dict[str, dict], int]:
     """
     Load polygons from GeoJSON and return sid->geometry mapping and properties.
-    Supports both Polygon and MultiPolygon geometries.
+    Supports both Polygon and MultiPolygon geometries (exterior rings only).
     Returns (polygons_dict, properties_dict, invalid_geometry_count).
+
+    Features are streamed (iter_geojson_features) and their exterior rings collected into
+    flat coordinate/offset arrays; all geometries are then built with one
+    shapely.from_ragged_array call and validated with one vectorized is_valid call.
+    Invalid geometries are repaired with buffer(0) or skipped.
+
+    property_keys limits the kept properties to the given keys (None keeps all).
     """
-    with open(geojson_path, 'r', encoding='utf-8') as f:
-        geojson = json.load(f)
-    
-    polygons = {}
-    properties = {}
+    sids = []
+    kept_properties = []
+    is_polygon = []
+    coords = array('d')
+    ring_offsets = [0]   # point offset per ring
+    part_offsets = [0]   # ring offset per polygon part
+    geom_offsets = [0]   # part offset per feature
     invalid_geometry_count = 0
     
-    for feature in geojson.get('features', []):
-        sid = feature.get('properties', {}).get('sid')
+    for feature in iter_geojson_features(geojson_path):
+        feature_properties = feature.get('properties') or {}
+        sid = feature_properties.get('sid')
         if not sid:
             continue
         
@@ -80,54 +225,206 @@ def load_polygons(geojson_path: Path) -> Tuple[Dict[str, Union[Polygon, MultiPol
             continue
         
         geom_type = geom.get('type')
-        coords = geom.get('coordinates', [])
+        geom_coords = geom.get('coordinates', [])
         
-        if not coords:
+        if not geom_coords:
             invalid_geometry_count += 1
             print(f"WARNING: Skipping feature with empty coordinates for {sid}", file=sys.stderr)
             continue
         
+        if geom_type not in ('Polygon', 'MultiPolygon'):
+            invalid_geometry_count += 1
+            print(f"WARNING: Skipping unsupported geometry type '{geom_type}' for {sid}", file=sys.stderr)
+            continue
+        
         try:
-            geometry = None
-            
             if geom_type == 'Polygon':
-                # Convert GeoJSON Polygon to shapely Polygon
-                # GeoJSON: [[[x,y], [x,y], ...]] (exterior ring)
-                ring = coords[0]  # Exterior ring
-                geometry = Polygon(ring)
-                
-            elif geom_type == 'MultiPolygon':
-                # Convert GeoJSON MultiPolygon to shapely MultiPolygon
-                # GeoJSON: [[[[x,y], [x,y], ...]], [[[x,y], [x,y], ...]], ...]
-                # Each element is a Polygon coordinate array
-                geometry = MultiPolygon([Polygon(poly_coords[0]) for poly_coords in coords])
-                
+                # GeoJSON: [[[x,y], [x,y], ...]] (exterior ring first)
+                exteriors = [geom_coords[0]]
             else:
-                invalid_geometry_count += 1
-                print(f"WARNING: Skipping unsupported geometry type '{geom_type}' for {sid}", file=sys.stderr)
-                continue
-            
-            if geometry is None or not geometry.is_valid:
-                # Try to fix invalid geometry
-                if geometry is not None:
-                    geometry = geometry.buffer(0)
-                
-                if geometry is None or not geometry.is_valid or geometry.is_empty:
-                    invalid_geometry_count += 1
-                    print(f"WARNING: Skipping invalid geometry for {sid}", file=sys.stderr)
-                    continue
-            
-            polygons[sid] = geometry
-            properties[sid] = feature.get('properties', {})
-            
-        except Exception as e:
+                # GeoJSON: [[[[x,y], ...]], [[[x,y], ...]], ...]; one exterior ring per part
+                exteriors = [poly_coords[0] for poly_coords in geom_coords]
+            flat = []
+            ring_lengths = []
+            for ring in exteriors:
+                points = [(float(pt[0]), float(pt[1])) for pt in ring]
+                if points and points[0] != points[-1]:
+                    points.append(points[0])  # Close the ring like Polygon(ring) does
+                if len(points) < 4:
+                    raise ValueError("A linearring requires at least 4 coordinates.")
+                for x, y in points:
+                    flat.append(x)
+                    flat.append(y)
+                ring_lengths.append(len(points))
+        except (TypeError, ValueError, IndexError) as e:
             invalid_geometry_count += 1
             print(f"WARNING: Failed to create geometry for {sid}: {e}", file=sys.stderr)
             continue
+        
+        coords.extend(flat)
+        for length in ring_lengths:
+            ring_offsets.append(ring_offsets[-1] + length)
+            part_offsets.append(part_offsets[-1] + 1)
+        geom_offsets.append(geom_offsets[-1] + len(ring_lengths))
+        sids.append(sid)
+        is_polygon.append(geom_type == 'Polygon')
+        if property_keys is None:
+            kept_properties.append(feature_properties)
+        else:
+            kept_properties.append({key: feature_properties[key] for key in property_keys if key in feature_properties})
+    
+    polygons = {}
+    properties = {}
+    if not sids:
+        return polygons, properties, invalid_geometry_count
+    
+    geometries = shapely.from_ragged_array(
+        shapely.GeometryType.MULTIPOLYGON,
+        np.frombuffer(coords, dtype=np.float64).reshape(-1, 2),
+        offsets=(np.array(ring_offsets, dtype=np.int64), np.array(part_offsets, dtype=np.int64), np.array(geom_offsets, dtype=np.int64))
+    )
+    # Polygon features become Polygons again (their single part)
+    polygon_mask = np.array(is_polygon, dtype=bool)
+    geometries[polygon_mask] = shapely.get_geometry(geometries[polygon_mask], 0)
+    
+    # Try to fix invalid geometries
+    valid = shapely.is_valid(geometries)
+    repair = np.flatnonzero(~valid)
+    if len(repair):
+        geometries[repair] = shapely.buffer(geometries[repair], 0)
+        valid[repair] = shapely.is_valid(geometries[repair]) & ~shapely.is_empty(geometries[repair])
+    
+    for sid, geometry, ok, feature_properties in zip(sids, geometries, valid.tolist(), kept_properties):
+        if not ok:
+            invalid_geometry_count += 1
+            print(f"WARNING: Skipping invalid geometry for {sid}", file=sys.stderr)
+            continue
+        polygons[sid] = geometry
+        properties[sid] = feature_properties
     
     return polygons, properties, invalid_geometry_count
 
 
+GEOMETRY_CACHE_VERSION = 1
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def geometry_cache_path(geojson_path: Path, property_keys: Optional[Sequence[str]] = None) -> Path:
+    """
+    Binary geometry cache location: next to the source, one file per kept property set so
+    loaders with different property_keys do not invalidate each other's cache, e.g.
+    settlements_polygons.all.geomcache.npz (all properties), settlements_polygons.none.geomcache.npz
+    (no properties) or settlements_polygons.<hash of the keys>.geomcache.npz.
+    """
+    if property_keys is None:
+        tag = "all"
+    elif not property_keys:
+        tag = "none"
+    else:
+        tag = hashlib.sha256(json.dumps(list(property_keys)).encode('utf-8')).hexdigest()[:12]
+    return geojson_path.with_name(f"{geojson_path.stem}.{tag}.geomcache.npz")
+
+
+def write_geometry_cache(cache_path: Path, source_sha256: str, polygons: Dict[str, Union[Polygon, MultiPolygon]], properties: Dict[str, dict], invalid_geometry_count: int, property_keys: Optional[Sequence[str]]) -> None:
+    """
+    Write loaded geometries as an uncompressed .npz: sid table, ragged coordinate and
+    offset arrays (shapely.to_ragged_array), a Polygon flag per sid, and the kept
+    properties as JSON. The source SHA-256 and property_keys form the cache key.
+    Geometries are always packed as MultiPolygons (the Polygon flag restores them).
+    """
+    sids = list(polygons.keys())
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    _, coords, offsets = shapely.to_ragged_array(geoms)
+    if len(offsets) == 2:
+        # All Polygons: every geometry is a one-part MultiPolygon
+        ring_offsets, part_offsets = offsets
+        geom_offsets = np.arange(len(geoms) + 1, dtype=part_offsets.dtype)
+    else:
+        ring_offsets, part_offsets, geom_offsets = offsets
+    header = {
+        "cache_version": GEOMETRY_CACHE_VERSION,
+        "source_sha256": source_sha256,
+        "property_keys": list(property_keys) if property_keys is not None else None,
+        "invalid_geometry_count": invalid_geometry_count
+    }
+    tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            header=np.array(json.dumps(header)),
+            sids=np.array(sids, dtype=str),
+            is_polygon=shapely.get_type_id(geoms) == shapely.GeometryType.POLYGON,
+            coords=coords,
+            ring_offsets=ring_offsets,
+            part_offsets=part_offsets,
+            geom_offsets=geom_offsets,
+            properties=np.array(json.dumps([properties[sid] for sid in sids], ensure_ascii=False))
+        )
+    tmp_path.replace(cache_path)
+
+
+def read_geometry_cache(cache_path: Path, source_sha256: str, property_keys: Optional[Sequence[str]]) -> Optional[Tuple[Dict[str, Union[Polygon, MultiPolygon]], Dict[str, dict], int]]:
+    """Load a geometry cache written by write_geometry_cache; None if missing, stale or unreadable."""
+    if not cache_path.exists():
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            header = json.loads(str(data["header"]))
+            expected_keys = list(property_keys) if property_keys is not None else None
+            if (header.get("cache_version") != GEOMETRY_CACHE_VERSION or
+                    header.get("source_sha256") != source_sha256 or
+                    header.get("property_keys") != expected_keys):
+                return None
+            sids = data["sids"].tolist()
+            geoms = shapely.from_ragged_array(
+                shapely.GeometryType.MULTIPOLYGON,
+                data["coords"],
+                offsets=(data["ring_offsets"], data["part_offsets"], data["geom_offsets"])
+            )
+            is_polygon = data["is_polygon"]
+            geoms[is_polygon] = shapely.get_geometry(geoms[is_polygon], 0)
+            property_list = json.loads(str(data["properties"]))
+    except Exception as e:
+        print(f"WARNING: Ignoring unreadable geometry cache {cache_path}: {e}", file=sys.stderr)
+        return None
+    polygons = dict(zip(sids, geoms))
+    properties = dict(zip(sids, property_list))
+    return polygons, properties, header.get("invalid_geometry_count", 0)
+
+
+def load_polygons_cached(geojson_path: Path, property_keys: Optional[Sequence[str]] = None, use_cache: bool = True) -> Tuple[Dict[str, Union[Polygon, MultiPolygon]], Dict[str, dict], int]:
+    """
+    load_polygons with a binary geometry cache keyed by the source file's SHA-256.
+    Falls back to parsing the GeoJSON (and refreshes the cache) when the cache is stale.
+    """
+    if not use_cache:
+        return load_polygons(geojson_path, property_keys)
+    
+    cache_path = geometry_cache_path(geojson_path, property_keys)
+    source_sha256 = file_sha256(geojson_path)
+    cached = read_geometry_cache(cache_path, source_sha256, property_keys)
+    if cached is not None:
+        print(f"  Using geometry cache {cache_path.name}")
+        return cached
+    
+    polygons, properties, invalid_geometry_count = load_polygons(geojson_path, property_keys)
+    if polygons:
+        try:
+            write_geometry_cache(cache_path, source_sha256, polygons, properties, invalid_geometry_count, property_keys)
+        except Exception as e:
+            # The cache is only an accelerator: keep the parsed geometry
+            print(f"WARNING: Could not write geometry cache {cache_path}: {e}", file=sys.stderr)
+    return polygons, properties, invalid_geometry_count
+
+
 def get_boundary_segments(geometry: Union[Polygon, MultiPolygon]) -> List[LineString]:
     """
     Extract boundary line segments from a Polygon or MultiPolygon.
@@ -227,6 +524,120 @@ def segments_share_line(segments1: List[LineString], segments2: List[LineString]
     return False
 
 
+def get_boundary_segment_array(geometry: Union[Polygon, MultiPolygon]) -> "np.ndarray":
+    """
+    Array form of get_boundary_segments: exterior ring segments as an (N, 4) float array
+    of (x1, y1, x2, y2) rows, in the same order. Zero-length segments are dropped.
+    """
+    if isinstance(geometry, Polygon):
+        polys = [geometry]
+    elif isinstance(geometry, MultiPolygon):
+        polys = list(geometry.geoms)
+    else:
+        raise TypeError(f"Unsupported geometry type: {type(geometry)}")
+
+    rows = []
+    for poly in polys:
+        coords = shapely.get_coordinates(poly.exterior)
+        rows.append(np.hstack([coords[:-1], coords[1:]]))
+    segments = np.vstack(rows) if rows else np.empty((0, 4))
+    return segments[np.any(segments[:, :2] != segments[:, 2:], axis=1)]
+
+
+def sweep_segment_pairs(segments1: "np.ndarray", segments2: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Sort-and-sweep bbox prefilter: (i, j) index pairs whose segment bounding boxes overlap.
+
+    Two x-intervals overlap iff one starts inside the other. Both cases are contiguous
+    ranges in the other set sorted by min x, so candidates are found with searchsorted
+    instead of comparing every segment with every other.
+    """
+    minx1 = np.minimum(segments1[:, 0], segments1[:, 2])
+    maxx1 = np.maximum(segments1[:, 0], segments1[:, 2])
+    minx2 = np.minimum(segments2[:, 0], segments2[:, 2])
+    maxx2 = np.maximum(segments2[:, 0], segments2[:, 2])
+    order1 = np.argsort(minx1, kind="stable")
+    order2 = np.argsort(minx2, kind="stable")
+
+    def expand(starts: "np.ndarray", stops: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        counts = np.maximum(stops - starts, 0)
+        owner = np.repeat(np.arange(len(starts)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner, np.repeat(starts, counts) + offsets
+
+    # Case A: segment j of set 2 starts inside segment i of set 1 (minx1 <= minx2 <= maxx1)
+    sorted_minx2 = minx2[order2]
+    i_a, k_a = expand(np.searchsorted(sorted_minx2, minx1, side="left"),
+                      np.searchsorted(sorted_minx2, maxx1, side="right"))
+    j_a = order2[k_a]
+    # Case B: segment i of set 1 starts strictly inside segment j of set 2 (minx2 < minx1 <= maxx2)
+    sorted_minx1 = minx1[order1]
+    j_b, k_b = expand(np.searchsorted(sorted_minx1, minx2, side="right"),
+                      np.searchsorted(sorted_minx1, maxx2, side="right"))
+    i_b = order1[k_b]
+
+    i = np.concatenate([i_a, i_b])
+    j = np.concatenate([j_a, j_b])
+    miny1 = np.minimum(segments1[i, 1], segments1[i, 3])
+    maxy1 = np.maximum(segments1[i, 1], segments1[i, 3])
+    miny2 = np.minimum(segments2[j, 1], segments2[j, 3])
+    maxy2 = np.maximum(segments2[j, 1], segments2[j, 3])
+    y_overlap = (miny1 <= maxy2) & (miny2 <= maxy1)
+    return i[y_overlap], j[y_overlap]
+
+
+def segment_arrays_share_line(segments1: "np.ndarray", segments2: "np.ndarray", epsilon: float) -> bool:
+    """
+    Vectorized segments_share_line over (N, 4) segment arrays.
+
+    Candidate pairs come from sweep_segment_pairs. A pair shares a line if it is collinear
+    with an overlap longer than epsilon, or if it intersects in a point that is not within
+    epsilon of an endpoint of both segments (same rule as segments_share_line).
+    """
+    if len(segments1) == 0 or len(segments2) == 0:
+        return False
+    i, j = sweep_segment_pairs(segments1, segments2)
+    if len(i) == 0:
+        return False
+
+    p1 = segments1[i, :2]
+    d1 = segments1[i, 2:] - p1
+    p3 = segments2[j, :2]
+    d2 = segments2[j, 2:] - p3
+    r = p3 - p1
+    denom = d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0]
+    r_cross_d1 = r[:, 0] * d1[:, 1] - r[:, 1] * d1[:, 0]
+    r_cross_d2 = r[:, 0] * d2[:, 1] - r[:, 1] * d2[:, 0]
+
+    # Collinear pairs: overlap length along segment 1
+    collinear = (denom == 0) & (r_cross_d1 == 0)
+    if collinear.any():
+        c1, c2, cr = d1[collinear], d2[collinear], r[collinear]
+        len_sq = np.einsum('ij,ij->i', c1, c1)
+        t3 = np.einsum('ij,ij->i', cr, c1) / len_sq
+        t4 = np.einsum('ij,ij->i', cr + c2, c1) / len_sq
+        lo = np.maximum(0.0, np.minimum(t3, t4))
+        hi = np.minimum(1.0, np.maximum(t3, t4))
+        if np.any((hi - lo) * np.sqrt(len_sq) > epsilon):
+            return True
+
+    # Crossing pairs: intersection point must not be an endpoint of both segments
+    crossing = denom != 0
+    if not crossing.any():
+        return False
+    t = r_cross_d2[crossing] / denom[crossing]
+    u = r_cross_d1[crossing] / denom[crossing]
+    hit = (t >= 0) & (t <= 1) & (u >= 0) & (u <= 1)
+    if not hit.any():
+        return False
+    t, u = t[hit], u[hit]
+    len1 = np.hypot(d1[crossing][hit, 0], d1[crossing][hit, 1])
+    len2 = np.hypot(d2[crossing][hit, 0], d2[crossing][hit, 1])
+    at_end1 = (t * len1 < epsilon) | ((1 - t) * len1 < epsilon)
+    at_end2 = (u * len2 < epsilon) | ((1 - u) * len2 < epsilon)
+    return bool(np.any(~(at_end1 & at_end2)))
+
+
 def compute_shared_boundary_length(geom1: Union[Polygon, MultiPolygon], geom2: Union[Polygon, MultiPolygon], epsilon: float) -> float:
     """
     Compute the length of shared boundary between two geometries.
@@ -259,7 +670,150 @@ def compute_shared_boundary_length(geom1: Union[Polygon, MultiPolygon], geom2: U
         return 0.0
 
 
-def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progress_interval: int = 200) -> Tuple[Set[Tuple[str, str]], Dict[Tuple[str, str], str]]:
+class AdjacencyTrace:
+    """
+    Instrumentation surface for adjacency runs (--trace / --trace-progress).
+
+    Collects per-phase and per-criterion call counts and cumulative time, a histogram of
+    STRtree candidate-set sizes, and the slowest settlements with their vertex counts.
+    Optionally streams NDJSON progress events (rate, ETA) to progress_path.
+    """
+
+    def __init__(self, engine: str, slowest_n: int = 20, progress_path: Optional[Path] = None):
+        self.engine = engine
+        self.slowest_n = slowest_n
+        self.start_time = time.perf_counter()
+        self.phases = {}
+        self.criteria = {}
+        self.candidate_sizes = []
+        self.slowest = []  # min-heap of (seconds, sid, vertex_count, candidate_count)
+        self.heaviest = []
+        self.edge_breakdown = None
+        self.settlement_count = 0
+        self.progress_file = open(progress_path, 'w', encoding='utf-8') if progress_path else None
+
+    def _add(self, table: dict, name: str, seconds: float, calls: int = 1) -> None:
+        entry = table.setdefault(name, {"calls": 0, "seconds": 0.0})
+        entry["calls"] += calls
+        entry["seconds"] += seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time a named phase; emits phase_start/phase_end progress events."""
+        self.event("phase_start", phase=name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._add(self.phases, name, seconds)
+            self.event("phase_end", phase=name, seconds=round(seconds, 6))
+
+    def timed(self, name: str, fn, *args):
+        """Call fn(*args), recording one call of criterion name."""
+        start = time.perf_counter()
+        result = fn(*args)
+        self._add(self.criteria, name, time.perf_counter() - start)
+        return result
+
+    def criterion(self, name: str, seconds: float, calls: int) -> None:
+        """Record a vectorized criterion evaluated over calls pairs."""
+        self._add(self.criteria, name, seconds, calls)
+
+    def settlement(self, sid: str, seconds: float, vertex_count: int, candidate_count: int) -> None:
+        """Record one settlement of the loop engine (keeps the slowest_n)."""
+        self.candidate_sizes.append(candidate_count)
+        item = (seconds, sid, vertex_count, candidate_count)
+        if len(self.slowest) < self.slowest_n:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def candidate_counts(self, sids: List[str], counts: "np.ndarray", vertex_counts: "np.ndarray") -> None:
+        """Record per-settlement candidate counts from the bulk engine; ranks settlements by vertices x candidates."""
+        self.candidate_sizes.extend(counts.tolist())
+        cost = vertex_counts.astype(np.int64) * np.maximum(counts, 1)
+        for i in np.argsort(-cost, kind="stable")[:self.slowest_n].tolist():
+            self.heaviest.append({
+                "sid": sids[i],
+                "vertex_count": int(vertex_counts[i]),
+                "candidate_count": int(counts[i]),
+                "cost": int(cost[i])
+            })
+
+    def progress(self, done: int, total: int, edges: int, started: Optional[float] = None) -> None:
+        """Emit a progress event with rate and ETA; started is the perf_counter() at which the work began."""
+        elapsed = time.perf_counter() - (self.start_time if started is None else started)
+        rate = done / elapsed if elapsed > 0 else 0.0
+        eta = (total - done) / rate if rate > 0 else None
+        self.event("progress", done=done, total=total, edges=edges,
+                   rate=round(rate, 2), eta_seconds=round(eta, 2) if eta is not None else None)
+
+    def event(self, kind: str, **fields) -> None:
+        if self.progress_file is None:
+            return
+        record = {"event": kind, "elapsed": round(time.perf_counter() - self.start_time, 6), **fields}
+        self.progress_file.write(json.dumps(record) + "\n")
+        self.progress_file.flush()
+
+    def candidate_histogram(self) -> List[dict]:
+        """Candidate-set sizes in power-of-two bins: 0, 1, 2-3, 4-7, ..."""
+        if not self.candidate_sizes:
+            return []
+        sizes = np.asarray(self.candidate_sizes, dtype=np.int64)
+        bins = np.where(sizes > 0, np.floor(np.log2(np.maximum(sizes, 1))).astype(np.int64) + 1, 0)
+        counts = np.bincount(bins)
+        histogram = []
+        for b, count in enumerate(counts.tolist()):
+            low, high = (0, 0) if b == 0 else (2 ** (b - 1), 2 ** b - 1)
+            histogram.append({"min": low, "max": high, "count": count})
+        return histogram
+
+    def to_json(self) -> dict:
+        rounded = lambda table: {name: {"calls": v["calls"], "seconds": round(v["seconds"], 6)} for name, v in table.items()}
+        trace = {
+            "version": "1.0.0",
+            "script_version": SCRIPT_VERSION,
+            "engine": self.engine,
+            "settlement_count": self.settlement_count,
+            "total_seconds": round(time.perf_counter() - self.start_time, 6),
+            "phases": rounded(self.phases),
+            "criteria": rounded(self.criteria),
+            "candidate_histogram": self.candidate_histogram()
+        }
+        if self.edge_breakdown is not None:
+            trace["edge_breakdown"] = self.edge_breakdown
+        if self.slowest:
+            trace["slowest_settlements"] = [
+                {"sid": sid, "seconds": round(seconds, 6), "vertex_count": vertex_count, "candidate_count": candidate_count}
+                for seconds, sid, vertex_count, candidate_count in sorted(self.slowest, reverse=True)
+            ]
+        if self.heaviest:
+            trace["heaviest_settlements"] = self.heaviest
+        return trace
+
+    def write(self, trace_path: Path) -> None:
+        with open(trace_path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_json(), f, indent=2, ensure_ascii=False)
+
+    def close(self) -> None:
+        if self.progress_file is not None:
+            self.progress_file.close()
+            self.progress_file = None
+
+
+def _untimed(name: str, fn, *args):
+    """Stand-in for AdjacencyTrace.timed when tracing is off."""
+    return fn(*args)
+
+
+@contextmanager
+def _null_phase(name: str):
+    """Stand-in for AdjacencyTrace.phase when tracing is off."""
+    yield
+
+
+def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progress_interval: int = 200, trace: Optional[AdjacencyTrace] = None) -> Tuple[Set[Tuple[str, str]], Dict[Tuple[str, str], str]]:
     """
     Compute adjacency edges using spatial indexing with STRtree and prepared geometries.
     Supports both Polygon and MultiPolygon geometries.
@@ -269,6 +823,9 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
     b) g_i.intersects(g_j) AND shared boundary length > EPSILON
     c) g_i.distance(g_j) <= GAP_TOLERANCE
     
+    If trace is given, every STRtree query, prep() and predicate call is timed per
+    criterion, and per-settlement time, vertex count and candidate count are recorded.
+    
     Returns:
         - Set of (sid1, sid2) tuples with sid1 < sid2 (stable ordering)
         - Dict mapping (sid1, sid2) -> source method ('touch', 'line', 'distance')
@@ -281,6 +838,8 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
     sids = list(polygons.keys())
     geoms = [polygons[sid] for sid in sids]
     tree = STRtree(geoms)
+    timed = trace.timed if trace is not None else _untimed
+    loop_start = time.perf_counter()
     
     edges = set()
     edge_sources = {}  # Track which method found each edge
@@ -292,11 +851,14 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
         if i > 0 and i % progress_interval == 0:
             elapsed = time.time() - start_time
             print(f"  [{i}/{len(sids)}] {elapsed:.1f}s elapsed, {len(edges)} edges found, current: {sid1}")
+            if trace is not None:
+                trace.progress(i, len(sids), len(edges), loop_start)
         
+        settlement_start = time.perf_counter()
         geom1 = polygons[sid1]
         
         # Prepare geometry for repeated checks
-        prep_geom1 = prep(geom1)
+        prep_geom1 = timed("prep", prep, geom1)
         
         # Query STRtree for candidates using g_i.envelope buffered by GAP_TOLERANCE
         expanded_bbox = (
@@ -306,7 +868,7 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
             geom1.bounds[3] + GAP_TOLERANCE
         )
         expanded_geom = box(*expanded_bbox)
-        candidates = tree.query(expanded_geom)
+        candidates = timed("strtree_query", tree.query, expanded_geom)
         
         for candidate_idx in candidates:
             sid2 = sids[candidate_idx]
@@ -326,15 +888,15 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
             
             # Check adjacency criteria in order:
             # 1. touches() - use prepared geometry for efficiency
-            if prep_geom1.touches(geom2):
+            if timed("touches", prep_geom1.touches, geom2):
                 edges.add(edge)
                 edge_sources[edge] = 'touch'
                 edge_breakdown['touch'] += 1
                 continue
             
             # 2. intersects() AND shared boundary length > EPSILON
-            if prep_geom1.intersects(geom2):
-                shared_length = compute_shared_boundary_length(geom1, geom2, EPSILON)
+            if timed("intersects", prep_geom1.intersects, geom2):
+                shared_length = timed("shared_boundary_length", compute_shared_boundary_length, geom1, geom2, EPSILON)
                 if shared_length > EPSILON:
                     edges.add(edge)
                     edge_sources[edge] = 'line'
@@ -353,7 +915,7 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
             
             if bboxes_overlap:
                 # Bboxes overlap - check geometry distance
-                distance = geom1.distance(geom2)
+                distance = timed("distance", geom1.distance, geom2)
                 if distance <= GAP_TOLERANCE:
                     edges.add(edge)
                     edge_sources[edge] = 'distance'
@@ -366,11 +928,19 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
                 
                 # Only compute actual geometry distance if bbox distance is within tolerance
                 if min_bbox_dist <= GAP_TOLERANCE:
-                    distance = geom1.distance(geom2)
+                    distance = timed("distance", geom1.distance, geom2)
                     if distance <= GAP_TOLERANCE:
                         edges.add(edge)
                         edge_sources[edge] = 'distance'
                         edge_breakdown['distance'] += 1
+        
+        if trace is not None:
+            trace.settlement(sid1, time.perf_counter() - settlement_start,
+                             int(shapely.get_num_coordinates(geom1)), len(candidates))
+    
+    if trace is not None:
+        trace.settlement_count = len(sids)
+        trace.edge_breakdown = dict(edge_breakdown)
     
     elapsed = time.time() - start_time
     print(f"  [{len(sids)}/{len(sids)}] Adjacency computation complete in {elapsed:.1f}s")
@@ -380,7 +950,973 @@ def compute_adjacency(polygons: Dict[str, Union[Polygon, MultiPolygon]], progres
     return edges, edge_sources
 
 
-def generate_report(edges: Set[Tuple[str, str]], all_sids: Set[str], edge_sources: Dict[Tuple[str, str], str] = None, invalid_geometry_count: int = 0, edges_sha256: str = None, incomplete: bool = False) -> dict:
+def sid_ranks(sids: List[str]) -> "np.ndarray":
+    """
+    Return rank[i] = position of sids[i] in sorted(sids).
+    Comparing ranks is equivalent to comparing sid strings, so pair arrays can
+    apply the sid1 < sid2 ordering rule without touching Python strings.
+    """
+    order = sorted(range(len(sids)), key=sids.__getitem__)
+    ranks = np.empty(len(sids), dtype=np.int64)
+    ranks[order] = np.arange(len(sids), dtype=np.int64)
+    return ranks
+
+
+def query_candidate_pairs(tree: STRtree, geoms: "np.ndarray", ranks: "np.ndarray", gap_tolerance: float = GAP_TOLERANCE) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Bulk candidate search: every (i, j) with distance(g_i, g_j) <= gap_tolerance.
+    Returns (left, right) index arrays with ranks[left] < ranks[right], sorted by (ranks[left], ranks[right]).
+    """
+    left, right = tree.query(geoms, predicate="dwithin", distance=gap_tolerance)
+    keep = ranks[left] < ranks[right]
+    left = left[keep]
+    right = right[keep]
+    order = np.lexsort((ranks[right], ranks[left]))
+    return left[order], right[order]
+
+
+def classify_pairs(geoms: "np.ndarray", left: "np.ndarray", right: "np.ndarray", boundaries: "np.ndarray" = None, trace: Optional[AdjacencyTrace] = None) -> "np.ndarray":
+    """
+    Classify candidate pairs into EDGE_METHODS codes using vectorized predicates.
+    All pairs are assumed to be within GAP_TOLERANCE; the order of checks matches compute_adjacency:
+    touch first, then intersects with shared boundary length > EPSILON, else distance.
+    left must hold the lower sid of each pair (geometry argument order matters for the line check).
+    """
+    methods = np.full(len(left), METHOD_DISTANCE, dtype=np.uint8)
+    if len(left) == 0:
+        return methods
+
+    start = time.perf_counter()
+    touch = shapely.touches(geoms[left], geoms[right])
+    methods[touch] = METHOD_TOUCH
+    if trace is not None:
+        trace.criterion("touches", time.perf_counter() - start, len(left))
+
+    start = time.perf_counter()
+    rest = np.flatnonzero(~touch)
+    intersecting = rest[shapely.intersects(geoms[left[rest]], geoms[right[rest]])]
+    if trace is not None:
+        trace.criterion("intersects", time.perf_counter() - start, len(rest))
+    if len(intersecting) == 0:
+        return methods
+
+    start = time.perf_counter()
+    if boundaries is None:
+        boundaries = shapely.boundary(geoms)
+    try:
+        shared = shapely.intersection(boundaries[left[intersecting]], boundaries[right[intersecting]])
+        shared_lengths = shapely.length(shared)
+    except shapely.errors.GEOSException:
+        # Fall back to the per-pair helper, which maps failures to 0 (not adjacent by this criterion)
+        shared_lengths = np.array([
+            compute_shared_boundary_length(geoms[i], geoms[j], EPSILON)
+            for i, j in zip(left[intersecting], right[intersecting])
+        ])
+    methods[intersecting[shared_lengths > EPSILON]] = METHOD_LINE
+    if trace is not None:
+        trace.criterion("shared_boundary_length", time.perf_counter() - start, len(intersecting))
+    return methods
+
+
+def compute_adjacency_bulk(polygons: Dict[str, Union[Polygon, MultiPolygon]], trace: Optional[AdjacencyTrace] = None) -> Tuple[Set[Tuple[str, str]], Dict[Tuple[str, str], str]]:
+    """
+    Bulk equivalent of compute_adjacency.
+
+    Every criterion in compute_adjacency implies distance <= GAP_TOLERANCE, so a single
+    STRtree dwithin query yields exactly the edge set. Touch/line/distance classification
+    then runs on the pair arrays; sids are only materialized for the final result.
+
+    If trace is given, each step is recorded as a phase, each predicate as a vectorized
+    criterion, and settlements are ranked by vertices x candidates (per-settlement
+    timings need --engine loop).
+
+    Returns the same (edges, edge_sources) structures as compute_adjacency.
+    """
+    print(f"Computing adjacency (bulk) for {len(polygons)} geometries...")
+    print(f"  EPSILON: {EPSILON}, GAP_TOLERANCE: {GAP_TOLERANCE}")
+    start_time = time.time()
+
+    sids = list(polygons.keys())
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    ranks = sid_ranks(sids)
+
+    phase = trace.phase if trace is not None else _null_phase
+
+    print("Building spatial index...")
+    with phase("index"):
+        tree = STRtree(geoms)
+        tree.query(geoms[:1])  # STRtree builds lazily on first query
+
+    print("Querying candidate pairs...")
+    with phase("query"):
+        left, right = query_candidate_pairs(tree, geoms, ranks)
+    print(f"  {len(left)} pairs within GAP_TOLERANCE ({time.time() - start_time:.1f}s elapsed)")
+
+    print("Classifying pairs...")
+    with phase("classify"):
+        methods = classify_pairs(geoms, left, right, trace=trace)
+
+    with phase("materialize"):
+        edges, edge_sources = pairs_to_edges(sids, left, right, methods)
+
+    if trace is not None:
+        # Candidates per settlement, counted from both ends of each pair
+        candidate_counts = np.bincount(np.concatenate([left, right]), minlength=len(sids))
+        trace.candidate_counts(sids, candidate_counts, shapely.get_num_coordinates(geoms))
+        trace.settlement_count = len(sids)
+        counts = np.bincount(methods, minlength=len(EDGE_METHODS))
+        trace.edge_breakdown = {name: int(counts[code]) for code, name in enumerate(EDGE_METHODS)}
+
+    elapsed = time.time() - start_time
+    print(f"  Adjacency computation complete in {elapsed:.1f}s")
+    print_edge_summary(edges, methods)
+
+    return edges, edge_sources
+
+
+def pairs_to_edges(sids: List[str], left: "np.ndarray", right: "np.ndarray", methods: "np.ndarray") -> Tuple[Set[Tuple[str, str]], Dict[Tuple[str, str], str]]:
+    """Materialize pair arrays as the (edges, edge_sources) structures used by the writers."""
+    edges = set()
+    edge_sources = {}
+    for i, j, method in zip(left.tolist(), right.tolist(), methods.tolist()):
+        edge = (sids[i], sids[j])
+        edges.add(edge)
+        edge_sources[edge] = EDGE_METHODS[method]
+    return edges, edge_sources
+
+
+def print_edge_summary(edges: Set[Tuple[str, str]], methods: "np.ndarray") -> None:
+    """Print total edges and the per-method breakdown."""
+    counts = np.bincount(methods, minlength=len(EDGE_METHODS))
+    print(f"  Total edges: {len(edges)}")
+    print(f"  Edge breakdown: touch={counts[METHOD_TOUCH]}, line={counts[METHOD_LINE]}, distance={counts[METHOD_DISTANCE]}")
+
+
+def plan_tiles(geoms: "np.ndarray", tiles_per_side: int) -> List[dict]:
+    """
+    Split the extent into a tiles_per_side x tiles_per_side grid.
+
+    Each geometry is a core member of exactly one tile (the one containing its bbox center).
+    A tile's halo holds every geometry whose bbox comes within GAP_TOLERANCE of the
+    bbox of its core members, so all pairs with a core member can be found locally.
+    """
+    bounds = shapely.bounds(geoms)
+    minx, miny = bounds[:, 0].min(), bounds[:, 1].min()
+    maxx, maxy = bounds[:, 2].max(), bounds[:, 3].max()
+    width = max(maxx - minx, 1e-9) / tiles_per_side
+    height = max(maxy - miny, 1e-9) / tiles_per_side
+
+    cx = (bounds[:, 0] + bounds[:, 2]) / 2
+    cy = (bounds[:, 1] + bounds[:, 3]) / 2
+    col = np.clip(((cx - minx) / width).astype(np.int64), 0, tiles_per_side - 1)
+    row = np.clip(((cy - miny) / height).astype(np.int64), 0, tiles_per_side - 1)
+    tile_of = row * tiles_per_side + col
+
+    tree = STRtree(shapely.box(bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]))
+    tiles = []
+    for tile_id in range(tiles_per_side * tiles_per_side):
+        core = np.flatnonzero(tile_of == tile_id)
+        if len(core) == 0:
+            continue
+        core_bounds = bounds[core]
+        halo_box = box(
+            core_bounds[:, 0].min() - GAP_TOLERANCE,
+            core_bounds[:, 1].min() - GAP_TOLERANCE,
+            core_bounds[:, 2].max() + GAP_TOLERANCE,
+            core_bounds[:, 3].max() + GAP_TOLERANCE
+        )
+        halo = np.sort(tree.query(halo_box))
+        tiles.append({
+            "tile": f"{tile_id // tiles_per_side}_{tile_id % tiles_per_side}",
+            "core": core,
+            "halo": halo
+        })
+    return tiles
+
+
+def _process_tile(tile_name: str, core: "np.ndarray", halo: "np.ndarray", halo_wkb: "np.ndarray", ranks: "np.ndarray", traced: bool = False) -> Tuple[str, "np.ndarray", "np.ndarray", "np.ndarray", float, dict]:
+    """
+    Worker: find and classify pairs whose lower-ranked member is a core geometry of this tile.
+    Returns (tile_name, left, right, methods, seconds, criteria) with global indices;
+    criteria holds the per-criterion timings when traced (else it is empty).
+    """
+    start_time = time.time()
+    halo_geoms = shapely.from_wkb(halo_wkb)
+    local_of = {int(g): k for k, g in enumerate(halo.tolist())}
+    core_local = np.array([local_of[int(g)] for g in core.tolist()], dtype=np.int64)
+
+    tree = STRtree(halo_geoms)
+    q_left, q_right = tree.query(halo_geoms[core_local], predicate="dwithin", distance=GAP_TOLERANCE)
+    local_left = core_local[q_left]
+    local_right = q_right
+    halo_ranks = ranks[halo]
+    keep = halo_ranks[local_left] < halo_ranks[local_right]
+    local_left = local_left[keep]
+    local_right = local_right[keep]
+
+    tile_trace = AdjacencyTrace("tile") if traced else None
+    methods = classify_pairs(halo_geoms, local_left, local_right, trace=tile_trace)
+    criteria = tile_trace.criteria if tile_trace is not None else {}
+    return tile_name, halo[local_left], halo[local_right], methods, time.time() - start_time, criteria
+
+
+def compute_adjacency_sharded(polygons: Dict[str, Union[Polygon, MultiPolygon]], workers: int, tiles_per_worker: int = 4, trace: Optional[AdjacencyTrace] = None) -> Tuple[Set[Tuple[str, str]], Dict[Tuple[str, str], str], List[dict]]:
+    """
+    Multi-process equivalent of compute_adjacency_bulk.
+
+    The extent is split into tiles with a GAP_TOLERANCE halo (see plan_tiles); each tile's
+    pairs are found and classified in a process pool. Every pair is owned by the tile of its
+    lower-ranked member, and the merge sorts and de-duplicates on sid pairs, so the output
+    does not depend on the worker count.
+
+    If trace is given, the workers' per-criterion timings are summed into it (seconds are
+    CPU time across all workers) and candidate counts are recorded as in compute_adjacency_bulk.
+
+    Returns (edges, edge_sources, tile_stats) where tile_stats lists per-tile sizes and timings.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    print(f"Computing adjacency (sharded, {workers} workers) for {len(polygons)} geometries...")
+    print(f"  EPSILON: {EPSILON}, GAP_TOLERANCE: {GAP_TOLERANCE}")
+    start_time = time.time()
+
+    sids = list(polygons.keys())
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    ranks = sid_ranks(sids)
+
+    tiles_per_side = max(1, math.ceil(math.sqrt(workers * tiles_per_worker)))
+    tiles = plan_tiles(geoms, tiles_per_side)
+    print(f"  {len(tiles)} non-empty tiles on a {tiles_per_side}x{tiles_per_side} grid")
+
+    wkb = shapely.to_wkb(geoms)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_process_tile, tile["tile"], tile["core"], tile["halo"], wkb[tile["halo"]], ranks, trace is not None)
+            for tile in tiles
+        ]
+        for future in futures:
+            results.append(future.result())
+
+    tile_stats = []
+    for tile, (tile_name, _, t_left, _, seconds, criteria) in zip(tiles, results):
+        if trace is not None:
+            for name, entry in criteria.items():
+                trace.criterion(name, entry["seconds"], entry["calls"])
+        tile_stats.append({
+            "tile": tile_name,
+            "core_count": int(len(tile["core"])),
+            "halo_count": int(len(tile["halo"])),
+            "pair_count": int(len(t_left)),
+            "seconds": round(seconds, 3)
+        })
+
+    # Deterministic merge: sort by (rank_a, rank_b) and de-duplicate on the pair
+    left = np.concatenate([r[1] for r in results]) if results else np.empty(0, dtype=np.int64)
+    right = np.concatenate([r[2] for r in results]) if results else np.empty(0, dtype=np.int64)
+    methods = np.concatenate([r[3] for r in results]) if results else np.empty(0, dtype=np.uint8)
+    order = np.lexsort((ranks[right], ranks[left]))
+    left, right, methods = left[order], right[order], methods[order]
+    if len(left) > 1:
+        unique = np.ones(len(left), dtype=bool)
+        unique[1:] = (left[1:] != left[:-1]) | (right[1:] != right[:-1])
+        left, right, methods = left[unique], right[unique], methods[unique]
+
+    edges, edge_sources = pairs_to_edges(sids, left, right, methods)
+
+    if trace is not None:
+        candidate_counts = np.bincount(np.concatenate([left, right]), minlength=len(sids))
+        trace.candidate_counts(sids, candidate_counts, shapely.get_num_coordinates(geoms))
+        trace.settlement_count = len(sids)
+        counts = np.bincount(methods, minlength=len(EDGE_METHODS))
+        trace.edge_breakdown = {name: int(counts[code]) for code, name in enumerate(EDGE_METHODS)}
+
+    elapsed = time.time() - start_time
+    slowest = max(tile_stats, key=lambda t: t["seconds"]) if tile_stats else None
+    print(f"  Adjacency computation complete in {elapsed:.1f}s")
+    if slowest:
+        print(f"  Slowest tile: {slowest['tile']} ({slowest['seconds']:.2f}s, {slowest['core_count']} core, {slowest['halo_count']} halo)")
+    print_edge_summary(edges, methods)
+
+    return edges, edge_sources, tile_stats
+
+
+def geometry_fingerprints(polygons: Dict[str, Union[Polygon, MultiPolygon]]) -> Dict[str, str]:
+    """
+    Canonical geometry hash per sid: SHA-256 of the WKB of the normalized geometry.
+    Normalization makes the hash independent of ring start vertex and part order.
+    """
+    sids = list(polygons.keys())
+    wkb = shapely.to_wkb(shapely.normalize(np.array([polygons[sid] for sid in sids], dtype=object)))
+    return {sid: hashlib.sha256(blob).hexdigest() for sid, blob in zip(sids, wkb)}
+
+
+def load_adjacency_cache(cache_path: Path) -> Optional[dict]:
+    """
+    Load the incremental adjacency cache.
+    Returns None if it is missing, unreadable or was built with different parameters.
+    """
+    if not cache_path.exists():
+        return None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except Exception as e:
+        print(f"WARNING: Ignoring unreadable adjacency cache {cache_path}: {e}", file=sys.stderr)
+        return None
+    if (cache.get("script_version") != SCRIPT_VERSION or
+            cache.get("epsilon") != EPSILON or
+            cache.get("gap_tolerance") != GAP_TOLERANCE):
+        print("Adjacency cache was built with different parameters, ignoring it")
+        return None
+    return cache
+
+
+def write_adjacency_cache(cache_path: Path, fingerprints: Dict[str, str], edges: Set[Tuple[str, str]], edge_sources: Dict[Tuple[str, str], str]) -> None:
+    """Write fingerprints and the edge list with sources for the next incremental run."""
+    cache = {
+        "version": "1.0.0",
+        "script_version": SCRIPT_VERSION,
+        "epsilon": EPSILON,
+        "gap_tolerance": GAP_TOLERANCE,
+        "fingerprints": {sid: fingerprints[sid] for sid in sorted(fingerprints)},
+        "edges": [[a, b, edge_sources[(a, b)]] for a, b in sorted(edges)]
+    }
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def compute_adjacency_incremental(polygons: Dict[str, Union[Polygon, MultiPolygon]], fingerprints: Dict[str, str], cache: dict, trace: Optional[AdjacencyTrace] = None) -> Tuple[Set[Tuple[str, str]], Dict[Tuple[str, str], str]]:
+    """
+    Patch the cached edge graph instead of recomputing it.
+
+    A pair's classification depends only on its two geometries, so cached edges between
+    unchanged sids are kept as-is. Edges touching changed, added or removed sids are dropped,
+    and the changed/added sids are re-queried against the full STRtree to find their new
+    neighbours. The result is identical to a cold run.
+
+    If trace is given, the re-queried pairs' criteria and candidate counts are recorded.
+    """
+    start_time = time.time()
+    cached_fingerprints = cache.get("fingerprints", {})
+
+    changed = {sid for sid, fp in fingerprints.items() if sid in cached_fingerprints and cached_fingerprints[sid] != fp}
+    added = {sid for sid in fingerprints if sid not in cached_fingerprints}
+    removed = {sid for sid in cached_fingerprints if sid not in fingerprints}
+    dirty = changed | added | removed
+    print(f"Computing adjacency (incremental): {len(changed)} changed, {len(added)} added, {len(removed)} removed")
+
+    edges = set()
+    edge_sources = {}
+    for a, b, source in cache.get("edges", []):
+        if a in dirty or b in dirty:
+            continue
+        edges.add((a, b))
+        edge_sources[(a, b)] = source
+    kept = len(edges)
+
+    requery = sorted(changed | added)
+    if requery:
+        sids = list(polygons.keys())
+        index_of = {sid: i for i, sid in enumerate(sids)}
+        geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+        ranks = sid_ranks(sids)
+        tree = STRtree(geoms)
+
+        query_idx = np.array([index_of[sid] for sid in requery], dtype=np.int64)
+        q_left, q_right = tree.query(geoms[query_idx], predicate="dwithin", distance=GAP_TOLERANCE)
+        a_idx = query_idx[q_left]
+        b_idx = q_right
+        not_self = a_idx != b_idx
+        a_idx, b_idx = a_idx[not_self], b_idx[not_self]
+
+        # Orient as (lower sid, higher sid) and drop pairs found from both dirty ends
+        swap = ranks[a_idx] > ranks[b_idx]
+        left = np.where(swap, b_idx, a_idx)
+        right = np.where(swap, a_idx, b_idx)
+        pair_keys = np.unique(left * len(sids) + right)
+        left, right = pair_keys // len(sids), pair_keys % len(sids)
+
+        methods = classify_pairs(geoms, left, right, trace=trace)
+        if trace is not None:
+            candidate_counts = np.bincount(q_left[not_self], minlength=len(query_idx))
+            trace.candidate_counts(requery, candidate_counts, shapely.get_num_coordinates(geoms[query_idx]))
+        new_edges, new_sources = pairs_to_edges(sids, left, right, methods)
+        edges |= new_edges
+        edge_sources.update(new_sources)
+
+    elapsed = time.time() - start_time
+    print(f"  Kept {kept} cached edges, recomputed {len(edges) - kept} edges for {len(requery)} settlement(s) in {elapsed:.1f}s")
+    print(f"  Total edges: {len(edges)}")
+
+    return edges, edge_sources
+
+
+def snap_vertices(vertices: "np.ndarray", snap_grid: float = SNAP_GRID) -> "np.ndarray":
+    """
+    Snap distinct vertices that lie within snap_grid of each other to one id.
+    Unlike rounding to a grid, near-coincident vertices never end up in different cells.
+    Returns an id per vertex (the smallest index in its cluster).
+    """
+    labels = np.arange(len(vertices), dtype=np.int64)
+    if len(vertices) == 0:
+        return labels
+    tree = STRtree(shapely.points(vertices))
+    a, b = tree.query(shapely.points(vertices), predicate="dwithin", distance=snap_grid)
+    close = a != b
+    a, b = a[close], b[close]
+    # Min-label propagation over the "within snap_grid" graph until stable
+    while len(a):
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, a, labels[b])
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return labels
+
+
+def split_segments_at_vertices(p: "np.ndarray", q: "np.ndarray", owner: "np.ndarray", snap_grid: float = SNAP_GRID) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Split segments p->q at every ring vertex lying within snap_grid of their interior.
+    Vertices of the segment's own geometry count too, so both sides of a shared border
+    are split at the same points. Returns the (p, q, owner) arrays of the resulting sub-segments,
+    in segment order.
+    """
+    if len(p) == 0:
+        return p, q, owner
+    vertices = np.unique(p, axis=0)
+    tree = STRtree(shapely.linestrings(np.stack([p, q], axis=1)))
+    v_idx, seg_idx = tree.query(shapely.points(vertices), predicate="dwithin", distance=snap_grid)
+    if len(v_idx) == 0:
+        return p, q, owner
+
+    # Parameter of the vertex along its segment; keep strictly interior hits
+    d = q[seg_idx] - p[seg_idx]
+    seg_len_sq = np.einsum('ij,ij->i', d, d)
+    t = np.einsum('ij,ij->i', vertices[v_idx] - p[seg_idx], d) / np.where(seg_len_sq > 0, seg_len_sq, 1.0)
+    seg_len = np.sqrt(seg_len_sq)
+    margin = np.where(seg_len > 0, snap_grid / np.where(seg_len > 0, seg_len, 1.0), 1.0)
+    interior = (t > margin) & (t < 1 - margin)
+    v_idx, seg_idx, t = v_idx[interior], seg_idx[interior], t[interior]
+    if len(seg_idx) == 0:
+        return p, q, owner
+
+    # Break points per segment: start (t=0), inserted vertices, end (t=1)
+    n = len(p)
+    all_seg = np.concatenate([np.arange(n), seg_idx, np.arange(n)])
+    all_t = np.concatenate([np.zeros(n), t, np.ones(n)])
+    all_pts = np.concatenate([p, vertices[v_idx], q])
+    order = np.lexsort((all_t, all_seg))
+    all_seg, all_pts = all_seg[order], all_pts[order]
+    same_seg = all_seg[:-1] == all_seg[1:]
+    return all_pts[:-1][same_seg], all_pts[1:][same_seg], owner[all_seg[:-1][same_seg]]
+
+
+def shared_segment_lengths(geoms: "np.ndarray", snap_grid: float = SNAP_GRID) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Shared border length per geometry pair via a snapped-segment index.
+
+    All ring segments (exterior and interior) are first split at vertices of other rings
+    lying on them (T-junctions), so any collinear overlap becomes a run of whole segments
+    on both sides. Segments are then keyed by their snapped, orientation-normalized
+    endpoints (see snap_vertices); a key owned by two geometries is a shared border segment. Shared borders
+    are found by hash grouping instead of boundary intersection.
+
+    Returns (left, right, lengths) with left < right as geometry indices.
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+    parts, part_owner = shapely.get_parts(geoms, return_index=True)
+    rings, ring_part = shapely.get_rings(parts, return_index=True)
+    ring_owner = part_owner[ring_part]
+    if len(rings) == 0:
+        return empty
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+
+    # Segment k runs from coords[k] to coords[k + 1] when both belong to the same ring
+    same_ring = coord_ring[:-1] == coord_ring[1:]
+    start = np.flatnonzero(same_ring)
+    owner = ring_owner[coord_ring[start]]
+    p, q, owner = split_segments_at_vertices(coords[start], coords[start + 1], owner, snap_grid)
+    lengths = np.hypot(q[:, 0] - p[:, 0], q[:, 1] - p[:, 1])
+
+    # Key each segment by the snapped vertex ids of its endpoints, orientation-normalized
+    vertices, vertex_id = np.unique(np.concatenate([p, q]), axis=0, return_inverse=True)
+    vertex_id = snap_vertices(vertices, snap_grid)[vertex_id.ravel()]
+    id_p, id_q = vertex_id[:len(p)], vertex_id[len(p):]
+    keys = np.column_stack([np.minimum(id_p, id_q), np.maximum(id_p, id_q)])
+    non_degenerate = keys[:, 0] != keys[:, 1]
+    keys, owner, lengths = keys[non_degenerate], owner[non_degenerate], lengths[non_degenerate]
+    if len(keys) == 0:
+        return empty
+
+    # Group by segment key; within a group, sort by owner
+    order = np.lexsort((owner, keys[:, 1], keys[:, 0]))
+    keys, owner, lengths = keys[order], owner[order], lengths[order]
+    new_key = np.ones(len(keys), dtype=bool)
+    new_key[1:] = np.any(keys[1:] != keys[:-1], axis=1)
+    group = np.cumsum(new_key) - 1
+
+    # Drop repeated (segment, owner) rows, then pair up owners within each group
+    first_of_owner = np.ones(len(keys), dtype=bool)
+    first_of_owner[1:] = new_key[1:] | (owner[1:] != owner[:-1])
+    group, owner, lengths = group[first_of_owner], owner[first_of_owner], lengths[first_of_owner]
+
+    group_sizes = np.bincount(group)
+    pair_left = []
+    pair_right = []
+    pair_length = []
+    # Common case: exactly two owners per shared segment
+    two = np.flatnonzero(group_sizes[group] == 2)
+    two = two[np.r_[True, group[two][1:] != group[two][:-1]]] if len(two) else two
+    pair_left.append(owner[two])
+    pair_right.append(owner[two + 1])
+    pair_length.append(lengths[two])
+    # Rare case: overlapping rings with three or more owners
+    group_start = np.r_[0, np.cumsum(group_sizes)[:-1]]
+    for g in np.flatnonzero(group_sizes > 2):
+        members = owner[group_start[g]:group_start[g] + group_sizes[g]]
+        length = lengths[group_start[g]]
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                pair_left.append(members[a:a + 1])
+                pair_right.append(members[b:b + 1])
+                pair_length.append(np.array([length]))
+
+    left = np.concatenate(pair_left)
+    right = np.concatenate(pair_right)
+    seg_lengths = np.concatenate(pair_length)
+    if len(left) == 0:
+        return empty
+
+    n = len(geoms)
+    pair_keys, inverse = np.unique(left * n + right, return_inverse=True)
+    totals = np.bincount(inverse, weights=seg_lengths)
+    return pair_keys // n, pair_keys % n, totals
+
+
+def compute_edge_weights(polygons: Dict[str, Union[Polygon, MultiPolygon]], edges: Set[Tuple[str, str]]) -> List[dict]:
+    """
+    Per-edge attributes for the weighted sidecar: method, shared_length and min_distance.
+    shared_length comes from shared_segment_lengths; min_distance is one vectorized
+    distance call over the edge pair arrays. method is derived from the same two values, so
+    it cannot contradict them: line if shared_length > EPSILON, touch if the geometries meet
+    without a shared border, distance otherwise. Edges are returned in sorted order.
+    """
+    sids = list(polygons.keys())
+    index_of = {sid: i for i, sid in enumerate(sids)}
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    sorted_edges = sorted(edges)
+    left = np.array([index_of[a] for a, _ in sorted_edges], dtype=np.int64)
+    right = np.array([index_of[b] for _, b in sorted_edges], dtype=np.int64)
+
+    distances = shapely.distance(geoms[left], geoms[right]) if len(left) else np.empty(0)
+
+    seg_left, seg_right, seg_lengths = shared_segment_lengths(geoms)
+    n = len(sids)
+    shared = dict(zip((seg_left * n + seg_right).tolist(), seg_lengths.tolist()))
+    edge_keys = (np.minimum(left, right) * n + np.maximum(left, right)).tolist()
+    shared_lengths = np.array([shared.get(key, 0.0) for key in edge_keys])
+
+    methods = np.full(len(left), METHOD_DISTANCE, dtype=np.uint8)
+    methods[distances == 0] = METHOD_TOUCH
+    methods[shared_lengths > EPSILON] = METHOD_LINE
+
+    weighted = []
+    for (a, b), method, length, distance in zip(sorted_edges, methods.tolist(), shared_lengths.tolist(), distances.tolist()):
+        weighted.append({
+            "a": a,
+            "b": b,
+            "method": EDGE_METHODS[method],
+            "shared_length": round(length, 6),
+            "min_distance": round(distance, 6)
+        })
+    return weighted
+
+
+def check_edge_weights(polygons: Dict[str, Union[Polygon, MultiPolygon]], weighted: List[dict], sample_size: int = WEIGHT_CHECK_SAMPLE, tolerance: float = EPSILON) -> dict:
+    """
+    Re-measure shared_length on an evenly spaced sample of weighted edges as the length of
+    boundary(a) & boundary(b), snap-rounded to SNAP_GRID like the segment index, and count
+    the edges that differ by more than tolerance.
+    """
+    step = max(1, len(weighted) // sample_size) if sample_size > 0 else max(1, len(weighted))
+    sample = weighted[::step][:sample_size]
+    if not sample:
+        return {"sample_size": 0, "mismatch_count": 0, "max_difference": 0.0, "mismatches": []}
+    a = np.array([polygons[edge["a"]] for edge in sample], dtype=object)
+    b = np.array([polygons[edge["b"]] for edge in sample], dtype=object)
+    try:
+        exact = shapely.length(shapely.intersection(shapely.boundary(a), shapely.boundary(b), grid_size=SNAP_GRID))
+    except shapely.errors.GEOSException:
+        exact = np.array([
+            compute_shared_boundary_length(p, q, 0.0) for p, q in zip(a, b)
+        ])
+    difference = np.abs(np.array([edge["shared_length"] for edge in sample]) - exact)
+    mismatched = np.flatnonzero(difference > tolerance)
+    return {
+        "sample_size": len(sample),
+        "tolerance": tolerance,
+        "mismatch_count": int(len(mismatched)),
+        "max_difference": round(float(difference.max()), 6),
+        "mismatches": [
+            {"a": sample[k]["a"], "b": sample[k]["b"], "shared_length": sample[k]["shared_length"], "boundary_intersection_length": round(float(exact[k]), 6)}
+            for k in mismatched[:20].tolist()
+        ]
+    }
+
+
+MUN_ROLLUP_KEYS = ("mun1990_id", "mun_code")
+
+
+def rollup_municipality_edges(sorted_edges: List[Tuple[str, str]], properties: Dict[str, dict], key: str, shared_lengths: Optional[Sequence[float]] = None) -> Optional[dict]:
+    """
+    Aggregate settlement edges into a municipality graph keyed by properties[sid][key].
+    
+    One linear pass over the edge arrays, no geometry work: each cross-municipality pair
+    carries its settlement edge count and, when shared_lengths (aligned with sorted_edges,
+    e.g. from compute_edge_weights) is given, the summed shared border length. Edges inside
+    one municipality are counted per node. Returns None if no settlement has the key.
+    """
+    sids = sorted(properties.keys())
+    codes = [str(properties[sid].get(key, "") or "") for sid in sids]
+    mun_ids = sorted(set(code for code in codes if code))
+    if not mun_ids:
+        return None
+    
+    # Municipality index per settlement (-1 = unassigned)
+    mun_index = {mun: i for i, mun in enumerate(mun_ids)}
+    sid_mun = {sid: mun_index.get(code, -1) for sid, code in zip(sids, codes)}
+    settlement_counts = np.bincount([m for m in sid_mun.values() if m >= 0], minlength=len(mun_ids))
+    
+    a = np.fromiter((sid_mun.get(sid1, -1) for sid1, _ in sorted_edges), dtype=np.int64, count=len(sorted_edges))
+    b = np.fromiter((sid_mun.get(sid2, -1) for _, sid2 in sorted_edges), dtype=np.int64, count=len(sorted_edges))
+    lengths = np.asarray(shared_lengths, dtype=np.float64) if shared_lengths is not None else None
+    
+    assigned = (a >= 0) & (b >= 0)
+    internal = assigned & (a == b)
+    internal_counts = np.bincount(a[internal], minlength=len(mun_ids))
+    
+    cross = assigned & (a != b)
+    low = np.minimum(a[cross], b[cross])
+    high = np.maximum(a[cross], b[cross])
+    pair_keys, inverse, pair_counts = np.unique(low * len(mun_ids) + high, return_inverse=True, return_counts=True)
+    pair_lengths = np.bincount(inverse, weights=lengths[cross], minlength=len(pair_keys)) if lengths is not None else None
+    
+    nodes = [
+        {"id": mun, "settlement_count": int(settlement_counts[i]), "internal_edge_count": int(internal_counts[i])}
+        for i, mun in enumerate(mun_ids)
+    ]
+    mun_edges = []
+    for k, (pair_key, count) in enumerate(zip(pair_keys.tolist(), pair_counts.tolist())):
+        edge = {
+            "a": mun_ids[pair_key // len(mun_ids)],
+            "b": mun_ids[pair_key % len(mun_ids)],
+            "settlement_edge_count": count
+        }
+        if pair_lengths is not None:
+            edge["shared_length"] = round(float(pair_lengths[k]), 6)
+        mun_edges.append(edge)
+    
+    return {
+        "key": key,
+        "node_count": len(nodes),
+        "edge_count": len(mun_edges),
+        "unassigned_settlement_count": sum(1 for m in sid_mun.values() if m < 0),
+        "unassigned_edge_count": int((~assigned).sum()),
+        "nodes": nodes,
+        "edges": mun_edges
+    }
+
+
+def write_edges_json(edges_path: Path, sorted_edges: List[Tuple[str, str]], batch_size: int = 4096) -> str:
+    """
+    Stream settlement_edges.json to disk and return its SHA-256.
+
+    The output is byte-identical to json.dumps({"version", "allow_self_loops_default", "edges"},
+    indent=2, ensure_ascii=False, sort_keys=True); it is written and hashed in batches of
+    edges so the full document never exists as one string.
+    """
+    digest = hashlib.sha256()
+    
+    def emit(f, text: str) -> None:
+        digest.update(text.encode('utf-8'))
+        f.write(text)
+    
+    with open(edges_path, 'w', encoding='utf-8') as f:
+        emit(f, '{\n  "allow_self_loops_default": false,\n  "edges": [')
+        if sorted_edges:
+            for start in range(0, len(sorted_edges), batch_size):
+                chunk = []
+                for k, (sid1, sid2) in enumerate(sorted_edges[start:start + batch_size], start):
+                    a = json.dumps(sid1, ensure_ascii=False)
+                    b = json.dumps(sid2, ensure_ascii=False)
+                    separator = '\n' if k == 0 else ',\n'
+                    chunk.append(f'{separator}    {{\n      "a": {a},\n      "b": {b}\n    }}')
+                emit(f, ''.join(chunk))
+            emit(f, '\n  ]')
+        else:
+            emit(f, ']')
+        emit(f, ',\n  "version": "1.0.0"\n}')
+    return digest.hexdigest()
+
+
+CSR_MAGIC = b"AWWVCSR1"
+CSR_HEADER = struct.Struct("<8sIIII32s")  # magic, version, node_count, edge_count, sid_table_bytes, payload sha256
+CSR_VERSION = 1
+
+
+def edge_index_arrays(sids: List[str], edges) -> Tuple["np.ndarray", "np.ndarray"]:
+    """(a, b) int64 index arrays into sids for an iterable of (sid1, sid2) edges."""
+    index_of = {sid: i for i, sid in enumerate(sids)}
+    edges = list(edges)
+    a = np.fromiter((index_of[sid1] for sid1, _ in edges), dtype=np.int64, count=len(edges))
+    b = np.fromiter((index_of[sid2] for _, sid2 in edges), dtype=np.int64, count=len(edges))
+    return a, b
+
+
+def edges_to_csr(node_count: int, a: "np.ndarray", b: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """Symmetric CSR (indptr, indices) of an undirected edge list; each row's neighbours are sorted."""
+    rows = np.concatenate([a, b])
+    cols = np.concatenate([b, a])
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(node_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=node_count), out=indptr[1:])
+    return indptr, cols[order]
+
+
+def write_edges_csr(csr_path: Path, sids: List[str], sorted_edges: List[Tuple[str, str]]) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Write the undirected edge set as a symmetric CSR graph in a small binary file.
+
+    Layout (little-endian): CSR_HEADER, then the payload: sid table (UTF-8 sids joined by
+    newlines, zero-padded to 4 bytes), indptr uint32[node_count + 1], indices uint32[2 * edge_count].
+    Nodes are the sorted sids; each row's neighbour indices are sorted. The header carries
+    the SHA-256 of the payload.
+    
+    Returns the in-memory (indptr, indices) so callers can run graph passes on the same arrays.
+    """
+    a, b = edge_index_arrays(sids, sorted_edges)
+    indptr, indices = edges_to_csr(len(sids), a, b)
+    
+    sid_table = '\n'.join(sids).encode('utf-8')
+    padding = b'\0' * (-len(sid_table) % 4)
+    payload = [sid_table + padding, indptr.astype('<u4').tobytes(), indices.astype('<u4').tobytes()]
+    digest = hashlib.sha256()
+    for part in payload:
+        digest.update(part)
+    
+    header = CSR_HEADER.pack(CSR_MAGIC, CSR_VERSION, len(sids), len(sorted_edges), len(sid_table), digest.digest())
+    with open(csr_path, 'wb') as f:
+        f.write(header)
+        for part in payload:
+            f.write(part)
+    return indptr, indices
+
+
+def read_edges_csr(csr_path: Path) -> Tuple[List[str], "np.ndarray", "np.ndarray"]:
+    """
+    Read a file written by write_edges_csr and verify its checksum.
+    Returns (sids, indptr, indices); the arrays are zero-copy views of the file contents.
+    Neighbours of sids[i] are sids[j] for j in indices[indptr[i]:indptr[i + 1]].
+    """
+    data = csr_path.read_bytes()
+    if len(data) < CSR_HEADER.size:
+        raise ValueError(f"{csr_path} is too short to be a CSR adjacency file")
+    magic, version, node_count, edge_count, sid_table_bytes, payload_sha256 = CSR_HEADER.unpack_from(data)
+    if magic != CSR_MAGIC or version != CSR_VERSION:
+        raise ValueError(f"{csr_path} is not a version {CSR_VERSION} CSR adjacency file")
+    payload = memoryview(data)[CSR_HEADER.size:]
+    if hashlib.sha256(payload).digest() != payload_sha256:
+        raise ValueError(f"{csr_path} checksum mismatch")
+    
+    sids = bytes(payload[:sid_table_bytes]).decode('utf-8').split('\n') if node_count else []
+    offset = sid_table_bytes + (-sid_table_bytes % 4)
+    indptr = np.frombuffer(payload, dtype='<u4', count=node_count + 1, offset=offset)
+    offset += indptr.nbytes
+    indices = np.frombuffer(payload, dtype='<u4', count=2 * edge_count, offset=offset)
+    return sids, indptr, indices
+
+
+def compute_degree_map(edges: Set[Tuple[str, str]], all_sids: Set[str]) -> Dict[str, int]:
+    """Degree of every settlement (0 for orphans), counted once for the report and the orphans list."""
+    sids = sorted(all_sids)
+    a, b = edge_index_arrays(sids, edges)
+    degrees = np.bincount(np.concatenate([a, b]), minlength=len(sids))
+    return dict(zip(sids, degrees.tolist()))
+
+
+def connected_components(indptr: "np.ndarray", indices: "np.ndarray") -> "np.ndarray":
+    """
+    Connected components of a symmetric CSR graph by vectorized min-label propagation.
+    Each pass lowers every node's label to its neighbours' minimum, hooks the old label
+    onto the new one, then pointer-jumps until labels are flat; passes repeat until stable.
+    Returns the component label per node: the smallest node index in its component.
+    """
+    node_count = len(indptr) - 1
+    labels = np.arange(node_count, dtype=np.int64)
+    indptr = np.asarray(indptr, dtype=np.int64)
+    indices = np.asarray(indices, dtype=np.int64)
+    if not len(indices):
+        return labels
+    nonempty = np.flatnonzero(np.diff(indptr))
+    while True:
+        neighbour_min = np.minimum.reduceat(labels[indices], indptr[nonempty])
+        lowered = labels.copy()
+        np.minimum.at(lowered, nonempty, neighbour_min)
+        np.minimum.at(lowered, labels[nonempty], lowered[nonempty])
+        while True:
+            jumped = lowered[lowered]
+            if np.array_equal(jumped, lowered):
+                break
+            lowered = jumped
+        if np.array_equal(lowered, labels):
+            return labels
+        labels = lowered
+
+
+def csr_subgraph(indptr: "np.ndarray", indices: "np.ndarray", keep: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+    """CSR of the same nodes restricted to the entries where keep (a mask over indices) is set."""
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    sub_indptr = np.zeros(len(indptr), dtype=np.int64)
+    np.cumsum(np.bincount(rows[keep], minlength=len(indptr) - 1), out=sub_indptr[1:])
+    return sub_indptr, indices[keep]
+
+
+def bridges_and_articulation_points(indptr: "np.ndarray", indices: "np.ndarray") -> Tuple[List[Tuple[int, int]], List[int]]:
+    """
+    Bridges and articulation points of a simple undirected CSR graph (Tarjan low-link).
+    The DFS keeps an explicit stack, so graph size is not bounded by the recursion limit.
+    Returns (bridges as (low, high) node pairs, articulation nodes), both sorted.
+    """
+    node_count = len(indptr) - 1
+    indptr = indptr.tolist()
+    indices = indices.tolist()
+    disc = [-1] * node_count
+    low = [0] * node_count
+    next_pos = indptr[:-1]
+    bridges = []
+    articulation = set()
+    timer = 0
+    
+    for root in range(node_count):
+        if disc[root] != -1:
+            continue
+        disc[root] = low[root] = timer
+        timer += 1
+        root_children = 0
+        stack = [(root, -1)]
+        while stack:
+            v, parent = stack[-1]
+            pos = next_pos[v]
+            if pos < indptr[v + 1]:
+                next_pos[v] = pos + 1
+                w = indices[pos]
+                if disc[w] == -1:
+                    disc[w] = low[w] = timer
+                    timer += 1
+                    if v == root:
+                        root_children += 1
+                    stack.append((w, v))
+                elif w != parent and disc[w] < low[v]:
+                    low[v] = disc[w]
+                continue
+            stack.pop()
+            if parent == -1:
+                continue
+            if low[v] < low[parent]:
+                low[parent] = low[v]
+            if low[v] > disc[parent]:
+                bridges.append((min(parent, v), max(parent, v)))
+            if parent != root and low[v] >= disc[parent]:
+                articulation.add(parent)
+        if root_children > 1:
+            articulation.add(root)
+    
+    return sorted(bridges), sorted(articulation)
+
+
+def graph_analytics(edges: Set[Tuple[str, str]], all_sids: Set[str], degree_map: Dict[str, int], properties: Dict[str, dict] = None, component_limit: int = 50, csr: Tuple["np.ndarray", "np.ndarray"] = None) -> dict:
+    """
+    Connectivity analytics for adjacency_report.json: connected components with a size
+    histogram, bridges (non-leaf bridges listed as choke points), articulation settlements,
+    and per-municipality component counts for every MUN_ROLLUP_KEYS key present in properties.
+    
+    Minor components (all but the largest, size >= 2) are listed with their sids up to
+    component_limit; orphans are already in orphans.json.
+    
+    csr is the (indptr, indices) pair over the sorted sids, as returned by write_edges_csr;
+    it is built from edges if omitted. Every pass below runs on these same arrays.
+    """
+    sids = sorted(all_sids)
+    if csr is None:
+        csr = edges_to_csr(len(sids), *edge_index_arrays(sids, edges))
+    indptr, indices = csr
+    labels = connected_components(indptr, indices)
+    component_ids, component_sizes = np.unique(labels, return_counts=True)
+    largest = int(component_sizes.max()) if len(component_sizes) else 0
+    size_values, size_counts = np.unique(component_sizes, return_counts=True)
+    
+    # Minor components, largest first, ties by smallest sid
+    members = {}
+    largest_id = int(component_ids[np.argmax(component_sizes)]) if len(component_ids) else -1
+    for node, label in enumerate(labels.tolist()):
+        if label != largest_id:
+            members.setdefault(label, []).append(sids[node])
+    minor = sorted((m for m in members.values() if len(m) >= 2), key=lambda m: (-len(m), m[0]))
+    
+    bridge_pairs, articulation = bridges_and_articulation_points(indptr, indices)
+    choke_bridges = [
+        {"a": sids[i], "b": sids[j]} for i, j in bridge_pairs
+        if degree_map[sids[i]] > 1 and degree_map[sids[j]] > 1
+    ]
+    
+    analytics = {
+        "component_count": int(len(component_ids)),
+        "largest_component_size": largest,
+        "component_size_histogram": {str(size): count for size, count in zip(size_values.tolist(), size_counts.tolist())},
+        "minor_component_count": len(minor),
+        "minor_components": [{"size": len(m), "sids": m} for m in minor[:component_limit]],
+        "bridge_count": len(bridge_pairs),
+        "leaf_bridge_count": len(bridge_pairs) - len(choke_bridges),
+        "bridges": choke_bridges,
+        "articulation_count": len(articulation),
+        "articulation_sids": [sids[i] for i in articulation]
+    }
+    
+    if properties:
+        municipality_components = {}
+        rows = np.repeat(np.arange(len(sids)), np.diff(indptr))
+        for key in MUN_ROLLUP_KEYS:
+            codes = [str(properties.get(sid, {}).get(key, "") or "") for sid in sids]
+            if not any(codes):
+                continue
+            # Components of each municipality's own subgraph (edges inside the municipality only);
+            # code index 0 is the empty code when present, since "" sorts first
+            code_values, code_index = np.unique(np.array(codes, dtype=object), return_inverse=True)
+            coded = code_index != 0 if code_values[0] == "" else np.ones(len(sids), dtype=bool)
+            internal = (code_index[rows] == code_index[indices]) & coded[rows]
+            internal_labels = connected_components(*csr_subgraph(indptr, indices, internal))
+            pairs, sizes = np.unique(np.stack([code_index[coded], internal_labels[coded]]), axis=1, return_counts=True)
+            per_mun = {}
+            for code, label, size in zip(pairs[0].tolist(), pairs[1].tolist(), sizes.tolist()):
+                per_mun.setdefault(code_values[code], {})[label] = size
+            fragmented = {
+                mun: {"component_count": len(parts), "component_sizes": sorted(parts.values(), reverse=True)}
+                for mun, parts in sorted(per_mun.items()) if len(parts) > 1
+            }
+            municipality_components[key] = {
+                "municipality_count": len(per_mun),
+                "fragmented_count": len(fragmented),
+                "fragmented": fragmented
+            }
+        if municipality_components:
+            analytics["municipality_components"] = municipality_components
+    
+    return analytics
+
+
+def generate_report(edges: Set[Tuple[str, str]], all_sids: Set[str], edge_sources: Dict[Tuple[str, str], str] = None, invalid_geometry_count: int = 0, edges_sha256: str = None, incomplete: bool = False, tile_stats: List[dict] = None, degree_map: Dict[str, int] = None, properties: Dict[str, dict] = None, csr: Tuple["np.ndarray", "np.ndarray"] = None) -> dict:
     """
     Generate adjacency report statistics.
     
@@ -391,15 +1927,16 @@ def generate_report(edges: Set[Tuple[str, str]], all_sids: Set[str], edge_source
         invalid_geometry_count: Number of invalid geometries skipped
         edges_sha256: SHA256 hash of edges JSON
         incomplete: True if report is incomplete (e.g., due to timeout/exception)
+        tile_stats: Per-tile sizes and timings from compute_adjacency_sharded (--workers > 1)
+        degree_map: Precomputed compute_degree_map result (computed here if omitted)
+        properties: Settlement properties, for per-municipality component counts
+        csr: (indptr, indices) from write_edges_csr, reused by the graph analytics
     
     Returns:
         Dictionary with report data including self-identification fields
     """
-    # Calculate degrees
-    degree_map = {sid: 0 for sid in all_sids}
-    for sid1, sid2 in edges:
-        degree_map[sid1] += 1
-        degree_map[sid2] += 1
+    if degree_map is None:
+        degree_map = compute_degree_map(edges, all_sids)
     
     degrees = list(degree_map.values())
     total_degree = sum(degrees)
@@ -407,11 +1944,10 @@ def generate_report(edges: Set[Tuple[str, str]], all_sids: Set[str], edge_source
     orphan_count = sum(1 for d in degrees if d == 0)
     max_degree = max(degrees) if degrees else 0
     
-    # Top degree sids
+    # Top degree sids (ties broken by sid so the report does not depend on set iteration order)
     top_degree_sids = sorted(
         [(sid, degree) for sid, degree in degree_map.items()],
-        key=lambda x: x[1],
-        reverse=True
+        key=lambda x: (-x[1], x[0])
     )[:10]
     
     # Count edges by source method - ALWAYS include edge_breakdown
@@ -440,7 +1976,8 @@ def generate_report(edges: Set[Tuple[str, str]], all_sids: Set[str], edge_source
         "max_degree": max_degree,
         "top_degree_sids": [{"sid": sid, "degree": degree} for sid, degree in top_degree_sids],
         "invalid_geometry_count": invalid_geometry_count,
-        "edge_breakdown": edge_breakdown
+        "edge_breakdown": edge_breakdown,
+        "graph": graph_analytics(edges, all_sids, degree_map, properties, csr=csr)
     }
     
     # Add optional fields
@@ -453,201 +1990,257 @@ def generate_report(edges: Set[Tuple[str, str]], all_sids: Set[str], edge_source
     if incomplete:
         report["incomplete"] = True
     
+    if tile_stats:
+        report["sharding"] = {
+            "tile_count": len(tile_stats),
+            "total_tile_seconds": round(sum(t["seconds"] for t in tile_stats), 3),
+            "tiles": tile_stats
+        }
+    
     return report
 
 
-def get_orphans(edges: Set[Tuple[str, str]], all_sids: Set[str]) -> List[str]:
+def get_orphans(edges: Set[Tuple[str, str]], all_sids: Set[str], degree_map: Dict[str, int] = None) -> List[str]:
     """Get list of orphan settlement IDs (degree 0)."""
-    degree_map = {sid: 0 for sid in all_sids}
-    for sid1, sid2 in edges:
-        degree_map[sid1] += 1
-        degree_map[sid2] += 1
+    if degree_map is None:
+        degree_map = compute_degree_map(edges, all_sids)
     
     return sorted([sid for sid, degree in degree_map.items() if degree == 0])
 
 
-def calibrate_gap_tolerance(polygons: Dict[str, Union[Polygon, MultiPolygon]], sample_size: int = 500) -> dict:
+def nearest_neighbor_distances(geoms: "np.ndarray", k: int = 3) -> "np.ndarray":
+    """
+    Distance from every geometry to its k nearest other geometries, as an (N, k) array
+    sorted per row (inf where fewer than k other geometries exist).
+
+    The 1st neighbour comes from one batched STRtree.query_nearest call. Further
+    neighbours come from batched dwithin queries with a per-geometry radius that starts at
+    twice its nearest distance (plus GAP_TOLERANCE) and doubles, re-querying only geometries
+    still lacking k neighbours; one isolated geometry does not widen everyone's query.
+    """
+    n = len(geoms)
+    result = np.full((n, k), np.inf)
+    if n < 2:
+        return result
+    tree = STRtree(geoms)
+
+    (q_idx, _), nearest = tree.query_nearest(geoms, exclusive=True, return_distance=True, all_matches=False)
+    result[q_idx, 0] = nearest
+    if k == 1:
+        return result
+
+    pending = np.arange(n)
+    radius = np.full(n, GAP_TOLERANCE)
+    radius[q_idx] += nearest * 2
+    while len(pending):
+        q_left, q_right = tree.query(geoms[pending], predicate="dwithin", distance=radius[pending])
+        others = pending[q_left] != q_right
+        src = pending[q_left[others]]
+        dst = q_right[others]
+        distances = shapely.distance(geoms[src], geoms[dst])
+
+        # k smallest per source geometry: sort by (source, distance), rank within source
+        order = np.lexsort((distances, src))
+        src, distances = src[order], distances[order]
+        starts = np.searchsorted(src, src, side="left")
+        rank = np.arange(len(src)) - starts
+        take = rank < k
+        result[src[take], rank[take]] = distances[take]
+
+        found = np.bincount(src, minlength=n)[pending]
+        pending = pending[(found < k) & (found < n - 1)]
+        result[pending] = np.inf
+        radius[pending] *= 2
+    return result
+
+
+def log_histogram(values: "np.ndarray") -> dict:
+    """Histogram with one bin per power of ten; exact zeros are counted separately."""
+    positive = values[(values > 0) & np.isfinite(values)]
+    histogram = {"zero": int(np.count_nonzero(values == 0)), "bins": []}
+    if len(positive) == 0:
+        return histogram
+    lo = int(math.floor(math.log10(positive.min())))
+    hi = int(math.floor(math.log10(positive.max()))) + 1
+    edges = np.array([float(f"1e{exponent}") for exponent in range(lo, hi + 1)])
+    counts, _ = np.histogram(positive, bins=edges)
+    histogram["bins"] = [
+        {"lower": float(edges[i]), "upper": float(edges[i + 1]), "count": int(counts[i])}
+        for i in range(len(counts))
+    ]
+    return histogram
+
+
+def distance_quantiles(values: "np.ndarray") -> dict:
+    """min, p10..p99 and max with linear interpolation between order statistics."""
+    probabilities = {"p10": 0.10, "p25": 0.25, "p50": 0.50, "p75": 0.75, "p90": 0.90, "p95": 0.95, "p99": 0.99}
+    quantiles = {"min": float(values.min())}
+    for name, p in probabilities.items():
+        quantiles[name] = float(np.quantile(values, p))
+    quantiles["max"] = float(values.max())
+    return quantiles
+
+
+def round_significant(value: float) -> float:
+    """Round a positive value to one significant figure (0 and negatives are returned as-is)."""
+    if value <= 0:
+        return value
+    magnitude = 10 ** math.floor(math.log10(abs(value)))
+    return round(value / magnitude) * magnitude
+
+
+def calibrate_gap_tolerance(polygons: Dict[str, Union[Polygon, MultiPolygon]], neighbors: int = 3) -> dict:
     """
     Calibrate GAP_TOLERANCE by analyzing distances between settlement boundaries.
     
-    For each sampled settlement, finds the nearest other settlement boundary
-    and computes distance quantiles to suggest an appropriate GAP_TOLERANCE.
+    For every settlement, finds the distance to its 1st..neighbors-th nearest other
+    settlement boundary (see nearest_neighbor_distances) and computes quantiles and
+    log-scale histograms to suggest an appropriate GAP_TOLERANCE.
     
     Args:
         polygons: Dictionary of settlement ID -> geometry
-        sample_size: Maximum number of settlements to sample (or all if smaller)
+        neighbors: Number of nearest neighbours to report per settlement
     
     Returns:
         Dictionary with quantiles and suggested_gap_tolerance
     """
-    print(f"Calibrating GAP_TOLERANCE using up to {sample_size} samples...")
-    
     sids = list(polygons.keys())
-    if len(sids) == 0:
-        print("ERROR: No geometries available for calibration", file=sys.stderr)
+    if len(sids) < 2:
+        print("ERROR: At least two geometries are required for calibration", file=sys.stderr)
         return {}
     
-    # Sample up to sample_size settlements (or all if fewer)
-    actual_sample_size = min(sample_size, len(sids))
-    if actual_sample_size < len(sids):
-        # Simple sampling: take every Nth settlement
-        step = len(sids) / actual_sample_size
-        sample_indices = [int(i * step) for i in range(actual_sample_size)]
-        sample_sids = [sids[i] for i in sample_indices]
-    else:
-        sample_sids = sids
-    
-    print(f"Sampling {len(sample_sids)} settlements from {len(sids)} total...")
-    
-    # Build spatial index
-    print("Building spatial index...")
-    all_geoms = [polygons[sid] for sid in sids]
-    tree = STRtree(all_geoms)
-    
-    distances = []
+    print(f"Calibrating GAP_TOLERANCE over all {len(sids)} settlements ({neighbors} nearest neighbours)...")
     start_time = time.time()
-    progress_interval = max(1, len(sample_sids) // 20)
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    nn = nearest_neighbor_distances(geoms, neighbors)
     
-    print("Computing minimum distances to nearest neighbors...")
-    for i, sid1 in enumerate(sample_sids):
-        if i > 0 and i % progress_interval == 0:
-            elapsed = time.time() - start_time
-            rate = i / elapsed if elapsed > 0 else 0
-            print(f"  [{i}/{len(sample_sids)}] {elapsed:.1f}s elapsed, ~{rate:.1f} samples/s")
-        
-        geom1 = polygons[sid1]
-        
-        # Find nearest neighbor by progressively expanding search radius
-        # Start with a small bbox expansion and increase if needed
-        min_distance = float('inf')
-        search_radius = 100.0  # Start with a reasonable search radius
-        max_search_radius = 10000.0  # Maximum search radius
-        
-        # Progressive bbox expansion strategy
-        for radius_multiplier in [0.5, 1.0, 2.0, 5.0, 10.0, 20.0]:
-            search_bbox = (
-                geom1.bounds[0] - search_radius * radius_multiplier,
-                geom1.bounds[1] - search_radius * radius_multiplier,
-                geom1.bounds[2] + search_radius * radius_multiplier,
-                geom1.bounds[3] + search_radius * radius_multiplier
-            )
-            expanded_geom = box(*search_bbox)
-            candidates = tree.query(expanded_geom)
-            
-            # Check distance to all candidates (excluding self)
-            found_candidate = False
-            for candidate_idx in candidates:
-                sid2 = sids[candidate_idx]
-                if sid1 == sid2:
-                    continue
-                
-                geom2 = polygons[sid2]
-                distance = geom1.distance(geom2)
-                if distance < min_distance:
-                    min_distance = distance
-                    found_candidate = True
-            
-            # If we found candidates and min_distance is within search radius, we're done
-            if found_candidate and min_distance <= search_radius * radius_multiplier * 0.5:
-                break
-            
-            # Avoid infinite loop
-            if search_radius * radius_multiplier > max_search_radius:
-                break
-        
-        # If we didn't find any neighbors, try a direct nearest neighbor query
-        # by checking a few more candidates or use a fallback
-        if min_distance == float('inf'):
-            # Fallback: use a large search radius
-            fallback_bbox = (
-                geom1.bounds[0] - max_search_radius,
-                geom1.bounds[1] - max_search_radius,
-                geom1.bounds[2] + max_search_radius,
-                geom1.bounds[3] + max_search_radius
-            )
-            fallback_geom = box(*fallback_bbox)
-            candidates = tree.query(fallback_geom)
-            
-            for candidate_idx in candidates:
-                sid2 = sids[candidate_idx]
-                if sid1 == sid2:
-                    continue
-                geom2 = polygons[sid2]
-                distance = geom1.distance(geom2)
-                if distance < min_distance:
-                    min_distance = distance
-        
-        if min_distance != float('inf'):
-            distances.append(min_distance)
-    
-    if not distances:
-        print("WARNING: No distances found during calibration", file=sys.stderr)
-        return {
-            "sample_size": len(sample_sids),
-            "distances_found": 0,
-            "error": "No valid distances computed"
-        }
-    
-    # Calculate quantiles
-    distances_sorted = sorted(distances)
-    n = len(distances_sorted)
-    
-    def quantile(p: float) -> float:
-        """Calculate p-th quantile (0.0 to 1.0)."""
-        index = p * (n - 1)
-        lower = int(math.floor(index))
-        upper = int(math.ceil(index))
-        if lower == upper:
-            return distances_sorted[lower]
-        weight = index - lower
-        return distances_sorted[lower] * (1 - weight) + distances_sorted[upper] * weight
-    
-    quantiles = {
-        "min": distances_sorted[0],
-        "p10": quantile(0.10),
-        "p25": quantile(0.25),
-        "p50": quantile(0.50),
-        "p75": quantile(0.75),
-        "p90": quantile(0.90),
-        "p95": quantile(0.95),
-        "p99": quantile(0.99),
-        "max": distances_sorted[-1]
-    }
+    nearest = nn[:, 0][np.isfinite(nn[:, 0])]
+    quantiles = distance_quantiles(nearest)
+    positive = nearest[nearest > 0]
     
-    # Suggest gap tolerance as p95, rounded to a sensible value
-    p95_value = quantiles["p95"]
-    # Round to 2 significant figures
-    if p95_value > 0:
-        magnitude = 10 ** math.floor(math.log10(abs(p95_value)))
-        suggested_gap_tolerance = round(p95_value / magnitude) * magnitude
-    else:
-        suggested_gap_tolerance = p95_value
+    # Suggest gap tolerance as p95 (and p90), rounded to a sensible value
+    suggested_gap_tolerance = round_significant(quantiles["p95"])
+    suggested_gap_tolerance_p90 = round_significant(quantiles["p90"])
     
-    # Alternative: also suggest p90
-    p90_value = quantiles["p90"]
-    if p90_value > 0:
-        magnitude = 10 ** math.floor(math.log10(abs(p90_value)))
-        suggested_gap_tolerance_p90 = round(p90_value / magnitude) * magnitude
-    else:
-        suggested_gap_tolerance_p90 = p90_value
+    neighbor_distances = {}
+    for rank in range(neighbors):
+        values = nn[:, rank][np.isfinite(nn[:, rank])]
+        if len(values) == 0:
+            continue
+        neighbor_distances[f"nn{rank + 1}"] = {
+            "count": int(len(values)),
+            "quantiles": distance_quantiles(values),
+            "log_histogram": log_histogram(values)
+        }
     
     elapsed = time.time() - start_time
     print(f"Calibration complete in {elapsed:.1f}s")
-    print(f"  Found {len(distances)} valid distances")
+    print(f"  Found {len(nearest)} valid distances ({len(nearest) - len(positive)} settlements touch their nearest neighbour)")
     print(f"  Distance range: {quantiles['min']:.4f} to {quantiles['max']:.4f}")
+    if len(positive):
+        print(f"  Non-zero nearest gaps: {len(positive)}, p50 {np.quantile(positive, 0.5):.4f}, p95 {np.quantile(positive, 0.95):.4f}")
     print(f"  p95: {quantiles['p95']:.4f}")
     print(f"  Suggested GAP_TOLERANCE (p95): {suggested_gap_tolerance:.4f}")
     print(f"  Suggested GAP_TOLERANCE (p90): {suggested_gap_tolerance_p90:.4f}")
     
-    return {
-        "sample_size": len(sample_sids),
-        "distances_found": len(distances),
+    result = {
+        "sample_size": len(sids),
+        "distances_found": int(len(nearest)),
         "quantiles": quantiles,
+        "nonzero_gap_count": int(len(positive)),
+        "neighbor_distances": neighbor_distances,
         "suggested_gap_tolerance": suggested_gap_tolerance,
         "suggested_gap_tolerance_p90": suggested_gap_tolerance_p90,
         "current_gap_tolerance": GAP_TOLERANCE,
         "calibration_complete": True
     }
+    if len(positive):
+        result["nonzero_gap_quantiles"] = distance_quantiles(positive)
+    return result
+
+
+def parse_tolerances(text: str) -> List[float]:
+    """Parse a comma-separated --sweep list into sorted, unique, non-negative tolerances."""
+    tolerances = set()
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        value = float(part)
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"Invalid gap tolerance: {part}")
+        tolerances.add(value)
+    if not tolerances:
+        raise ValueError("No gap tolerances given")
+    return sorted(tolerances)
+
+
+def sweep_gap_tolerances(polygons: Dict[str, Union[Polygon, MultiPolygon]], tolerances: Sequence[float]) -> dict:
+    """
+    Evaluate adjacency for several GAP_TOLERANCE values in one pass.
+    
+    Candidate pairs are queried once at the largest tolerance; each pair's minimum
+    distance and method are computed once. Touch and line edges have distance 0, so
+    the edge set at tolerance t is every pair with distance <= t, exactly what
+    compute_adjacency_bulk would produce with GAP_TOLERANCE = t.
+    
+    Args:
+        polygons: Dictionary of settlement ID -> geometry
+        tolerances: Sorted tolerances to evaluate
+    
+    Returns:
+        Dictionary with one entry per tolerance: edge and orphan counts, edge breakdown,
+        degree distribution and the edges added relative to the previous tolerance
+    """
+    sids = list(polygons.keys())
+    print(f"Sweeping GAP_TOLERANCE over {len(tolerances)} values for {len(sids)} settlements...")
+    start_time = time.time()
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    ranks = sid_ranks(sids)
+    
+    tree = STRtree(geoms)
+    left, right = query_candidate_pairs(tree, geoms, ranks, max(tolerances))
+    print(f"  {len(left)} candidate pairs within {max(tolerances)} ({time.time() - start_time:.1f}s elapsed)")
+    methods = classify_pairs(geoms, left, right)
+    distances = np.zeros(len(left))
+    by_distance = methods == METHOD_DISTANCE
+    distances[by_distance] = shapely.distance(geoms[left[by_distance]], geoms[right[by_distance]])
+    
+    results = []
+    previous = None
+    for tolerance in tolerances:
+        included = distances <= tolerance
+        degrees = np.bincount(np.concatenate([left[included], right[included]]), minlength=len(sids))
+        counts = np.bincount(methods[included], minlength=len(EDGE_METHODS))
+        degree_values, degree_counts = np.unique(degrees, return_counts=True)
+        entry = {
+            "gap_tolerance": tolerance,
+            "edge_count": int(included.sum()),
+            "orphan_count": int((degrees == 0).sum()),
+            "avg_degree": round(float(degrees.mean()), 2) if len(degrees) else 0,
+            "max_degree": int(degrees.max()) if len(degrees) else 0,
+            "edge_breakdown": {name: int(counts[code]) for code, name in enumerate(EDGE_METHODS)},
+            "degree_distribution": {str(d): int(c) for d, c in zip(degree_values.tolist(), degree_counts.tolist())}
+        }
+        if previous is not None:
+            added = np.flatnonzero(included & ~previous)
+            entry["added_edge_count"] = int(len(added))
+            entry["added_edges"] = [
+                {"a": sids[i], "b": sids[j], "distance": round(d, 6)}
+                for i, j, d in zip(left[added].tolist(), right[added].tolist(), distances[added].tolist())
+            ]
+        results.append(entry)
+        previous = included
+        print(f"  {tolerance:g}: {entry['edge_count']} edges, {entry['orphan_count']} orphans"
+              + (f", +{entry['added_edge_count']} edges" if "added_edge_count" in entry else ""))
+    
+    print(f"Sweep complete in {time.time() - start_time:.1f}s")
+    return {
+        "settlement_count": len(sids),
+        "current_gap_tolerance": GAP_TOLERANCE,
+        "candidate_pair_count": int(len(left)),
+        "tolerances": results
+    }
 
 
 def main() -> Path:
@@ -662,10 +2255,60 @@ def main() -> Path:
         help="Run calibration mode to suggest GAP_TOLERANCE"
     )
     parser.add_argument(
-        "--sample-size",
+        "--sweep",
+        default=None,
+        metavar="TOLERANCES",
+        help="Comma-separated GAP_TOLERANCE values (e.g. 0,0.25,0.5,1,2) to evaluate in one pass; writes adjacency_sweep.json"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["bulk", "loop"],
+        default="bulk",
+        help="Adjacency engine: bulk pair-array query (default) or per-settlement reference loop (single process, not incremental)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of worker processes; >1 shards the extent into halo tiles (default: 1)"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Reuse adjacency_cache.json and recompute edges only for changed, added or removed settlements"
+    )
+    parser.add_argument(
+        "--weighted",
+        action="store_true",
+        help="Also write settlement_edges_weighted.json with shared_length, min_distance and method per edge"
+    )
+    parser.add_argument(
+        "--mun-rollup",
+        action="store_true",
+        help="Also write mun_adjacency_rollup.json aggregating settlement edges by mun1990_id and mun_code"
+    )
+    parser.add_argument(
+        "--no-geometry-cache",
+        action="store_true",
+        help="Always parse settlements_polygons.geojson instead of using the binary geometry cache"
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        default=None,
+        help="Write a JSON trace (phase and per-criterion timings, candidate histogram, slowest settlements) to this path"
+    )
+    parser.add_argument(
+        "--trace-progress",
+        type=Path,
+        default=None,
+        help="Stream NDJSON progress events (phase boundaries, rate, ETA) to this path"
+    )
+    parser.add_argument(
+        "--neighbors",
         type=int,
-        default=500,
-        help="Number of settlements to sample for calibration (default: 500)"
+        default=3,
+        help="Number of nearest neighbours per settlement reported by calibration (default: 3)"
     )
     parser.add_argument(
         "derived_dir",
@@ -675,6 +2318,18 @@ def main() -> Path:
     
     args = parser.parse_args()
     
+    if args.engine == "loop" and args.workers > 1:
+        parser.error("--engine loop runs in a single process; it cannot be combined with --workers > 1")
+    if args.engine == "loop" and args.incremental:
+        parser.error("--engine loop cannot be combined with --incremental (incremental rebuilds use the bulk classifier)")
+    
+    tolerances = None
+    if args.sweep is not None:
+        try:
+            tolerances = parse_tolerances(args.sweep)
+        except ValueError as e:
+            parser.error(f"--sweep: {e}")
+    
     if args.derived_dir:
         derived_dir = Path(args.derived_dir)
     else:
@@ -688,13 +2343,32 @@ def main() -> Path:
     orphans_path = derived_dir / "orphans.json"
     whitelist_path = derived_dir / "orphan_whitelist.json"
     calibration_path = derived_dir / "adjacency_calibration.json"
+    sweep_path = derived_dir / "adjacency_sweep.json"
+    cache_path = derived_dir / "adjacency_cache.json"
+    weighted_path = derived_dir / "settlement_edges_weighted.json"
+    csr_path = derived_dir / "settlement_edges.csr.bin"
+    rollup_path = derived_dir / "mun_adjacency_rollup.json"
     
     if not polygons_path.exists():
         print(f"ERROR: {polygons_path} not found", file=sys.stderr)
         sys.exit(1)
     
+    trace = None
+    if args.trace or args.trace_progress:
+        if args.incremental:
+            engine_name = "incremental"
+        elif args.workers > 1:
+            engine_name = "sharded"
+        else:
+            engine_name = args.engine
+        trace = AdjacencyTrace(engine_name, progress_path=args.trace_progress)
+    phase = trace.phase if trace is not None else _null_phase
+    
     print(f"Loading geometries from {polygons_path}...")
-    polygons, properties, invalid_geometry_count = load_polygons(polygons_path)
+    with phase("load"):
+        polygons, properties, invalid_geometry_count = load_polygons_cached(
+            polygons_path, property_keys=("mun_code", "mun", "mun1990_id"), use_cache=not args.no_geometry_cache
+        )
     
     if not polygons:
         print("ERROR: No valid geometries found", file=sys.stderr)
@@ -706,7 +2380,7 @@ def main() -> Path:
     
     # Handle calibration mode
     if args.calibrate:
-        calibration_data = calibrate_gap_tolerance(polygons, args.sample_size)
+        calibration_data = calibrate_gap_tolerance(polygons, args.neighbors)
         calibration_json = {
             "version": "1.0.0",
             **calibration_data
@@ -726,6 +2400,17 @@ def main() -> Path:
         
         return report_path
     
+    # Handle sweep mode
+    if tolerances is not None:
+        sweep_json = {
+            "version": "1.0.0",
+            **sweep_gap_tolerances(polygons, tolerances)
+        }
+        print(f"Writing sweep results to {sweep_path}...")
+        with open(sweep_path, 'w', encoding='utf-8') as f:
+            json.dump(sweep_json, f, indent=2, ensure_ascii=False)
+        return report_path
+    
     # Check for calibration data and warn if GAP_TOLERANCE might be suboptimal
     calibration_warning_shown = False
     if calibration_path.exists():
@@ -743,35 +2428,95 @@ def main() -> Path:
             pass
     
     # Compute adjacency
-    edges, edge_sources = compute_adjacency(polygons, progress_interval=200)
+    tile_stats = None
+    fingerprints = geometry_fingerprints(polygons) if args.incremental else None
+    cache = load_adjacency_cache(cache_path) if args.incremental else None
+    with phase("adjacency"):
+        if cache is not None:
+            edges, edge_sources = compute_adjacency_incremental(polygons, fingerprints, cache, trace=trace)
+        elif args.workers > 1:
+            edges, edge_sources, tile_stats = compute_adjacency_sharded(polygons, args.workers, trace=trace)
+        elif args.engine == "loop":
+            edges, edge_sources = compute_adjacency(polygons, progress_interval=200, trace=trace)
+        else:
+            edges, edge_sources = compute_adjacency_bulk(polygons, trace=trace)
+    
+    if args.incremental:
+        print(f"Writing adjacency cache to {cache_path}...")
+        write_adjacency_cache(cache_path, fingerprints, edges, edge_sources)
     
     # Normalize edges to (minSid, maxSid) and sort lexicographically
     # (edges are already normalized in compute_adjacency, but ensure sorted order)
-    edges_list = [{"a": sid1, "b": sid2} for sid1, sid2 in sorted(edges)]
-    edges_json = {
-        "version": "1.0.0",
-        "allow_self_loops_default": False,
-        "edges": edges_list
-    }
-    
-    # Write edges file and calculate SHA256 checksum
-    print(f"Writing {len(edges_list)} edges to {edges_path}...")
-    edges_json_str = json.dumps(edges_json, indent=2, ensure_ascii=False, sort_keys=True)
-    edges_sha256 = hashlib.sha256(edges_json_str.encode('utf-8')).hexdigest()
+    sorted_edges = sorted(edges)
     
-    with open(edges_path, 'w', encoding='utf-8') as f:
-        f.write(edges_json_str)
+    # Write edges file (streamed) and calculate SHA256 checksum
+    print(f"Writing {len(sorted_edges)} edges to {edges_path}...")
+    with phase("write"):
+        edges_sha256 = write_edges_json(edges_path, sorted_edges)
+        
+        print(f"Writing CSR adjacency to {csr_path}...")
+        csr = write_edges_csr(csr_path, sorted(polygons.keys()), sorted_edges)
+    
+    # Optional weighted sidecar; settlement_edges.json and its SHA256 are unaffected
+    weighted_json = None
+    if args.weighted:
+        print("Computing edge weights...")
+        with phase("weights"):
+            weighted_edges = compute_edge_weights(polygons, edges)
+            check = check_edge_weights(polygons, weighted_edges)
+            weighted_json = {
+                "version": "1.0.0",
+                "settlement_edges_sha256": edges_sha256,
+                "snap_grid": SNAP_GRID,
+                "boundary_check": check,
+                "edges": weighted_edges
+            }
+        print(f"  Boundary intersection check: {check['mismatch_count']} of {check['sample_size']} sampled edges "
+              f"differ by more than {EPSILON} (max {check['max_difference']})")
+        if check["mismatch_count"]:
+            print(f"WARNING: shared_length disagrees with the boundary intersection on {check['mismatch_count']} sampled edge(s)", file=sys.stderr)
+        print(f"Writing weighted edges to {weighted_path}...")
+        with open(weighted_path, 'w', encoding='utf-8') as f:
+            json.dump(weighted_json, f, indent=2, ensure_ascii=False)
+    
+    # Optional municipality rollup; shared lengths are reused from the weighted sidecar
+    if args.mun_rollup:
+        shared_lengths = [edge["shared_length"] for edge in weighted_json["edges"]] if weighted_json else None
+        if shared_lengths is None:
+            print("  Note: run with --weighted to include summed shared border lengths in the rollup")
+        rollups = {}
+        for key in MUN_ROLLUP_KEYS:
+            rollup = rollup_municipality_edges(sorted_edges, properties, key, shared_lengths)
+            if rollup is not None:
+                rollups[key] = rollup
+                print(f"  {key}: {rollup['node_count']} municipalities, {rollup['edge_count']} municipality edges")
+            else:
+                print(f"  {key}: not present in settlement properties, skipped")
+        rollup_json = {
+            "version": "1.0.0",
+            "settlement_edges_sha256": edges_sha256,
+            "rollups": rollups
+        }
+        print(f"Writing municipality rollup to {rollup_path}...")
+        with open(rollup_path, 'w', encoding='utf-8') as f:
+            json.dump(rollup_json, f, indent=2, ensure_ascii=False)
     
     # Generate report with checksum and invalid geometry count
     # edge_sources should always be provided, but ensure edge_breakdown is always present
-    report = generate_report(edges, set(polygons.keys()), edge_sources, invalid_geometry_count, edges_sha256)
+    # Degrees are computed once and shared by the report and the orphans list
+    with phase("report"):
+        degree_map = compute_degree_map(edges, set(polygons.keys()))
+        report = generate_report(
+            edges, set(polygons.keys()), edge_sources, invalid_geometry_count, edges_sha256,
+            tile_stats=tile_stats, degree_map=degree_map, properties=properties, csr=csr
+        )
     
     # Ensure edge_breakdown is always present (should already be, but double-check)
     if "edge_breakdown" not in report:
         report["edge_breakdown"] = {"line": 0, "touch": 0, "distance": 0}
     
     # Get orphans list
-    orphans = get_orphans(edges, set(polygons.keys()))
+    orphans = get_orphans(edges, set(polygons.keys()), degree_map)
     
     # Write orphans.json if any exist
     if orphans:
@@ -804,13 +2549,22 @@ def main() -> Path:
     with open(report_path, 'w', encoding='utf-8') as f:
         json.dump(report, f, indent=2, ensure_ascii=False)
     
+    if trace is not None:
+        if trace.edge_breakdown is None:
+            trace.settlement_count = len(polygons)
+            trace.edge_breakdown = report["edge_breakdown"]
+        if args.trace:
+            print(f"Writing trace to {args.trace}...")
+            trace.write(args.trace)
+        trace.close()
+    
     # Print self-identification confirmation
     total_edges = report['total_edges']
     orphan_count = report['orphan_count']
     print(f"WROTE adjacency_report.json at {report_path}, total_edges={total_edges}, orphan_count={orphan_count}")
     
     print(f"\nAdjacency generation complete:")
-    print(f"  Total edges: {len(edges_list)}")
+    print(f"  Total edges: {len(sorted_edges)}")
     print(f"  Average degree: {report['avg_degree']:.2f}")
     print(f"  Orphan settlements: {report['orphan_count']}")
     print(f"  Max degree: {report['max_degree']}")
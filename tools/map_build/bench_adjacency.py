@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Scalability benchmark for adjacency.py on deterministic synthetic settlement fabrics.
+
+Fabrics (seeded, so every run sees the same geometry):
+  voronoi   Voronoi tessellation of random points, clipped to a square
+  enclaves  voronoi + enclave settlements cut out of host cells + MultiPolygon exclaves
+  gaps      voronoi with cells shrunk by random gaps below GAP_TOLERANCE (distance edges)
+
+Each (fabric, size) runs in a fresh process and times the phases load, index, query,
+classify and write one by one, then the real entry points end to end: adjacency
+(compute_adjacency_bulk, checked to give the same edges) and calibrate
+(calibrate_gap_tolerance), plus peak RSS.
+
+Usage:
+  python tools/map_build/bench_adjacency.py [--sizes 1000,10000,100000] [--fabrics voronoi,gaps]
+  python tools/map_build/bench_adjacency.py --update-baseline
+  Results are compared with the stored baseline (tools/map_build/bench_adjacency_baseline.json,
+  committed; refresh it with --update-baseline after an intended performance change or on
+  new reference hardware); any phase slower than baseline * (1 + --threshold) is reported
+  and the exit code is 1.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import shapely
+from shapely import affinity
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from adjacency import (
+    GAP_TOLERANCE,
+    STRtree,
+    calibrate_gap_tolerance,
+    classify_pairs,
+    compute_adjacency_bulk,
+    load_polygons,
+    pairs_to_edges,
+    query_candidate_pairs,
+    sid_ranks,
+    write_edges_csr,
+    write_edges_json,
+)
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+FABRICS = ("voronoi", "enclaves", "gaps")
+PHASES = ("load", "index", "query", "classify", "write", "adjacency", "calibrate")
+CELL_SIZE = 12.0  # Mean cell width in map units (the real fabric averages ~12 units per settlement)
+SEED = 1992
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "bench_adjacency_baseline.json"
+
+
+def voronoi_cells(n: int, rng: np.random.Generator) -> List[Polygon]:
+    """n-ish Voronoi cells of uniform random points, clipped to the fabric square, in a stable order."""
+    side = math.sqrt(n) * CELL_SIZE
+    points = rng.uniform(0, side, size=(n, 2))
+    extent = box(0, 0, side, side)
+    cells = shapely.get_parts(shapely.voronoi_polygons(shapely.multipoints(points), extend_to=extent))
+    cells = shapely.intersection(cells, extent)
+    cells = cells[shapely.get_type_id(cells) == shapely.GeometryType.POLYGON]
+    # Order by representative point so the sid assignment does not depend on GEOS output order
+    reps = shapely.get_coordinates(shapely.point_on_surface(cells))
+    return list(cells[np.lexsort((reps[:, 0], reps[:, 1]))])
+
+
+def generate_fabric(kind: str, n: int, seed: int = SEED) -> List[object]:
+    """Return the geometries of a synthetic fabric (Polygons, some MultiPolygons)."""
+    rng = np.random.default_rng(seed)
+    cells = voronoi_cells(n, rng)
+
+    if kind == "voronoi":
+        return cells
+
+    if kind == "gaps":
+        # Shrink half the cells by a gap smaller than GAP_TOLERANCE so they only meet by distance
+        gaps = np.where(rng.random(len(cells)) < 0.5, rng.uniform(0.05, 0.45, len(cells)) * GAP_TOLERANCE, 0.0)
+        shrunk = shapely.buffer(np.array(cells, dtype=object), -gaps, join_style="mitre")
+        return [g for g in shrunk if not g.is_empty and g.geom_type == "Polygon"]
+
+    if kind == "enclaves":
+        centroids = shapely.centroid(np.array(cells, dtype=object))
+        centroid_tree = STRtree(centroids)
+        result = []
+        merged = set()
+        for i, cell in enumerate(cells):
+            if i in merged:
+                continue
+            if i % 20 == 0:
+                # Enclave: a smaller settlement fully inside the host, host keeps a hole
+                inner = affinity.scale(cell, 0.3, 0.3, origin=cell.centroid)
+                result.append(Polygon(cell.exterior.coords, [inner.exterior.coords]))
+                result.append(inner)
+                continue
+            if i % 25 == 1:
+                # Exclave: the cell and a nearby non-adjacent cell form one MultiPolygon settlement
+                nearby = centroid_tree.query(centroids[i], predicate="dwithin", distance=3 * CELL_SIZE)
+                partners = [
+                    int(j) for j in np.sort(nearby)
+                    if j > i and j not in merged and j % 20 != 0 and not cell.intersects(cells[j])
+                ]
+                if partners:
+                    merged.add(partners[0])
+                    result.append(MultiPolygon([cell, cells[partners[0]]]))
+                    continue
+            result.append(cell)
+        return result
+
+    raise ValueError(f"Unknown fabric kind: {kind}")
+
+
+def write_fabric(geoms: List[object], path: Path) -> None:
+    """Write geometries as a settlements_polygons.geojson-style FeatureCollection."""
+    geojson = shapely.to_geojson(np.array(geoms, dtype=object))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"type": "FeatureCollection", "features": [\n')
+        for i, geometry in enumerate(geojson):
+            properties = json.dumps({"sid": f"SYN{i:06d}", "mun_code": f"{i // 50:05d}"})
+            separator = ",\n" if i else ""
+            f.write(f'{separator}{{"type": "Feature", "properties": {properties}, "geometry": {geometry}}}')
+        f.write("\n]}\n")
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_case(kind: str, n: int) -> dict:
+    """Generate one fabric and time every adjacency phase on it. Runs in its own process."""
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        geojson_path = tmp_dir / "settlements_polygons.geojson"
+        write_fabric(generate_fabric(kind, n), geojson_path)
+
+        timings = {}
+        start = time.perf_counter()
+        polygons, _, _ = load_polygons(geojson_path, property_keys=("mun_code",))
+        timings["load"] = time.perf_counter() - start
+
+        sids = list(polygons.keys())
+        geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+        start = time.perf_counter()
+        ranks = sid_ranks(sids)
+        tree = STRtree(geoms)
+        tree.query(geoms[:1])  # STRtree builds lazily on first query
+        timings["index"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        left, right = query_candidate_pairs(tree, geoms, ranks)
+        timings["query"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        methods = classify_pairs(geoms, left, right)
+        timings["classify"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        edges, _ = pairs_to_edges(sids, left, right, methods)
+        sorted_edges = sorted(edges)
+        write_edges_json(tmp_dir / "settlement_edges.json", sorted_edges)
+        write_edges_csr(tmp_dir / "settlement_edges.csr.bin", sorted(sids), sorted_edges)
+        timings["write"] = time.perf_counter() - start
+
+        # The entry points as adjacency.py runs them; their progress output is discarded
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            bulk_edges, _ = compute_adjacency_bulk(polygons)
+            timings["adjacency"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            calibrate_gap_tolerance(polygons, 3)
+            timings["calibrate"] = time.perf_counter() - start
+        if bulk_edges != edges:
+            raise RuntimeError(f"{kind} x {n}: compute_adjacency_bulk disagrees with the phase-by-phase edges")
+
+    counts = np.bincount(methods, minlength=3)
+    return {
+        "fabric": kind,
+        "size": n,
+        "settlements": len(sids),
+        "edges": len(edges),
+        "edge_breakdown": {"touch": int(counts[0]), "line": int(counts[1]), "distance": int(counts[2])},
+        "seconds": {phase: round(timings[phase], 4) for phase in PHASES},
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare_with_baseline(results: List[dict], baseline: Dict[str, dict], threshold: float, min_seconds: float) -> List[str]:
+    """Return one message per phase slower than baseline * (1 + threshold)."""
+    regressions = []
+    for result in results:
+        key = f"{result['fabric']}:{result['size']}"
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        for phase, seconds in result["seconds"].items():
+            base = reference["seconds"].get(phase)
+            # Ignore phases too short to time reliably
+            if base is None or max(base, seconds) < min_seconds:
+                continue
+            if seconds > base * (1 + threshold):
+                regressions.append(f"{key} {phase}: {seconds:.3f}s vs baseline {base:.3f}s (+{(seconds / base - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark adjacency phases on synthetic settlement fabrics")
+    parser.add_argument("--sizes", default="1000,10000", help="Comma-separated fabric sizes (default: 1000,10000; add 100000 for the large run)")
+    parser.add_argument("--fabrics", default=",".join(FABRICS), help=f"Comma-separated fabric kinds (default: {','.join(FABRICS)})")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare against / update")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown per phase before it counts as a regression (default: 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="Phases faster than this in both runs are not compared (default: 0.05)")
+    parser.add_argument("--output", type=Path, help="Also write the results JSON here")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    kinds = [kind for kind in args.fabrics.split(",") if kind]
+    for kind in kinds:
+        if kind not in FABRICS:
+            parser.error(f"unknown fabric '{kind}' (expected one of {', '.join(FABRICS)})")
+
+    # A fresh process per case keeps peak RSS per case and avoids allocator carry-over
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for kind in kinds:
+        for n in sizes:
+            print(f"Running {kind} x {n}...")
+            with context.Pool(1) as pool:
+                result = pool.apply(run_case, (kind, n))
+            results.append(result)
+            phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in result["seconds"].items())
+            print(f"  {result['settlements']} settlements, {result['edges']} edges; {phases}; peak RSS {result['peak_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"version": "1.0.0", "results": results}, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if args.baseline.exists():
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        for result in results:
+            baseline[f"{result['fabric']}:{result['size']}"] = result
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(baseline.items())), f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare_with_baseline(results, baseline, args.threshold, args.min_seconds)
+    if regressions:
+        print(f"\nERROR: {len(regressions)} phase(s) regressed by more than {args.threshold * 100:.0f}%:", file=sys.stderr)
+        for message in regressions:
+            print(f"  {message}", file=sys.stderr)
+        sys.exit(1)
+    print(f"\nNo regressions against {args.baseline.name} (threshold {args.threshold * 100:.0f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark segment_arrays_share_line against segments_share_line.
+
+Runs both segment-overlap tests on adjacent settlement pairs from settlements_polygons.geojson,
+reports total time per implementation, speedup and any disagreements.
+
+Usage:
+  python tools/map_build/bench_segment_overlap.py [derived_dir] [--pairs 500] [--segmentize 0.5]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import shapely
+
+from adjacency import (
+    EPSILON,
+    STRtree,
+    get_boundary_segment_array,
+    get_boundary_segments,
+    load_polygons_cached,
+    np,
+    query_candidate_pairs,
+    segment_arrays_share_line,
+    segments_share_line,
+    sid_ranks,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark vectorized segment-overlap test against segments_share_line")
+    parser.add_argument(
+        "--pairs",
+        type=int,
+        default=500,
+        help="Number of adjacent pairs to test, taken at a fixed stride (default: 500)"
+    )
+    parser.add_argument(
+        "--segmentize",
+        type=float,
+        default=None,
+        help="Densify rings to this maximum segment length first, to emulate high-vertex borders"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    polygons_path = derived_dir / "settlements_polygons.geojson"
+    if not polygons_path.exists():
+        print(f"ERROR: {polygons_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    polygons, _, _ = load_polygons_cached(polygons_path)
+    sids = list(polygons.keys())
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    if args.segmentize:
+        geoms = shapely.segmentize(geoms, args.segmentize)
+    vertex_counts = shapely.get_num_coordinates(geoms)
+    print(f"Vertices per settlement: mean {vertex_counts.mean():.1f}, max {vertex_counts.max()}")
+    left, right = query_candidate_pairs(STRtree(geoms), geoms, sid_ranks(sids))
+    step = max(1, len(left) // max(1, args.pairs))
+    pairs = list(zip(left[::step].tolist(), right[::step].tolist()))[:args.pairs]
+    print(f"Benchmarking {len(pairs)} of {len(left)} adjacent pairs")
+
+    # Timings are split by outcome: the reference returns early on the first shared
+    # segment, so pairs without a shared line show the full O(n*m) cost.
+    reference_seconds = {True: 0.0, False: 0.0}
+    array_seconds = {True: 0.0, False: 0.0}
+    counts = {True: 0, False: 0}
+    agree = 0
+    disagreements = []
+    for i, j in pairs:
+        start = time.perf_counter()
+        expected = segments_share_line(get_boundary_segments(geoms[i]), get_boundary_segments(geoms[j]), EPSILON)
+        reference_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = segment_arrays_share_line(get_boundary_segment_array(geoms[i]), get_boundary_segment_array(geoms[j]), EPSILON)
+        array_elapsed = time.perf_counter() - start
+
+        reference_seconds[expected] += reference_elapsed
+        array_seconds[expected] += array_elapsed
+        counts[expected] += 1
+        if expected == actual:
+            agree += 1
+        else:
+            disagreements.append((sids[i], sids[j], expected, actual))
+
+    for outcome, label in ((True, "shared line"), (False, "no shared line")):
+        if counts[outcome] == 0:
+            continue
+        speedup = reference_seconds[outcome] / array_seconds[outcome] if array_seconds[outcome] > 0 else float("inf")
+        print(f"  {label} ({counts[outcome]} pairs): reference {reference_seconds[outcome]:.3f}s, "
+              f"array {array_seconds[outcome]:.3f}s, speedup {speedup:.1f}x")
+    total_reference = sum(reference_seconds.values())
+    total_array = sum(array_seconds.values())
+    if total_array > 0:
+        print(f"  Total: reference {total_reference:.3f}s, array {total_array:.3f}s, speedup {total_reference / total_array:.1f}x")
+    print(f"  Agreement: {agree}/{len(pairs)}")
+    for sid1, sid2, expected, actual in disagreements[:10]:
+        print(f"    {sid1} {sid2}: reference={expected} array={actual}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+"""
+Cut the viewer layers into a z/x/y tile pyramid in the A1_TACTICAL coordinate space.
+
+The pyramid covers the square grown from canonical_bbox (data_index.json) at its
+min corner: zoom z has 2^z x 2^z tiles, x grows right and y grows down, as in SVG.
+Layers (see TILE_LAYERS):
+  settlements     settlements_a1_viewer.geojson (polygons)
+  municipalities  municipalities_1990_boundaries.geojson (boundary lines)
+  control_zones   control_zones_A1.geojson (polygons)
+
+Per zoom, every layer is simplified once with a tolerance of half a tile pixel
+(TILE_PIXELS per tile side), so lines stay within a pixel of the source. Polygon layers are
+simplified on shared arcs, as in simplify_lods: the layer's arc table is built once on a
+grid of a tenth of a max-zoom pixel (export_topojson.build_layer_topology), each arc gets
+its Douglas-Peucker significance once, and every zoom keeps the arc vertices above its
+tolerance and rebuilds the features from the shared arcs. A border is therefore simplified
+the same way for the features on both sides and no slivers open between them. Line layers
+are simplified per feature. Each tile then
+clips the candidate features (one STRtree query on the tile box plus a TILE_BUFFER
+margin, so strokes do not seam at tile edges) and rounds coordinates to the zoom's
+precision. Tiles are clipped and written in a process pool (the parent passes WKB, as in
+adjacency.compute_adjacency_sharded); tiles without features are not written.
+
+Tiles are JSON: {"z", "x", "y", "bbox", "layers": {name: FeatureCollection}} with
+coordinates in A1_TACTICAL units, so the existing GeoJSON viewers can draw them as is.
+tiles/manifest.json lists the grid, the source checksums, per-zoom stats and the SHA-256,
+size and per-layer feature counts of every tile; data_index.json gains a "tiles_viewer_v1"
+entry pointing at it.
+
+Usage:
+  python tools/map_build/build_tiles.py [derived_dir] [--min-zoom 0] [--max-zoom 5] [--workers N] [--no-index]
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from shapely.geometry import mapping, shape
+
+from adjacency import (
+    STRtree,
+    file_sha256,
+    iter_geojson_features,
+    np,
+    shapely,
+)
+from export_topojson import build_layer_topology, decode_feature
+from simplify_lods import arc_significance, protect_thin_rings, simplify_arcs
+
+
+# (layer name, source file, id property, geometry dimension: 1 lines, 2 polygons)
+TILE_LAYERS = (
+    ("settlements", "settlements_a1_viewer.geojson", "sid", 2),
+    ("municipalities", "municipalities_1990_boundaries.geojson", "mun1990_id", 1),
+    ("control_zones", "control_zones_A1.geojson", "faction", 2),
+)
+TILE_PIXELS = 512
+TILE_BUFFER = 8 / TILE_PIXELS   # Clip margin as a fraction of the tile side
+DEFAULT_MAX_ZOOM = 5
+OUTPUT_DIR = "tiles"
+MANIFEST_NAME = "manifest.json"
+INDEX_DATASET = "tiles_viewer_v1"
+
+
+def load_tile_layer(geojson_path: Path, id_field: str) -> Tuple[List[str], "np.ndarray", List[dict]]:
+    """Read a layer as (ids, shapely geometry array, properties), skipping features without geometry."""
+    ids = []
+    geoms = []
+    properties = []
+    for feature in iter_geojson_features(geojson_path):
+        geometry = feature.get("geometry")
+        if not geometry:
+            continue
+        props = feature.get("properties") or {}
+        ids.append(str(props.get(id_field, "")))
+        geoms.append(shape(geometry))
+        properties.append(props)
+    return ids, np.array(geoms, dtype=object), properties
+
+
+def pyramid_extent(canonical_bbox: List[float]) -> Tuple[float, float, float]:
+    """(min x, min y, side) of the square tile pyramid covering canonical_bbox."""
+    min_x, min_y, max_x, max_y = canonical_bbox
+    return min_x, min_y, max(max_x - min_x, max_y - min_y)
+
+
+def tile_bounds(extent: Tuple[float, float, float], z: int, x: int, y: int) -> Tuple[float, float, float, float]:
+    min_x, min_y, side = extent
+    size = side / (1 << z)
+    return (min_x + x * size, min_y + y * size, min_x + (x + 1) * size, min_y + (y + 1) * size)
+
+
+def covering_tiles(bounds: "np.ndarray", extent: Tuple[float, float, float], z: int) -> List[Tuple[int, int]]:
+    """Sorted (x, y) of the tiles at zoom z touched by any of the (N, 4) geometry bounds."""
+    min_x, min_y, side = extent
+    count = 1 << z
+    size = side / count
+    margin = size * TILE_BUFFER
+    x0 = np.clip(np.floor((bounds[:, 0] - margin - min_x) / size), 0, count - 1).astype(np.int64)
+    y0 = np.clip(np.floor((bounds[:, 1] - margin - min_y) / size), 0, count - 1).astype(np.int64)
+    x1 = np.clip(np.floor((bounds[:, 2] + margin - min_x) / size), 0, count - 1).astype(np.int64)
+    y1 = np.clip(np.floor((bounds[:, 3] + margin - min_y) / size), 0, count - 1).astype(np.int64)
+    covered = np.zeros((count, count), dtype=bool)
+    for a, b, c, d in zip(x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist()):
+        covered[a:c + 1, b:d + 1] = True
+    return [(int(x), int(y)) for x, y in zip(*np.nonzero(covered))]
+
+
+def zoom_precision(extent: Tuple[float, float, float], z: int) -> int:
+    """Decimals needed for a tenth of a tile pixel at zoom z."""
+    pixel = extent[2] / (1 << z) / TILE_PIXELS
+    return max(0, math.ceil(-math.log10(pixel / 10)))
+
+
+def shared_arc_layer(geoms: "np.ndarray", quantization: int) -> Tuple[dict, List["np.ndarray"]]:
+    """
+    Arc table of a polygon layer and the Douglas-Peucker significance of every arc vertex,
+    computed once for all zooms.
+    """
+    topology, _ = build_layer_topology(list(geoms), quantization)
+    significance = arc_significance(topology["arcs"])
+    protect_thin_rings(topology, significance)
+    return topology, significance
+
+
+def simplify_shared(geoms: "np.ndarray", topology: dict, significance: List["np.ndarray"], tolerance: float) -> "np.ndarray":
+    """Features rebuilt from the layer's shared arcs simplified at tolerance (source units)."""
+    threshold = tolerance / max(topology["transform"]["scale"])
+    arcs = simplify_arcs(topology["arcs"], significance, threshold)
+    simplified = np.array([shapely.Polygon() for _ in range(len(geoms))], dtype=object)
+    for i, parts in zip(topology["sids"], topology["objects"]):
+        simplified[i] = decode_feature(parts, arcs, topology["transform"])
+    return simplified
+
+
+def _keep_dimension(geom, dimension: int):
+    """Drop clip by-products of a lower dimension (points from touching lines, lines from touching polygons)."""
+    if geom is None or geom.is_empty:
+        return None
+    if shapely.get_dimensions(geom) == dimension and geom.geom_type != "GeometryCollection":
+        return geom
+    parts = shapely.get_parts(geom)
+    parts = parts[shapely.get_dimensions(parts) == dimension]
+    if not len(parts):
+        return None
+    if dimension == 2:
+        return shapely.multipolygons(shapely.get_parts(parts)) if len(parts) > 1 or parts[0].geom_type != "Polygon" else parts[0]
+    return shapely.multilinestrings(shapely.get_parts(parts)) if len(parts) > 1 or parts[0].geom_type != "LineString" else parts[0]
+
+
+def _clip(geoms: "np.ndarray", clip_box: Tuple[float, float, float, float]) -> "np.ndarray":
+    """clip_by_rect, falling back to a repaired intersection for the invalid inputs GEOS's rectangle clipper rejects."""
+    try:
+        return shapely.clip_by_rect(geoms, *clip_box)
+    except shapely.errors.GEOSException:
+        clipped = np.empty(len(geoms), dtype=object)
+        for i, geom in enumerate(geoms):
+            try:
+                clipped[i] = shapely.clip_by_rect(geom, *clip_box)
+            except shapely.errors.GEOSException:
+                clipped[i] = shapely.intersection(shapely.make_valid(geom), shapely.box(*clip_box))
+        return clipped
+
+
+def _build_tile(output_dir: str, z: int, x: int, y: int, bounds: Tuple[float, float, float, float], buffer: float,
+                precision: int, layers: List[Tuple[str, int, List[str], List[dict], "np.ndarray"]]) -> Tuple[int, int, int, str, int, Dict[str, int], float]:
+    """
+    Worker: clip each layer's candidate features (WKB) to the buffered tile box, round and write
+    the tile. Returns (z, x, y, sha256, bytes, per-layer feature counts, seconds); sha256 is None
+    if no feature survived the clip and nothing was written.
+    """
+    start_time = time.time()
+    clip_box = (bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+    tile_layers = {}
+    counts = {}
+    for name, dimension, ids, properties, wkb in layers:
+        features = []
+        if len(wkb):
+            clipped = _clip(shapely.from_wkb(wkb), clip_box)
+            clipped = shapely.transform(clipped, lambda coords: np.round(coords, precision))
+            for geom_id, props, geom in zip(ids, properties, clipped):
+                geom = _keep_dimension(geom, dimension)
+                if geom is None:
+                    continue
+                features.append({"type": "Feature", "id": geom_id, "properties": props, "geometry": mapping(geom)})
+        counts[name] = len(features)
+        tile_layers[name] = {"type": "FeatureCollection", "features": features}
+    if not any(counts.values()):
+        return z, x, y, None, 0, counts, time.time() - start_time
+
+    tile = {"z": z, "x": x, "y": y, "bbox": [round(v, 6) for v in bounds], "layers": tile_layers}
+    encoded = json.dumps(tile, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+    tile_path = Path(output_dir) / str(z) / str(x) / f"{y}.json"
+    tile_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(tile_path, 'wb') as f:
+        f.write(encoded)
+    return z, x, y, hashlib.sha256(encoded).hexdigest(), len(encoded), counts, time.time() - start_time
+
+
+def build_pyramid(layers: List[Tuple[str, int, List[str], "np.ndarray", List[dict]]], extent: Tuple[float, float, float],
+                  zooms: List[int], output_dir: Path, workers: int) -> Tuple[Dict[str, dict], List[dict]]:
+    """
+    Simplify, clip and write every zoom of the pyramid. Returns (tiles keyed "z/x/y" with
+    sha256, bytes and per-layer feature counts, per-zoom stats).
+    """
+    tiles = {}
+    zoom_stats = []
+    all_bounds = np.concatenate([shapely.bounds(geoms) for _, _, _, geoms, _ in layers])
+    # Grid of a tenth of a pixel at the highest zoom, across the pyramid extent
+    quantization = TILE_PIXELS * 10 << max(zooms)
+    shared = {}
+    for name, dimension, _, geoms, _ in layers:
+        if dimension == 2:
+            start_time = time.time()
+            shared[name] = shared_arc_layer(geoms, quantization)
+            print(f"  {name}: {len(shared[name][0]['arcs'])} shared arcs in {time.time() - start_time:.1f}s")
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for z in zooms:
+            start_time = time.time()
+            size = extent[2] / (1 << z)
+            tolerance = size / TILE_PIXELS / 2
+            precision = zoom_precision(extent, z)
+            buffer = size * TILE_BUFFER
+
+            prepared = []
+            for name, dimension, ids, geoms, properties in layers:
+                if name in shared:
+                    simplified = simplify_shared(geoms, *shared[name], tolerance)
+                else:
+                    simplified = shapely.simplify(geoms, tolerance, preserve_topology=True)
+                prepared.append((name, dimension, ids, properties, shapely.to_wkb(simplified), STRtree(simplified)))
+            simplify_seconds = time.time() - start_time
+
+            jobs = []
+            for x, y in covering_tiles(all_bounds, extent, z):
+                bounds = tile_bounds(extent, z, x, y)
+                query_box = shapely.box(bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+                tile_layers = []
+                for name, dimension, ids, properties, wkb, tree in prepared:
+                    hits = np.sort(tree.query(query_box, predicate="intersects"))
+                    tile_layers.append((name, dimension, [ids[i] for i in hits.tolist()],
+                                        [properties[i] for i in hits.tolist()], wkb[hits]))
+                jobs.append((str(output_dir), z, x, y, bounds, buffer, precision, tile_layers))
+
+            if pool is not None:
+                results = [future.result() for future in [pool.submit(_build_tile, *job) for job in jobs]]
+            else:
+                results = [_build_tile(*job) for job in jobs]
+
+            written = 0
+            total_bytes = 0
+            slowest = 0.0
+            for tz, tx, ty, checksum, size_bytes, counts, seconds in results:
+                slowest = max(slowest, seconds)
+                if checksum is None:
+                    continue
+                written += 1
+                total_bytes += size_bytes
+                tiles[f"{tz}/{tx}/{ty}"] = {"sha256": checksum, "bytes": size_bytes, "features": counts}
+            stats = {
+                "zoom": z,
+                "tile_size": round(size, 6),
+                "simplify_tolerance": round(tolerance, 6),
+                "precision": precision,
+                "candidate_tiles": len(jobs),
+                "tile_count": written,
+                "bytes": total_bytes,
+                "max_tile_bytes": max((tiles[key]["bytes"] for key in tiles if key.startswith(f"{z}/")), default=0),
+                "simplify_seconds": round(simplify_seconds, 3),
+                "slowest_tile_seconds": round(slowest, 3),
+                "seconds": round(time.time() - start_time, 3)
+            }
+            zoom_stats.append(stats)
+            print(f"  z{z}: {written} tiles ({len(jobs) - written} empty), {total_bytes} bytes, "
+                  f"tolerance {tolerance:.4f}, {stats['seconds']:.2f}s")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return tiles, zoom_stats
+
+
+def update_data_index(index_path: Path, manifest_path: str, checksum: str, zooms: List[int], tile_count: int) -> None:
+    """Add or replace the tiles_viewer_v1 dataset entry in data_index.json."""
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    index.setdefault("datasets", {})[INDEX_DATASET] = {
+        "path": manifest_path,
+        "schema": "awwv://schemas/tiles_viewer_v1.json",
+        "schema_version": "1.0.0",
+        "type": "tile_pyramid",
+        "tile_url": f"{OUTPUT_DIR}/{{z}}/{{x}}/{{y}}.json",
+        "layers": [name for name, _, _, _ in TILE_LAYERS],
+        "min_zoom": min(zooms),
+        "max_zoom": max(zooms),
+        "tile_count": tile_count,
+        "checksum_sha256": checksum,
+        "available": True
+    }
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build a z/x/y tile pyramid of the viewer layers in A1_TACTICAL space")
+    parser.add_argument(
+        "--min-zoom",
+        type=int,
+        default=0,
+        help="Lowest zoom level (default: 0)"
+    )
+    parser.add_argument(
+        "--max-zoom",
+        type=int,
+        default=DEFAULT_MAX_ZOOM,
+        help=f"Highest zoom level (default: {DEFAULT_MAX_ZOOM})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for tile clipping (default: CPU count; 1 runs in-process)"
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Do not update data_index.json"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if not 0 <= args.min_zoom <= args.max_zoom:
+        parser.error("zoom range must satisfy 0 <= --min-zoom <= --max-zoom")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    index_path = derived_dir / "data_index.json"
+    output_dir = derived_dir / OUTPUT_DIR
+    if not index_path.exists():
+        print(f"ERROR: {index_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    canonical_bbox = index.get("canonical_bbox")
+    if not canonical_bbox or len(canonical_bbox) != 4:
+        print(f"ERROR: {index_path} has no canonical_bbox", file=sys.stderr)
+        sys.exit(1)
+    extent = pyramid_extent(canonical_bbox)
+
+    layers = []
+    sources = {}
+    for name, filename, id_field, dimension in TILE_LAYERS:
+        path = derived_dir / filename
+        if not path.exists():
+            print(f"ERROR: {path} not found", file=sys.stderr)
+            sys.exit(1)
+        print(f"Loading {name} from {path}...")
+        ids, geoms, properties = load_tile_layer(path, id_field)
+        layers.append((name, dimension, ids, geoms, properties))
+        sources[name] = {"path": filename, "sha256": file_sha256(path), "feature_count": len(ids)}
+
+    zooms = list(range(args.min_zoom, args.max_zoom + 1))
+    print(f"Building tiles for zooms {args.min_zoom}-{args.max_zoom} into {output_dir} ({args.workers} workers)...")
+    if output_dir.exists():
+        shutil.rmtree(output_dir)   # Drop tiles of a previous run that would now be empty
+    output_dir.mkdir(parents=True)
+    start_time = time.time()
+    tiles, zoom_stats = build_pyramid(layers, extent, zooms, output_dir, args.workers)
+    print(f"  {len(tiles)} tiles in {time.time() - start_time:.1f}s")
+
+    manifest = {
+        "version": "1.0.0",
+        "coordinate_space": index.get("coordinate_space", "A1_TACTICAL"),
+        "canonical_bbox": canonical_bbox,
+        "origin": [extent[0], extent[1]],
+        "extent": extent[2],
+        "tile_pixels": TILE_PIXELS,
+        "tile_buffer": TILE_BUFFER,
+        "min_zoom": args.min_zoom,
+        "max_zoom": args.max_zoom,
+        "tile_url": "{z}/{x}/{y}.json",
+        "sources": sources,
+        "zooms": zoom_stats,
+        "tiles": tiles
+    }
+    manifest_path = output_dir / MANIFEST_NAME
+    encoded = json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8')
+    print(f"Writing {manifest_path}...")
+    with open(manifest_path, 'wb') as f:
+        f.write(encoded)
+
+    if not args.no_index:
+        update_data_index(index_path, f"{OUTPUT_DIR}/{MANIFEST_NAME}", hashlib.sha256(encoded).hexdigest(), zooms, len(tiles))
+        print(f"Updated {index_path}: {INDEX_DATASET} -> {OUTPUT_DIR}/{MANIFEST_NAME}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Diff two versions of a settlement GeoJSON layer feature by feature.
+
+Every feature is fingerprinted with adjacency.geometry_fingerprints (SHA-256 of the WKB of
+the normalized geometry, so ring start vertex, ring orientation and part order do not
+count as changes). Only sids present in both versions with different fingerprints get the
+full geometric comparison, in one vectorized pass: symmetric difference area, Hausdorff
+distance and centroid shift. Changed geometries are classified as
+  moved        centroid shifted by more than --move-tolerance
+  reshaped     outline changed in place
+  equivalent   fingerprint differs but the shapes coincide within --tolerance
+               (e.g. duplicate or collinear vertices added or removed)
+Added and removed sids and sids whose properties alone changed are listed as well.
+A sid that occurs more than once is compared by occurrence: its second feature is keyed
+"<sid>#1", its third "<sid>#2" and so on, in file order.
+
+The old version may be a file or a git object ("HEAD:data/derived/settlements_polygons.geojson"),
+so the tool can run as a pre-commit check against the staged file; --fail-on-change exits
+with status 1 when anything but equivalent geometries differs.
+
+Usage:
+  python tools/map_build/diff_geometry.py OLD NEW [--id-field sid] [--output diff.json] [--fail-on-change]
+  python tools/map_build/diff_geometry.py HEAD:data/derived/settlements_a1_viewer.geojson data/derived/settlements_a1_viewer.geojson
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from shapely.geometry import shape
+
+from adjacency import (
+    geometry_fingerprints,
+    iter_geojson_features,
+    np,
+    shapely,
+)
+
+
+DEFAULT_TOLERANCE = 1e-6
+DEFAULT_MOVE_TOLERANCE = 0.5
+CHANGE_KINDS = ("moved", "reshaped", "equivalent")
+
+
+def load_features(geojson_path: Path, id_field: str) -> Tuple[Dict[str, object], Dict[str, dict], List[str]]:
+    """
+    Read a layer as (key -> shapely geometry, key -> properties, duplicated ids).
+    Features without an id or geometry are skipped. The key is the id for its first feature
+    and "<id>#<n>" for its n-th repeat, so duplicated ids are compared occurrence by occurrence.
+    """
+    geoms = {}
+    properties = {}
+    occurrences = {}
+    for feature in iter_geojson_features(geojson_path):
+        props = feature.get("properties") or {}
+        geom_id = props.get(id_field)
+        geometry = feature.get("geometry")
+        if not geom_id or not geometry:
+            continue
+        geom_id = str(geom_id)
+        repeat = occurrences.get(geom_id, 0)
+        occurrences[geom_id] = repeat + 1
+        if repeat:
+            geom_id = f"{geom_id}#{repeat}"
+        geoms[geom_id] = shape(geometry)
+        properties[geom_id] = props
+    duplicated = sorted(geom_id for geom_id, count in occurrences.items() if count > 1)
+    return geoms, properties, duplicated
+
+
+def resolve_source(source: str) -> Tuple[Path, bool]:
+    """
+    Path of a file source, or of a temporary copy of a git object "REV:path".
+    Returns (path, is_temporary).
+    """
+    if Path(source).exists() or ":" not in source:
+        return Path(source), False
+    result = subprocess.run(['git', 'show', source], capture_output=True, timeout=60)
+    if result.returncode != 0:
+        raise FileNotFoundError(f"{source}: {result.stderr.decode('utf-8', 'replace').strip()}")
+    fd, tmp_path = tempfile.mkstemp(suffix=".geojson")
+    with os.fdopen(fd, 'wb') as f:
+        f.write(result.stdout)
+    return Path(tmp_path), True
+
+
+def _symmetric_difference_area(old: "np.ndarray", new: "np.ndarray") -> "np.ndarray":
+    """Vectorized symmetric difference area, repairing the invalid geometries GEOS cannot overlay."""
+    try:
+        return shapely.area(shapely.symmetric_difference(old, new))
+    except shapely.errors.GEOSException:
+        areas = np.empty(len(old))
+        for i, (a, b) in enumerate(zip(old, new)):
+            try:
+                areas[i] = shapely.area(shapely.symmetric_difference(a, b))
+            except shapely.errors.GEOSException:
+                areas[i] = shapely.area(shapely.symmetric_difference(shapely.make_valid(a), shapely.make_valid(b)))
+        return areas
+
+
+def compare_geometries(old: "np.ndarray", new: "np.ndarray", tolerance: float, move_tolerance: float) -> Dict[str, "np.ndarray"]:
+    """Per-pair metrics and change kind index (into CHANGE_KINDS) for aligned old/new geometry arrays."""
+    symdiff = _symmetric_difference_area(old, new)
+    hausdorff = shapely.hausdorff_distance(old, new)
+    shift = shapely.distance(shapely.centroid(old), shapely.centroid(new))
+    old_area = shapely.area(old)
+    kind = np.where(shift > move_tolerance, 0, np.where((symdiff <= tolerance) & (hausdorff <= tolerance), 2, 1))
+    return {
+        "symmetric_difference_area": symdiff,
+        "relative_difference": np.divide(symdiff, old_area, out=np.full(len(old), np.inf), where=old_area > 0),
+        "hausdorff_distance": hausdorff,
+        "centroid_shift": shift,
+        "old_area": old_area,
+        "new_area": shapely.area(new),
+        "kind": kind
+    }
+
+
+def diff_layers(old_geoms: Dict[str, object], old_props: Dict[str, dict], new_geoms: Dict[str, object], new_props: Dict[str, dict],
+                tolerance: float = DEFAULT_TOLERANCE, move_tolerance: float = DEFAULT_MOVE_TOLERANCE) -> dict:
+    """Diff two id -> geometry/properties layers; returns the report body (summary plus per-sid lists)."""
+    added = sorted(set(new_geoms) - set(old_geoms))
+    removed = sorted(set(old_geoms) - set(new_geoms))
+    common = sorted(set(old_geoms) & set(new_geoms))
+
+    old_fp = geometry_fingerprints({sid: old_geoms[sid] for sid in common})
+    new_fp = geometry_fingerprints({sid: new_geoms[sid] for sid in common})
+    changed = [sid for sid in common if old_fp[sid] != new_fp[sid]]
+    properties_changed = [
+        sid for sid in common
+        if json.dumps(old_props[sid], sort_keys=True) != json.dumps(new_props[sid], sort_keys=True)
+    ]
+
+    changes = []
+    kind_counts = {kind: 0 for kind in CHANGE_KINDS}
+    if changed:
+        metrics = compare_geometries(
+            np.array([old_geoms[sid] for sid in changed], dtype=object),
+            np.array([new_geoms[sid] for sid in changed], dtype=object),
+            tolerance,
+            move_tolerance
+        )
+        counts = np.bincount(metrics["kind"], minlength=len(CHANGE_KINDS))
+        kind_counts = {kind: int(counts[code]) for code, kind in enumerate(CHANGE_KINDS)}
+        # Largest changes first
+        order = np.lexsort((np.arange(len(changed)), -metrics["symmetric_difference_area"]))
+        for i in order.tolist():
+            changes.append({
+                "sid": changed[i],
+                "kind": CHANGE_KINDS[metrics["kind"][i]],
+                "symmetric_difference_area": round(float(metrics["symmetric_difference_area"][i]), 6),
+                "relative_difference": round(float(metrics["relative_difference"][i]), 6) if np.isfinite(metrics["relative_difference"][i]) else None,
+                "hausdorff_distance": round(float(metrics["hausdorff_distance"][i]), 6),
+                "centroid_shift": round(float(metrics["centroid_shift"][i]), 6),
+                "old_area": round(float(metrics["old_area"][i]), 6),
+                "new_area": round(float(metrics["new_area"][i]), 6)
+            })
+
+    return {
+        "summary": {
+            "old_count": len(old_geoms),
+            "new_count": len(new_geoms),
+            "added_count": len(added),
+            "removed_count": len(removed),
+            "unchanged_count": len(common) - len(changed),
+            "changed_count": len(changed),
+            "change_kinds": kind_counts,
+            "properties_changed_count": len(properties_changed)
+        },
+        "added": added,
+        "removed": removed,
+        "changed": changes,
+        "properties_changed": properties_changed
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Diff two versions of a settlement GeoJSON layer feature by feature")
+    parser.add_argument("old", help="Old version: GeoJSON path or git object REV:path")
+    parser.add_argument("new", help="New version: GeoJSON path or git object REV:path")
+    parser.add_argument(
+        "--id-field",
+        default="sid",
+        help="Feature id property (default: sid)"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Area/distance below which a changed geometry counts as equivalent (default: {DEFAULT_TOLERANCE})"
+    )
+    parser.add_argument(
+        "--move-tolerance",
+        type=float,
+        default=DEFAULT_MOVE_TOLERANCE,
+        help=f"Centroid shift above which a changed geometry counts as moved (default: {DEFAULT_MOVE_TOLERANCE})"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Write the full diff report as JSON to this path"
+    )
+    parser.add_argument(
+        "--fail-on-change",
+        action="store_true",
+        help="Exit with status 1 if any sid was added, removed or changed (equivalent geometries excepted)"
+    )
+    args = parser.parse_args()
+
+    start_time = time.time()
+    layers = []
+    for source in (args.old, args.new):
+        try:
+            path, is_temporary = resolve_source(source)
+        except (FileNotFoundError, subprocess.SubprocessError) as e:
+            print(f"ERROR: {e}", file=sys.stderr)
+            sys.exit(2)
+        if not path.exists():
+            print(f"ERROR: {path} not found", file=sys.stderr)
+            sys.exit(2)
+        try:
+            geoms, properties, duplicated = load_features(path, args.id_field)
+        finally:
+            if is_temporary:
+                os.unlink(path)
+        if duplicated:
+            print(f"WARNING: {source}: {len(duplicated)} duplicated {args.id_field}(s), compared by occurrence: "
+                  f"{', '.join(duplicated[:10])}", file=sys.stderr)
+        layers.append((geoms, properties, duplicated))
+    load_seconds = time.time() - start_time
+
+    (old_geoms, old_props, old_duplicated), (new_geoms, new_props, new_duplicated) = layers
+    diff = diff_layers(old_geoms, old_props, new_geoms, new_props, args.tolerance, args.move_tolerance)
+    diff["duplicated"] = {"old": old_duplicated, "new": new_duplicated}
+    summary = diff["summary"]
+    elapsed = time.time() - start_time
+
+    kinds = ", ".join(f"{kind} {count}" for kind, count in summary["change_kinds"].items())
+    print(f"{args.old} -> {args.new}")
+    print(f"  {summary['old_count']} -> {summary['new_count']} features: {summary['added_count']} added, "
+          f"{summary['removed_count']} removed, {summary['changed_count']} changed ({kinds}), "
+          f"{summary['properties_changed_count']} with changed properties")
+    for change in diff["changed"][:10]:
+        print(f"  {change['sid']}: {change['kind']}, symmetric difference {change['symmetric_difference_area']}, "
+              f"Hausdorff {change['hausdorff_distance']}, centroid shift {change['centroid_shift']}")
+    print(f"  ({load_seconds:.2f}s load, {elapsed:.2f}s total)")
+
+    if args.output:
+        report = {
+            "version": "1.0.0",
+            "old": args.old,
+            "new": args.new,
+            "id_field": args.id_field,
+            "tolerance": args.tolerance,
+            "move_tolerance": args.move_tolerance,
+            **diff
+        }
+        print(f"Writing {args.output}...")
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    significant = summary["added_count"] + summary["removed_count"] + summary["changed_count"] - summary["change_kinds"]["equivalent"]
+    if args.fail_on_change and significant:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Export the viewer settlement and municipality layers as quantized TopoJSON topologies.
+
+Reads settlements_a1_viewer.geojson (A1 SVG units) and municipalities_2_5d_viewer.geojson
+(WGS84 degrees). The layers live in different coordinate spaces, so each gets its own
+topology and quantization grid: topology.build_topology builds the layer's arc table
+(borders shared by two features are stored once), and viewer_topology_<layer>.json holds
+integer-quantized, delta-encoded arcs plus one GeometryCollection object carrying the
+original feature properties (the id property and properties common to every feature are
+stored once). A feature whose rings all collapse on the grid keeps a degenerate arc (its
+quantized exterior) and is reported, so no viewer feature is dropped.
+
+A feature that is valid in the source can still break on the grid (a vertex rounded across
+a sliver) or collapse. The requested quantization is then raised step by step up to
+--max-quantization until every such feature decodes valid; if none of those grids works,
+the layer is not written unless --allow-invalid is given.
+The data_index.json entries "<layer>_topology_viewer_v1" record each file's SHA-256.
+
+Usage:
+  python tools/map_build/export_topojson.py [derived_dir] [--quantization 100000] [--max-quantization N]
+                                               [--allow-invalid] [--no-index]
+  Quantization is per layer: grid steps across that layer's bounding box; the grid
+  actually used is recorded in awwv_meta and data_index.json.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from shapely.geometry import MultiPolygon, Polygon, shape
+
+from adjacency import (
+    file_sha256,
+    iter_geojson_features,
+    np,
+    shapely,
+)
+from topology import build_topology, iter_rings
+
+
+# (object name, source file, id property)
+VIEWER_LAYERS = (
+    ("settlements", "settlements_a1_viewer.geojson", "sid"),
+    ("municipalities", "municipalities_2_5d_viewer.geojson", "mun1990_id"),
+)
+DEFAULT_QUANTIZATION = 100_000
+
+
+def output_name(layer: str) -> str:
+    return f"viewer_topology_{layer}.json"
+
+
+def index_dataset(layer: str) -> str:
+    return f"{layer}_topology_viewer_v1"
+
+
+def load_layer(geojson_path: Path, id_field: str) -> Tuple[List[str], List[object], List[dict]]:
+    """Read a viewer GeoJSON layer as (ids, shapely geometries or None, properties), in file order."""
+    ids = []
+    geoms = []
+    properties = []
+    for feature in iter_geojson_features(geojson_path):
+        props = feature.get("properties") or {}
+        geometry = feature.get("geometry")
+        ids.append(str(props.get(id_field, "")))
+        geoms.append(shape(geometry) if geometry else None)
+        properties.append(props)
+    return ids, geoms, properties
+
+
+def delta_encode(arc: "np.ndarray") -> List[List[int]]:
+    """TopoJSON delta encoding: first position absolute, the rest relative to the previous one."""
+    deltas = arc.copy()
+    deltas[1:] -= arc[:-1]
+    return deltas.tolist()
+
+
+def topology_geometry(parts: List[List[List[int]]], geom_id: str, props: dict) -> dict:
+    """TopoJSON geometry object for one feature's arc references."""
+    if not parts:
+        geometry = {"type": None}
+    elif len(parts) == 1:
+        geometry = {"type": "Polygon", "arcs": parts[0]}
+    else:
+        geometry = {"type": "MultiPolygon", "arcs": parts}
+    geometry["id"] = geom_id
+    geometry["properties"] = props
+    return geometry
+
+
+def build_layer_topology(geoms: List[object], quantization: int) -> Tuple[dict, List[int]]:
+    """
+    build_topology over one layer's geometries (keyed by feature index) on the layer's own grid.
+
+    Features whose rings all collapse on the grid get one degenerate arc per part (the
+    quantized exterior with its repeated vertices kept), so they stay in the viewer data.
+    Returns (topology, indices of the features given degenerate arcs).
+    """
+    keyed = {i: geom for i, geom in enumerate(geoms) if geom is not None and not geom.is_empty}
+    topology = build_topology(keyed, quantization)
+    scale = np.array(topology["transform"]["scale"])
+    translate = np.array(topology["transform"]["translate"])
+    degenerate = []
+    for k, (i, parts) in enumerate(zip(topology["sids"], topology["objects"])):
+        if parts:
+            continue
+        for _, ring_index, coords in iter_rings(keyed[i]):
+            if ring_index == 0:
+                parts.append([[len(topology["arcs"])]])
+                topology["arcs"].append(np.rint((coords - translate) / scale).astype(np.int64))
+        degenerate.append(i)
+    if degenerate:
+        extra = len(topology["arcs"]) - len(topology["lengths"])
+        topology["left"] = np.concatenate([topology["left"], np.full(extra, -1, dtype=np.int64)])
+        topology["right"] = np.concatenate([topology["right"], np.full(extra, -1, dtype=np.int64)])
+        topology["lengths"] = np.concatenate([topology["lengths"], np.zeros(extra)])
+    return topology, degenerate
+
+
+def shared_properties(properties: List[dict]) -> dict:
+    """Properties every feature of the layer carries with the same value."""
+    if not properties:
+        return {}
+    shared = dict(properties[0])
+    for props in properties[1:]:
+        shared = {key: value for key, value in shared.items() if key in props and props[key] == value}
+        if not shared:
+            break
+    return shared
+
+
+def topology_document(name: str, ids: List[str], properties: List[dict], topology: dict, arcs: List["np.ndarray"], id_field: str) -> dict:
+    """
+    Assemble one layer's TopoJSON document from a build_layer_topology result and its (possibly
+    simplified) quantized arcs. Properties are stored once where they can be: the id property
+    is carried by each geometry's "id", and properties shared by every feature move to the
+    collection's "properties" (a viewer merges them back into each feature).
+    """
+    parts_by_index = dict(zip(topology["sids"], topology["objects"]))
+    shared = shared_properties(properties)
+    shared.pop(id_field, None)
+    geometries = [
+        topology_geometry(parts_by_index.get(i, []), geom_id, {
+            key: value for key, value in props.items()
+            if key not in shared and not (key == id_field and str(value) == geom_id)
+        })
+        for i, (geom_id, props) in enumerate(zip(ids, properties))
+    ]
+    collection = {
+        "type": "GeometryCollection",
+        "id_property": id_field,
+        "properties": shared,
+        "geometries": geometries
+    }
+    return {
+        "type": "Topology",
+        "transform": topology["transform"],
+        "objects": {name: collection},
+        "arcs": [delta_encode(arc) for arc in arcs]
+    }
+
+
+def decode_feature(parts: List[List[List[int]]], arcs: List["np.ndarray"], transform: dict):
+    """Rebuild a shapely Polygon/MultiPolygon from arc references (quantized arcs, absolute coordinates)."""
+    scale = np.array(transform["scale"])
+    translate = np.array(transform["translate"])
+    polygons = []
+    for part in parts:
+        rings = []
+        for ring in part:
+            pieces = [arcs[~ref][::-1] if ref < 0 else arcs[ref] for ref in ring]
+            coords = np.concatenate([pieces[0]] + [piece[1:] for piece in pieces[1:]])
+            rings.append(coords * scale + translate)
+        if len(rings[0]) < 4:
+            polygons.append(Polygon())
+            continue
+        polygons.append(Polygon(rings[0], [r for r in rings[1:] if len(r) >= 4]))
+    return polygons[0] if len(polygons) == 1 else MultiPolygon(polygons)
+
+
+def quantization_invalid(geoms: List[object], topology: dict, arcs: List["np.ndarray"]) -> List[int]:
+    """Indices of features valid in the source whose decoded quantized geometry is invalid."""
+    indices = topology["sids"]
+    source = np.array([geoms[i] for i in indices], dtype=object)
+    decoded = np.array([decode_feature(parts, arcs, topology["transform"]) for parts in topology["objects"]], dtype=object)
+    broken = shapely.is_valid(source) & ~shapely.is_valid(decoded)
+    return [indices[k] for k in np.flatnonzero(broken).tolist()]
+
+
+def select_quantization(geoms: List[object], quantization: int, max_quantization: int) -> Tuple[int, dict, List[int], List[int]]:
+    """
+    Build the layer topology on the requested grid and, while features that are valid in the
+    source decode invalid (or collapse), on finer grids stepped up by half each time up to
+    max_quantization. Which features break depends on where the grid lines fall, not only on
+    its resolution, so a finer grid is a fresh chance rather than a guaranteed improvement.
+    Returns (quantization, topology, degenerate, invalid) for the first clean grid, or for the
+    one with the fewest invalid features if none is clean.
+    """
+    best = None
+    while True:
+        topology, degenerate = build_layer_topology(geoms, quantization)
+        invalid = quantization_invalid(geoms, topology, topology["arcs"])
+        if best is None or len(invalid) < len(best[3]):
+            best = (quantization, topology, degenerate, invalid)
+        next_quantization = quantization + quantization // 2
+        if not invalid or next_quantization > max_quantization:
+            return best
+        print(f"  {len(invalid)} feature(s) invalid at quantization {quantization}; trying {next_quantization}")
+        quantization = next_quantization
+
+
+def update_data_index(index_path: Path, layer: str, checksum: str, record_count: int, quantization: int) -> None:
+    """Add or replace a layer's <layer>_topology_viewer_v1 dataset entry in data_index.json."""
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    index.setdefault("datasets", {})[index_dataset(layer)] = {
+        "path": output_name(layer),
+        "schema": "awwv://schemas/topology_viewer_v1.json",
+        "schema_version": "1.0.0",
+        "type": "topology",
+        "object": layer,
+        "record_count": record_count,
+        "quantization": quantization,
+        "checksum_sha256": checksum,
+        "available": True
+    }
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export viewer layers as quantized, arc-shared TopoJSON topologies (one per layer)")
+    parser.add_argument(
+        "--quantization",
+        type=int,
+        default=DEFAULT_QUANTIZATION,
+        help=f"Grid steps across each layer's bounding box (default: {DEFAULT_QUANTIZATION})"
+    )
+    parser.add_argument(
+        "--max-quantization",
+        type=int,
+        default=None,
+        help="Finest grid tried when features break on the requested one (default: 16x --quantization)"
+    )
+    parser.add_argument(
+        "--allow-invalid",
+        action="store_true",
+        help="Write a layer even if some valid features stay invalid after quantization"
+    )
+    parser.add_argument(
+        "--no-index",
+        action="store_true",
+        help="Do not update data_index.json"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if args.quantization < 2:
+        parser.error("--quantization must be at least 2")
+    if args.max_quantization is None:
+        args.max_quantization = 16 * args.quantization
+    elif args.max_quantization < args.quantization:
+        parser.error("--max-quantization must be at least --quantization")
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    index_path = derived_dir / "data_index.json"
+
+    for name, filename, id_field in VIEWER_LAYERS:
+        path = derived_dir / filename
+        if not path.exists():
+            print(f"ERROR: {path} not found", file=sys.stderr)
+            sys.exit(1)
+        print(f"Loading {name} from {path}...")
+        ids, geoms, properties = load_layer(path, id_field)
+
+        print(f"Building {name} topology (quantization {args.quantization})...")
+        start_time = time.time()
+        quantization, topology, degenerate, invalid = select_quantization(geoms, args.quantization, args.max_quantization)
+        print(f"  {len(topology['arcs'])} arcs at quantization {quantization} in {time.time() - start_time:.1f}s")
+        if invalid:
+            message = (f"{len(invalid)} valid {name} feature(s) are invalid after quantization up to "
+                       f"{args.max_quantization}: {', '.join(ids[i] for i in invalid[:10])}")
+            if not args.allow_invalid:
+                print(f"ERROR: {message}; not writing {output_name(name)} (use --allow-invalid or raise --max-quantization)", file=sys.stderr)
+                sys.exit(1)
+            print(f"WARNING: {message}; writing them anyway (--allow-invalid)", file=sys.stderr)
+        if degenerate:
+            print(f"WARNING: {len(degenerate)} {name} feature(s) collapsed under quantization and were kept as "
+                  f"degenerate arcs: {', '.join(ids[i] for i in degenerate[:10])}", file=sys.stderr)
+        document = topology_document(name, ids, properties, topology, topology["arcs"], id_field)
+
+        document["awwv_meta"] = {
+            "role": "viewer_topology",
+            "version": "1.0.0",
+            "object": name,
+            "quantization": quantization,
+            "record_count": len(ids),
+            "degenerate_features": [ids[i] for i in degenerate],
+            "quantization_invalid_features": [ids[i] for i in invalid],
+            "source": {"path": filename, "sha256": file_sha256(path)}
+        }
+
+        content = json.dumps(document, ensure_ascii=False, separators=(",", ":"))
+        encoded = content.encode('utf-8')
+        checksum = hashlib.sha256(encoded).hexdigest()
+        output_path = derived_dir / output_name(name)
+        print(f"Writing {output_path} ({len(encoded)} bytes, {len(encoded) / path.stat().st_size:.0%} of the source GeoJSON)...")
+        with open(output_path, 'wb') as f:
+            f.write(encoded)
+
+        if not args.no_index:
+            if index_path.exists():
+                update_data_index(index_path, name, checksum, len(ids), quantization)
+                print(f"Updated {index_path}: {index_dataset(name)} -> {output_path.name}")
+            else:
+                print(f"WARNING: {index_path} not found; index not updated", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
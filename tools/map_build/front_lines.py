@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Extract front edges and merged front polylines from political control snapshots.
+
+A front edge is a settlement edge (settlement_edges.json) whose two settlements have
+different controllers. Each front edge's border piece is taken from the arc table of
+topology.build_topology (the arcs the two settlements own on opposite sides), so pieces of
+neighbouring front edges meet exactly at junctions and merge into long polylines. Pairs
+without a shared arc (distance edges, borders whose vertices do not coincide) fall back to
+the part of the lower sid's boundary within the pair's gap of the other settlement; parts
+shorter than GAP_TOLERANCE (point contacts) are dropped and the remaining ends are snapped
+to the nearest topology junction within GAP_TOLERANCE, so they meet the arc pieces. Where
+the settlement coverage has a gap along the front, two dangling piece ends are bridged by
+the one-sided arc between them if it stays within GAP_TOLERANCE of the other side.
+Pieces are computed once per pair and cached; per faction pair they are merged into
+polylines and their lengths summed.
+
+FrontTracker.update(control, changed_sids) re-checks only the edges incident to the
+changed settlements. Merged polylines are kept per group of pieces joined at shared
+endpoints, and a refresh re-merges only the groups that gained or lost an edge, so
+stepping through a long scenario does not redo every edge comparison and merge.
+
+Usage:
+  python tools/map_build/front_lines.py [derived_dir] [--control political_control_data.json ...]
+  Each --control snapshot (default: political_control_data.json) is applied in order as one
+  turn and written to front_lines_<snapshot stem>.json.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from adjacency import (
+    EPSILON,
+    GAP_TOLERANCE,
+    STRtree,
+    load_polygons_cached,
+    np,
+    shapely,
+)
+from topology import build_topology
+
+
+def load_edges(edges_path: Path) -> List[Tuple[str, str]]:
+    """Read settlement_edges.json as a sorted list of (sid1, sid2)."""
+    with open(edges_path, 'r', encoding='utf-8') as f:
+        return sorted((edge["a"], edge["b"]) for edge in json.load(f).get("edges", []))
+
+
+def load_control(control_path: Path) -> Dict[str, Optional[str]]:
+    """Read a political control snapshot as sid -> controller (None when uncontrolled/unknown)."""
+    with open(control_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return dict(data.get("by_settlement_id", data))
+
+
+def faction_pair(side_a: Optional[str], side_b: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Sorted controller pair of an edge, or None if the edge is not a front."""
+    if side_a is None or side_b is None or side_a == side_b:
+        return None
+    return (side_a, side_b) if side_a < side_b else (side_b, side_a)
+
+
+class FrontTracker:
+    """
+    Front edges and polylines for one control assignment, updated incrementally.
+
+    Border pieces are cached per edge index, merged polylines per group of pieces joined at
+    shared endpoints; update() invalidates only what the changed settlements touch.
+    """
+
+    def __init__(self, polygons: Dict[str, object], edges: List[Tuple[str, str]], control: Dict[str, Optional[str]], topology: Optional[dict] = None):
+        self.polygons = polygons
+        self.topology = topology
+        self.pair_arcs = {}     # (sid1, sid2) -> arc indices separating the two settlements
+        self.nodes = None       # topology junctions (arc end points) in map coordinates
+        self.gap_arcs = {}      # junction -> (arc, far junction) for arcs with a settlement on one side only
+        self.gap_arc_owner = {} # one-sided arc -> its settlement
+        self.gap_arc_length = {}
+        self.bridge_checks = {} # (arc, opposite sids) -> whether the arc stays within GAP_TOLERANCE of them
+        if topology is not None:
+            sids = topology["sids"]
+            scale = np.array(topology["transform"]["scale"])
+            translate = np.array(topology["transform"]["translate"])
+            for arc, (l, r) in enumerate(zip(topology["left"].tolist(), topology["right"].tolist())):
+                if l >= 0 and r >= 0 and l != r:
+                    key = (sids[l], sids[r]) if sids[l] < sids[r] else (sids[r], sids[l])
+                    self.pair_arcs.setdefault(key, []).append(arc)
+                elif (l < 0) != (r < 0):
+                    coords = topology["arcs"][arc] * scale + translate
+                    first, last = tuple(coords[0].tolist()), tuple(coords[-1].tolist())
+                    if first != last:
+                        self.gap_arc_length[arc] = float(np.hypot(*np.diff(coords, axis=0).T).sum())
+                        self.gap_arcs.setdefault(first, []).append((arc, last))
+                        self.gap_arcs.setdefault(last, []).append((arc, first))
+                        self.gap_arc_owner[arc] = sids[max(l, r)]
+            ends = np.array([arc[[0, -1]] for arc in topology["arcs"]]).reshape(-1, 2)
+            self.nodes = np.unique(ends, axis=0) * scale + translate
+            self.node_tree = STRtree(shapely.points(self.nodes))
+        self.edges = edges
+        self.left = [a for a, _ in edges]
+        self.right = [b for _, b in edges]
+        self.incident = {}
+        for index, (a, b) in enumerate(edges):
+            self.incident.setdefault(a, []).append(index)
+            self.incident.setdefault(b, []).append(index)
+        self.control = {}
+        self.edge_pair = {}     # front edge index -> faction pair
+        self.pair_edges = {}    # faction pair -> set of front edge indices
+        self.pieces = {}        # edge index -> border piece (cached across turns)
+        self.piece_ends = {}    # edge index -> end points of the piece's lines
+        self.groups = {}        # faction pair -> group id -> (edge indices, merged polyline)
+        self.edge_group = {}    # faction pair -> edge index -> group id
+        self.endpoints = {}     # faction pair -> end point -> edge indices
+        self.polylines = {}     # faction pair -> merged polyline geometry
+        self.next_group = 0
+        self.dirty = {}         # faction pair -> edge indices added or removed since the last refresh
+        self.update(control, None)
+
+    def update(self, control: Dict[str, Optional[str]], changed_sids: Optional[Iterable[str]]) -> Set[Tuple[str, str]]:
+        """
+        Apply a new control assignment. changed_sids lists the settlements whose controller
+        may have changed (None re-checks every edge). Returns the faction pairs whose front
+        changed.
+        """
+        if changed_sids is None:
+            candidates = range(len(self.edges))
+        else:
+            candidates = sorted({index for sid in changed_sids for index in self.incident.get(sid, ())})
+        previous, self.control = self.control, dict(control)
+
+        changed_pairs = set()
+        for index in candidates:
+            new_pair = faction_pair(self.control.get(self.left[index]), self.control.get(self.right[index]))
+            old_pair = self.edge_pair.get(index)
+            if new_pair == old_pair:
+                if new_pair is not None and previous.get(self.left[index]) != self.control.get(self.left[index]):
+                    # Sides swapped: same pair, but bridges checked against the other side change
+                    self.dirty.setdefault(new_pair, set()).add(index)
+                continue
+            if old_pair is not None:
+                self.pair_edges[old_pair].discard(index)
+                changed_pairs.add(old_pair)
+                self.dirty.setdefault(old_pair, set()).add(index)
+                del self.edge_pair[index]
+            if new_pair is not None:
+                self.pair_edges.setdefault(new_pair, set()).add(index)
+                changed_pairs.add(new_pair)
+                self.dirty.setdefault(new_pair, set()).add(index)
+                self.edge_pair[index] = new_pair
+
+        return changed_pairs
+
+    def _ensure_pieces(self, indices: List[int]) -> None:
+        """Compute and cache border pieces for edges that do not have one yet (one vectorized batch)."""
+        missing = [index for index in indices if index not in self.pieces]
+        if self.topology is not None:
+            scale = np.array(self.topology["transform"]["scale"])
+            translate = np.array(self.topology["transform"]["translate"])
+            arcs = self.topology["arcs"]
+            fallback = []
+            for index in missing:
+                arc_indices = self.pair_arcs.get(self.edges[index])
+                if arc_indices:
+                    self.pieces[index] = shapely.multilinestrings([
+                        shapely.linestrings(arcs[arc] * scale + translate) for arc in arc_indices
+                    ])
+                    self.piece_ends[index] = self._ends(self.pieces[index])
+                else:
+                    fallback.append(index)
+            missing = fallback
+        if not missing:
+            return
+        geoms_a = np.array([self.polygons[self.left[index]] for index in missing], dtype=object)
+        geoms_b = np.array([self.polygons[self.right[index]] for index in missing], dtype=object)
+        gaps = np.maximum(shapely.distance(geoms_a, geoms_b) * 1.01, EPSILON)
+        pieces = shapely.intersection(shapely.boundary(geoms_a), shapely.buffer(geoms_b, gaps))
+        parts, part_edge = shapely.get_parts(pieces, return_index=True)
+        keep = (shapely.get_type_id(parts) == shapely.GeometryType.LINESTRING) & (shapely.length(parts) >= GAP_TOLERANCE)
+        parts, part_edge = parts[keep], part_edge[keep]
+        if self.nodes is not None and len(parts):
+            parts, part_edge = self._snap_ends(parts, part_edge)
+        counts = np.bincount(part_edge, minlength=len(missing))
+        for index, piece_parts in zip(missing, np.split(parts, np.cumsum(counts)[:-1])):
+            self.pieces[index] = shapely.multilinestrings(piece_parts)
+            self.piece_ends[index] = self._ends(self.pieces[index])
+
+    def _snap_ends(self, parts: "np.ndarray", part_edge: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray"]:
+        """Move line ends onto the nearest topology junction within GAP_TOLERANCE; drops lines that collapse."""
+        coords, line_index = shapely.get_coordinates(parts, return_index=True)
+        last = np.cumsum(shapely.get_num_coordinates(parts)) - 1
+        first = np.concatenate([[0], last[:-1] + 1])
+        ends = np.concatenate([first, last])
+        query, node = self.node_tree.query_nearest(shapely.points(coords[ends]), max_distance=GAP_TOLERANCE, all_matches=False)
+        coords[ends[query]] = self.nodes[node]
+        parts = shapely.linestrings(coords, indices=line_index)
+        keep = shapely.length(parts) > EPSILON
+        return parts[keep], part_edge[keep]
+
+    def _arc_line(self, arc: int):
+        """Topology arc as a linestring in map coordinates."""
+        return shapely.linestrings(self.topology["arcs"][arc] * np.array(self.topology["transform"]["scale"]) + np.array(self.topology["transform"]["translate"]))
+
+    def _bridges(self, arc: int, index: int, other: int) -> bool:
+        """
+        Whether a one-sided arc joins the pieces of two front edges: one of the edges contains
+        the arc's settlement and every arc vertex is within GAP_TOLERANCE of the edges'
+        settlements on the other side of the front, i.e. the front runs on along a gap in the
+        settlement coverage.
+        """
+        owner = self.gap_arc_owner[arc]
+        sides = set(self.edges[index]) | set(self.edges[other])
+        if owner not in sides:
+            return False
+        opposite = {sid for sid in sides if self.control.get(sid) != self.control.get(owner)}
+        key = (arc, *sorted(opposite))
+        if key not in self.bridge_checks:
+            points = shapely.points(shapely.get_coordinates(self._arc_line(arc)))
+            distance = np.min([shapely.distance(points, self.polygons[sid]) for sid in opposite], axis=0)
+            self.bridge_checks[key] = bool(distance.max() <= GAP_TOLERANCE)
+        return self.bridge_checks[key]
+
+    def _links(self, index: int, endpoints: Dict[Tuple[float, float], Set[int]], dangling: bool = True) -> Iterable[Tuple[int, Optional[int]]]:
+        """
+        (other edge, bridging arc or None) for the pieces in endpoints that the piece of index
+        joins. With dangling, a bridge is only taken between junctions where a single piece ends
+        and only if it is the shortest valid bridge at both, so it never branches a line;
+        without it every possible bridge is listed.
+        """
+        for point in self.piece_ends[index]:
+            for other in endpoints.get(point, ()):
+                if other != index:
+                    yield other, None
+            if not dangling:
+                for arc, far in self.gap_arcs.get(point, ()):
+                    for other in endpoints.get(far, ()):
+                        yield other, arc
+                continue
+            best = self._best_bridge(point, endpoints)
+            if best is not None and self._best_bridge(best[1], endpoints) == (best[0], point, index):
+                yield best[2], best[0]
+
+    def _best_bridge(self, point: Tuple[float, float], endpoints: Dict[Tuple[float, float], Set[int]]) -> Optional[Tuple[int, Tuple[float, float], int]]:
+        """Shortest (arc, far junction, other edge) bridge from a junction where a single piece ends to another such junction."""
+        if len(endpoints.get(point, ())) != 1:
+            return None
+        (index,) = endpoints[point]
+        best = None
+        for arc, far in self.gap_arcs.get(point, ()):
+            if len(endpoints.get(far, ())) != 1:
+                continue
+            (other,) = endpoints[far]
+            if self._bridges(arc, index, other) and (best is None or (self.gap_arc_length[arc], arc) < (self.gap_arc_length[best[0]], best[0])):
+                best = (arc, far, other)
+        return best
+
+    @staticmethod
+    def _ends(piece) -> List[Tuple[float, float]]:
+        """Distinct end points of a piece's lines."""
+        lines = shapely.get_parts(piece)
+        if not len(lines):
+            return []
+        return sorted({tuple(point) for point in shapely.get_coordinates(
+            np.concatenate([shapely.get_point(lines, 0), shapely.get_point(lines, -1)])
+        ).tolist()})
+
+    def _merge(self, pair: Tuple[str, str], changed: Set[int]) -> None:
+        """
+        Re-merge the groups of pair touched by changed edges: groups holding a changed edge
+        and groups an added piece joins. Other groups are kept as is.
+        """
+        current = self.pair_edges.get(pair, set())
+        groups = self.groups.setdefault(pair, {})
+        edge_group = self.edge_group.setdefault(pair, {})
+        endpoints = self.endpoints.setdefault(pair, {})
+        added = sorted(index for index in changed if index in current and index not in edge_group)
+        self._ensure_pieces(added)
+
+        affected = {edge_group[index] for index in changed if index in edge_group}
+        for index in added:
+            affected.update(edge_group[other] for other, _ in self._links(index, endpoints, dangling=False))
+        pool = set(added)
+        for group in affected:
+            members, _ = groups.pop(group)
+            pool |= members
+            for index in members:
+                del edge_group[index]
+                for point in self.piece_ends[index]:
+                    endpoints[point].discard(index)
+                    if not endpoints[point]:
+                        del endpoints[point]
+        pool &= current
+        for index in pool:
+            for point in self.piece_ends[index]:
+                endpoints.setdefault(point, set()).add(index)
+
+        # Regroup the pool by shared end points and bridging arcs, and merge each group on its own;
+        # a kept group reached through a bridge that only now dangles is taken into the pool
+        while pool:
+            members = set()
+            bridges = set()
+            stack = [min(pool)]
+            while stack:
+                index = stack.pop()
+                if index in members:
+                    continue
+                members.add(index)
+                for other, arc in self._links(index, endpoints):
+                    if arc is not None:
+                        bridges.add(arc)
+                    if other in edge_group:
+                        absorbed, _ = groups.pop(edge_group[other])
+                        for member in absorbed:
+                            del edge_group[member]
+                        pool |= absorbed
+                    if other not in members:
+                        stack.append(other)
+            pool -= members
+            lines = shapely.get_parts(np.array([self.pieces[index] for index in sorted(members)], dtype=object))
+            lines = np.concatenate([lines, [self._arc_line(arc) for arc in sorted(bridges)]]) if bridges else lines
+            merged = shapely.line_merge(shapely.multilinestrings(lines)) if len(lines) else None
+            groups[self.next_group] = (members, merged)
+            for index in members:
+                edge_group[index] = self.next_group
+            self.next_group += 1
+
+        lines = [
+            shapely.get_parts(merged)
+            for members, merged in sorted(groups.values(), key=lambda group: min(group[0]))
+            if merged is not None
+        ]
+        if current:
+            self.polylines[pair] = shapely.multilinestrings(np.concatenate(lines)) if lines else shapely.multilinestrings([])
+        else:
+            self.polylines.pop(pair, None)
+
+    def refresh(self) -> None:
+        """Re-merge the polyline groups touched by edges changed since the last refresh."""
+        for pair in sorted(self.dirty):
+            self._merge(pair, self.dirty[pair])
+        self.dirty.clear()
+
+    def front_edges(self) -> List[dict]:
+        """Current front edges in edge order."""
+        return [
+            {"a": self.left[index], "b": self.right[index],
+             "side_a": self.control.get(self.left[index]), "side_b": self.control.get(self.right[index])}
+            for index in sorted(self.edge_pair)
+        ]
+
+    def to_json(self, precision: int = 4) -> dict:
+        """Front edges plus per-faction-pair edge count, length and merged polylines."""
+        self.refresh()
+        side_pairs = {}
+        for pair in sorted(self.pair_edges):
+            if not self.pair_edges[pair]:
+                continue
+            merged = self.polylines[pair]
+            polylines = [
+                np.round(shapely.get_coordinates(line), precision).tolist()
+                for line in shapely.get_parts(merged)
+            ]
+            side_pairs[f"{pair[0]}|{pair[1]}"] = {
+                "edge_count": len(self.pair_edges[pair]),
+                "length": round(float(shapely.length(merged)), 6),
+                "polyline_count": len(polylines),
+                "polylines": polylines
+            }
+        return {
+            "front_edges": self.front_edges(),
+            "stats": {
+                "total_front_edges": len(self.edge_pair),
+                "side_pairs": {name: {k: v for k, v in entry.items() if k != "polylines"} for name, entry in side_pairs.items()}
+            },
+            "side_pairs": side_pairs
+        }
+
+
+def changed_controllers(previous: Dict[str, Optional[str]], current: Dict[str, Optional[str]]) -> List[str]:
+    """Sids whose controller differs between two snapshots (including added/removed sids)."""
+    return sorted(sid for sid in set(previous) | set(current) if previous.get(sid) != current.get(sid))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extract front edges and merged front polylines from control snapshots")
+    parser.add_argument(
+        "--control",
+        action="append",
+        type=Path,
+        default=None,
+        help="Control snapshot (relative to derived_dir unless absolute); repeat for successive turns "
+             "(default: political_control_data.json)"
+    )
+    parser.add_argument(
+        "--no-geometry-cache",
+        action="store_true",
+        help="Always parse settlements_polygons.geojson instead of using the binary geometry cache"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    polygons_path = derived_dir / "settlements_polygons.geojson"
+    edges_path = derived_dir / "settlement_edges.json"
+    control_paths = [derived_dir / path for path in (args.control or [Path("political_control_data.json")])]
+    for path in [polygons_path, edges_path, *control_paths]:
+        if not path.exists():
+            print(f"ERROR: {path} not found", file=sys.stderr)
+            sys.exit(1)
+
+    print(f"Loading geometries from {polygons_path}...")
+    polygons, _, _ = load_polygons_cached(polygons_path, use_cache=not args.no_geometry_cache)
+    edges = [edge for edge in load_edges(edges_path) if edge[0] in polygons and edge[1] in polygons]
+    print(f"Loaded {len(polygons)} geometries, {len(edges)} edges")
+
+    tracker = None
+    previous = None
+    for control_path in control_paths:
+        control = load_control(control_path)
+        start_time = time.time()
+        if tracker is None:
+            tracker = FrontTracker(polygons, edges, control, build_topology(polygons))
+            changed = None
+        else:
+            changed = changed_controllers(previous, control)
+            tracker.update(control, changed)
+        front_json = {
+            "version": "1.0.0",
+            "control_source": control_path.name,
+            **tracker.to_json()
+        }
+        previous = control
+        changed_note = "full build" if changed is None else f"{len(changed)} changed settlements"
+        print(f"  {control_path.name}: {front_json['stats']['total_front_edges']} front edges, "
+              f"{len(front_json['side_pairs'])} faction pairs ({changed_note}, {time.time() - start_time:.2f}s)")
+
+        output_path = derived_dir / f"front_lines_{control_path.stem}.json"
+        print(f"Writing {output_path}...")
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(front_json, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Reconcile settlement point layers against the settlement polygons in one spatial join.
+
+For every point of each settlement point layer, finds the containing polygon
+(one batched STRtree query; where polygons overlap, the point's own sid wins, else the
+lowest sid) and, for points outside every polygon, the nearest polygon and its distance
+(one batched query_nearest call). Each point's own sid is normalized to the polygon sid
+form ("100013" -> "S100013") and compared with the join result.
+
+Statuses:
+  match             point lies in its own settlement
+  contained_other   point lies in a different settlement
+  outside_nearest   point lies outside every polygon; its own settlement is the nearest
+  outside_other     point lies outside every polygon; a different settlement is nearest
+  unknown_sid       the point's sid has no polygon
+
+settlement_points_from_excel.geojson is not reconciled by default: its sids are
+settlements_meta.csv row keys ("<mid>:<row>", e.g. "1012045:10") with no mapping to polygon
+sids, and every point is a synthetic placement in a different coordinate space, so all of
+its points would come out unknown_sid. It can still be passed with --points.
+
+Writes settlement_points_reconciliation.json (per-layer summary plus the non-matching points)
+and settlement_points_reconciliation.csv (the non-matching points only).
+
+Usage:
+  python tools/map_build/reconcile_points.py [derived_dir] [--points settlement_points.geojson ...]
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from adjacency import (
+    STRtree,
+    iter_geojson_features,
+    load_polygons_cached,
+    np,
+    shapely,
+    sid_ranks,
+)
+
+
+# settlement_points_from_excel.geojson is left out: its "<mid>:<row>" sids have no polygon (see above)
+DEFAULT_POINT_LAYERS = (
+    "settlement_points.geojson",
+    "settlement_points_rekeyed.geojson",
+)
+STATUSES = ("match", "contained_other", "outside_nearest", "outside_other", "unknown_sid")
+CSV_COLUMNS = ("layer", "index", "point_sid", "sid", "x", "y", "status", "containing_sid", "nearest_sid", "distance")
+
+
+def normalize_sid(raw: object) -> str:
+    """Point-layer sid in polygon form: bare census numbers gain the "S" prefix."""
+    sid = str(raw or "").strip()
+    return f"S{sid}" if sid.isdigit() else sid
+
+
+def load_points(geojson_path: Path) -> Tuple[List[str], "np.ndarray"]:
+    """Read a point layer as (raw sids, (N, 2) coordinates); features without a Point geometry are skipped."""
+    sids = []
+    coords = []
+    for feature in iter_geojson_features(geojson_path):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            continue
+        sids.append(str((feature.get("properties") or {}).get("sid", "")))
+        coords.append(geometry["coordinates"][:2])
+    return sids, np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+
+
+def spatial_join(tree: STRtree, poly_sids: List[str], ranks: "np.ndarray", coords: "np.ndarray", expected: "np.ndarray") -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+    """
+    Containing polygon index per point (-1 if none), preferring the expected polygon where
+    polygons overlap; nearest polygon index and distance for points outside every polygon
+    (-1 / nan for contained points). expected holds the polygon index of each point's own sid (-1 if unknown).
+    """
+    n = len(coords)
+    points = shapely.points(coords)
+    containing = np.full(n, -1, dtype=np.int64)
+    point_idx, poly_idx = tree.query(points, predicate="intersects")
+    if len(point_idx):
+        # Per point: its own polygon first, then the lowest sid
+        order = np.lexsort((ranks[poly_idx], poly_idx != expected[point_idx], point_idx))
+        point_idx, poly_idx = point_idx[order], poly_idx[order]
+        first = np.flatnonzero(np.r_[True, point_idx[1:] != point_idx[:-1]])
+        containing[point_idx[first]] = poly_idx[first]
+
+    nearest = np.full(n, -1, dtype=np.int64)
+    distance = np.full(n, np.nan)
+    outside = np.flatnonzero(containing < 0)
+    if len(outside):
+        (q, g), d = tree.query_nearest(points[outside], return_distance=True, all_matches=True)
+        # all_matches returns every equidistant polygon; keep the lowest sid per point
+        order = np.lexsort((ranks[g], q))
+        q, g, d = q[order], g[order], d[order]
+        first = np.flatnonzero(np.r_[True, q[1:] != q[:-1]])
+        nearest[outside[q[first]]] = g[first]
+        distance[outside[q[first]]] = d[first]
+    return containing, nearest, distance
+
+
+def reconcile_layer(layer: str, raw_sids: List[str], coords: "np.ndarray", tree: STRtree, poly_sids: List[str], ranks: "np.ndarray") -> Tuple[dict, List[dict]]:
+    """Join one point layer against the polygons; returns (summary, non-matching rows)."""
+    index_of = {sid: i for i, sid in enumerate(poly_sids)}
+    sids = [normalize_sid(raw) for raw in raw_sids]
+    expected = np.array([index_of.get(sid, -1) for sid in sids], dtype=np.int64)
+    containing, nearest, distance = spatial_join(tree, poly_sids, ranks, coords, expected)
+
+    status = np.where(
+        expected < 0, 4,
+        np.where(containing >= 0,
+                 np.where(containing == expected, 0, 1),
+                 np.where(nearest == expected, 2, 3))
+    )
+    counts = np.bincount(status, minlength=len(STATUSES))
+
+    # Polygons with no point of their own sid, and sids carried by more than one point
+    known = expected[expected >= 0]
+    per_polygon = np.bincount(known, minlength=len(poly_sids))
+    missing = [poly_sids[i] for i in np.flatnonzero(per_polygon == 0).tolist()]
+    duplicated = [poly_sids[i] for i in np.flatnonzero(per_polygon > 1).tolist()]
+
+    rows = []
+    for i in np.flatnonzero(status != 0).tolist():
+        rows.append({
+            "layer": layer,
+            "index": i,
+            "point_sid": raw_sids[i],
+            "sid": sids[i],
+            "x": round(float(coords[i, 0]), 4),
+            "y": round(float(coords[i, 1]), 4),
+            "status": STATUSES[status[i]],
+            "containing_sid": poly_sids[containing[i]] if containing[i] >= 0 else None,
+            "nearest_sid": poly_sids[nearest[i]] if nearest[i] >= 0 else None,
+            "distance": round(float(distance[i]), 4) if nearest[i] >= 0 else None
+        })
+
+    outside = distance[np.isfinite(distance)]
+    summary = {
+        "point_count": len(sids),
+        "status_counts": {name: int(counts[code]) for code, name in enumerate(STATUSES)},
+        "outside_distance_max": round(float(outside.max()), 4) if len(outside) else None,
+        "polygons_without_point_count": len(missing),
+        "polygons_without_point": missing,
+        "duplicated_sid_count": len(duplicated),
+        "duplicated_sids": duplicated
+    }
+    return summary, rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconcile settlement point layers against settlement polygons")
+    parser.add_argument(
+        "--points",
+        action="append",
+        default=None,
+        help=f"Point layer file name in derived_dir; repeat for several (default: {', '.join(DEFAULT_POINT_LAYERS)})"
+    )
+    parser.add_argument(
+        "--no-geometry-cache",
+        action="store_true",
+        help="Always parse settlements_polygons.geojson instead of using the binary geometry cache"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    polygons_path = derived_dir / "settlements_polygons.geojson"
+    json_path = derived_dir / "settlement_points_reconciliation.json"
+    csv_path = derived_dir / "settlement_points_reconciliation.csv"
+    if not polygons_path.exists():
+        print(f"ERROR: {polygons_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Loading geometries from {polygons_path}...")
+    polygons, _, _ = load_polygons_cached(polygons_path, property_keys=(), use_cache=not args.no_geometry_cache)
+    poly_sids = list(polygons.keys())
+    geoms = np.array([polygons[sid] for sid in poly_sids], dtype=object)
+    ranks = sid_ranks(poly_sids)
+    tree = STRtree(geoms)
+
+    layers = {}
+    all_rows = []
+    for name in args.points or DEFAULT_POINT_LAYERS:
+        path = derived_dir / name
+        if not path.exists():
+            print(f"WARNING: {path} not found, skipped", file=sys.stderr)
+            continue
+        start_time = time.time()
+        raw_sids, coords = load_points(path)
+        summary, rows = reconcile_layer(name, raw_sids, coords, tree, poly_sids, ranks)
+        layers[name] = summary
+        all_rows.extend(rows)
+        counts = ", ".join(f"{status}={count}" for status, count in summary["status_counts"].items())
+        print(f"  {name}: {summary['point_count']} points, {counts} ({time.time() - start_time:.2f}s)")
+
+    reconciliation_json = {
+        "version": "1.0.0",
+        "polygon_count": len(poly_sids),
+        "layers": layers,
+        "mismatches": all_rows
+    }
+    print(f"Writing {json_path}...")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(reconciliation_json, f, indent=2, ensure_ascii=False)
+
+    print(f"Writing {len(all_rows)} non-matching points to {csv_path}...")
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_COLUMNS)
+        writer.writeheader()
+        for row in all_rows:
+            writer.writerow({key: "" if value is None else value for key, value in row.items()})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Topology-preserving multi-LOD simplification of the viewer settlement and municipality layers.
+
+Each layer is turned into its own shared arc table on its own quantization grid
+(export_topojson.select_quantization, which refines the grid like the exporter until no
+valid feature breaks; the layers are in different coordinate spaces), so
+every border is simplified exactly once and reused by the features on both sides: no gaps
+or overlaps open up between neighbours.
+
+Each arc vertex gets a Douglas-Peucker significance in one vectorized pass over all arcs
+(dp_significance): the largest tolerance at which Douglas-Peucker would still keep it.
+A level of detail first applies a single global threshold chosen so the kept vertices fit
+a vertex budget, which makes every level nested in the previous one. Budgets are fractions
+of the layer's total arc vertex count. Arcs that form a ring on their own keep two interior
+vertices and arcs of two-arc rings keep one, so no ring collapses to a line.
+
+The settlement fabric is a tessellation: most arc endpoints are nodes where three
+settlements meet, and a budget below the node share cannot be met by removing interior
+vertices. Below it, the shortest straight arcs are collapsed and their end nodes merged
+(collapse_arcs), keeping rings at three vertices or more; below that floor (about 40% of
+the settlement arc vertices) the smallest settlements vanish from the level unless
+--keep-features is given. Vanished features are listed per level in the report.
+
+Usage:
+  python tools/map_build/simplify_lods.py [derived_dir] [--budgets 1,0.25,0.0625] [--quantization 100000] [--keep-features]
+  Writes viewer_topology_<layer>_lod<N>.json per layer and budget, and simplification_report.json
+  with vertex counts, invalid feature counts, sizes and timings per layer and level.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+from adjacency import np, shapely
+from export_topojson import (
+    DEFAULT_QUANTIZATION,
+    VIEWER_LAYERS,
+    select_quantization,
+    decode_feature,
+    load_layer,
+    topology_document,
+)
+
+
+def dp_significance(coords: "np.ndarray", offsets: "np.ndarray") -> "np.ndarray":
+    """
+    Douglas-Peucker significance of every vertex of every line in the ragged (coords, offsets)
+    layout: the largest tolerance at which Douglas-Peucker keeps it (endpoints inf).
+
+    Level-synchronous, as coordinate_transform.ring_significance: each pass computes the
+    distances of the interior vertices of all pending segments of all lines at once and
+    splits every segment at its first farthest vertex.
+    """
+    significance = np.zeros(len(coords))
+    lengths = np.diff(offsets)
+    significance[offsets[:-1][lengths > 0]] = np.inf
+    significance[offsets[1:][lengths > 0] - 1] = np.inf
+
+    lines = lengths >= 3
+    start = offsets[:-1][lines]
+    end = offsets[1:][lines] - 1
+    parent = np.full(len(start), np.inf)
+    x = coords[:, 0]
+    y = coords[:, 1]
+    while len(start):
+        interior = end - start - 1
+        segment = np.repeat(np.arange(len(start)), interior)
+        first = np.cumsum(interior) - interior
+        index = start[segment] + 1 + (np.arange(len(segment)) - first[segment])
+
+        x1 = x[start][segment]
+        y1 = y[start][segment]
+        dx = x[end][segment] - x1
+        dy = y[end][segment] - y1
+        den = np.hypot(dx, dy)
+        # Closed arcs: distance to the shared endpoint
+        distance = np.where(
+            den > 0,
+            np.abs(dy * (x[index] - x1) - dx * (y[index] - y1)) / np.where(den > 0, den, 1.0),
+            np.hypot(x[index] - x1, y[index] - y1)
+        )
+
+        farthest = np.maximum.reduceat(distance, first)
+        hits = np.flatnonzero(distance == farthest[segment])
+        hits = hits[np.r_[True, segment[hits][1:] != segment[hits][:-1]]]
+        split = index[hits]
+        # Clamped to the parent so significance never increases down the split tree
+        value = np.minimum(farthest, parent)
+        significance[split] = value
+
+        start, end, parent = (
+            np.concatenate([start, split]),
+            np.concatenate([split, end]),
+            np.concatenate([value, value])
+        )
+        pending = end - start >= 2
+        start, end, parent = start[pending], end[pending], parent[pending]
+    return significance
+
+
+def arc_significance(arcs: List["np.ndarray"]) -> List["np.ndarray"]:
+    """
+    Douglas-Peucker significance of every vertex of every arc (endpoints inf), computed in
+    one ragged pass; keeping the vertices with significance > tolerance gives exactly the
+    Douglas-Peucker result for that tolerance. Returns one array (a view) per arc.
+    """
+    lengths = np.array([len(arc) for arc in arcs], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    coords = np.concatenate(arcs).astype(np.float64) if arcs else np.empty((0, 2))
+    significance = dp_significance(coords, offsets)
+    return np.split(significance, offsets[1:-1])
+
+
+def protect_thin_rings(topology: dict, significance: List["np.ndarray"]) -> None:
+    """
+    Keep rings made of one or two arcs from collapsing: single-arc rings keep their two most
+    significant interior vertices, arcs of two-arc rings their most significant one.
+    """
+    for parts in topology["objects"]:
+        for part in parts:
+            for ring in part:
+                if len(ring) > 2:
+                    continue
+                keep = 2 if len(ring) == 1 else 1
+                for ref in ring:
+                    sig = significance[~ref if ref < 0 else ref]
+                    interior = sig[1:-1]
+                    if len(interior) == 0:
+                        continue
+                    top = np.argsort(-interior, kind="stable")[:keep]
+                    interior[top] = np.inf
+
+
+def budget_threshold(significance: List["np.ndarray"], fraction: float) -> float:
+    """
+    Threshold keeping at most fraction of all arc vertices. Inf-significance vertices
+    (junctions, protected ring vertices) are always kept and count against the budget;
+    if they alone exceed it, no other vertex is kept. -1 keeps everything.
+    """
+    values = np.concatenate(significance) if significance else np.empty(0)
+    finite = np.sort(values[np.isfinite(values)])[::-1]
+    fixed = len(values) - len(finite)
+    keep = max(0, int(round(fraction * len(values))) - fixed)
+    if keep >= len(finite):
+        return -1.0
+    # Keep vertices strictly above the (keep + 1)-th largest significance
+    return float(finite[keep])
+
+
+def simplify_arcs(arcs: List["np.ndarray"], significance: List["np.ndarray"], threshold: float) -> List["np.ndarray"]:
+    """Arcs reduced to the vertices whose significance exceeds threshold."""
+    return [arc[sig > threshold] for arc, sig in zip(arcs, significance)]
+
+
+def collapse_arcs(topology: dict, arcs: List["np.ndarray"], target: int, drop_rings: bool = True) -> Tuple[List["np.ndarray"], List[list]]:
+    """
+    Second stage below the junction count: collapse straight two-vertex arcs, shortest first,
+    merging their two end nodes at the midpoint, until the arc vertex count fits target.
+
+    Every arc keeps its references through the shared nodes, so neighbours move together and
+    no gap opens. A collapse is skipped when another arc with interior vertices joins the same
+    two nodes (it would become a loop); straight arcs joining them collapse along with it.
+    The first pass keeps every ring at three vertices or more. If target is still not met
+    and drop_rings is set, a second pass lets rings shrink away: the smallest features
+    vanish from the level and their neighbours close over them. The order does not depend
+    on target, so lower budgets collapse a superset of the arcs of higher ones.
+    Returns (arcs, objects) with collapsed arcs and vanished rings removed, references renumbered.
+    """
+    count = sum(len(arc) for arc in arcs)
+    if count <= target:
+        return arcs, topology["objects"]
+
+    ends = np.array([[arc[0], arc[-1]] for arc in arcs], dtype=np.int64).reshape(-1, 2)
+    nodes, node_of = np.unique(ends, axis=0, return_inverse=True)
+    node_of = node_of.reshape(-1, 2)
+    position = nodes.astype(np.float64)
+    parent = list(range(len(nodes)))
+    incident = [[] for _ in range(len(nodes))]
+    for a, (u, v) in enumerate(node_of.tolist()):
+        incident[u].append(a)
+        incident[v].append(a)
+
+    ring_size = []
+    arc_rings = [[] for _ in arcs]
+    for parts in topology["objects"]:
+        for part in parts:
+            for ring in part:
+                for ref in ring:
+                    arc_rings[~ref if ref < 0 else ref].append(len(ring_size))
+                ring_size.append(sum(len(arcs[~ref if ref < 0 else ref]) - 1 for ref in ring))
+
+    def find(node: int) -> int:
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    straight = np.array([len(arc) == 2 for arc in arcs]) & (node_of[:, 0] != node_of[:, 1])
+    candidates = np.flatnonzero(straight)
+    lengths = np.hypot(*(nodes[node_of[candidates, 1]] - nodes[node_of[candidates, 0]]).T)
+    order = candidates[np.argsort(lengths, kind="stable")].tolist()
+    collapsed = np.zeros(len(arcs), dtype=bool)
+    for min_ring_size in ((3, 0) if drop_rings else (3,)):
+        for a in order:
+            if count <= target:
+                break
+            if collapsed[a]:
+                continue
+            ru, rv = find(node_of[a, 0]), find(node_of[a, 1])
+            if ru == rv:
+                continue
+            if len(incident[ru]) > len(incident[rv]):
+                ru, rv = rv, ru
+            # Live arcs joining the same two nodes
+            group = []
+            looped = False
+            for b in incident[ru]:
+                if collapsed[b] or b in group or {find(node_of[b, 0]), find(node_of[b, 1])} != {ru, rv}:
+                    continue
+                if len(arcs[b]) > 2:
+                    looped = True
+                    break
+                group.append(b)
+            if looped:
+                continue
+            loss = {}
+            for b in group:
+                for r in arc_rings[b]:
+                    loss[r] = loss.get(r, 0) + 1
+            if any(ring_size[r] - n < min_ring_size for r, n in loss.items()):
+                continue
+            for r, n in loss.items():
+                ring_size[r] -= n
+            collapsed[group] = True
+            count -= 2 * len(group)
+            parent[ru] = rv
+            position[rv] = (position[ru] + position[rv]) / 2
+            incident[rv].extend(incident[ru])
+            incident[ru] = []
+
+    if not collapsed.any():
+        return arcs, topology["objects"]
+    roots = np.array([find(node) for node in range(len(nodes))])
+    moved = np.rint(position[roots]).astype(np.int64)
+    renumber = np.cumsum(~collapsed) - 1
+    kept = []
+    for a in np.flatnonzero(~collapsed).tolist():
+        arc = arcs[a].copy()
+        arc[0] = moved[node_of[a, 0]]
+        arc[-1] = moved[node_of[a, 1]]
+        kept.append(arc)
+
+    objects = []
+    ring_id = 0
+    for parts in topology["objects"]:
+        new_parts = []
+        for part in parts:
+            new_part = []
+            for ring in part:
+                if ring_size[ring_id] >= 3:
+                    new_part.append([
+                        int(~renumber[~ref]) if ref < 0 else int(renumber[ref])
+                        for ref in ring if not collapsed[~ref if ref < 0 else ref]
+                    ])
+                elif not new_part:
+                    # A vanished exterior takes its holes with it
+                    ring_id += len(part)
+                    break
+                ring_id += 1
+            if new_part:
+                new_parts.append(new_part)
+        objects.append(new_parts)
+    return kept, objects
+
+
+def ring_vertex_counts(topology: dict, arcs: List["np.ndarray"]) -> "np.ndarray":
+    """Vertex count per feature (arcs in a ring share their endpoints; closing vertex not counted)."""
+    arc_lengths = np.array([len(arc) - 1 for arc in arcs], dtype=np.int64)
+    return np.array([
+        sum(int(arc_lengths[~ref if ref < 0 else ref]) for part in parts for ring in part for ref in ring)
+        for parts in topology["objects"]
+    ], dtype=np.int64)
+
+
+def parse_budgets(text: str) -> List[float]:
+    budgets = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        value = float(part)
+        if not 0 < value <= 1:
+            raise ValueError(f"Budget must be in (0, 1]: {part}")
+        budgets.append(value)
+    if not budgets:
+        raise ValueError("No budgets given")
+    return sorted(set(budgets), reverse=True)
+
+
+def simplify_layer(name: str, id_field: str, ids: List[str], geoms: List[object], properties: List[dict], budgets: List[float], quantization: int, derived_dir: Path, drop_rings: bool = True) -> dict:
+    """Build one layer's topology, write one viewer_topology_<layer>_lod<N>.json per budget; returns the layer's report entry."""
+    print(f"Building {name} topology (quantization {quantization})...")
+    start_time = time.time()
+    max_quantization = 16 * quantization
+    quantization, topology, degenerate, invalid = select_quantization(geoms, quantization, max_quantization)
+    arcs = topology["arcs"]
+    topology_seconds = time.time() - start_time
+    if degenerate:
+        print(f"WARNING: {len(degenerate)} {name} feature(s) collapsed under quantization and were kept as "
+              f"degenerate arcs: {', '.join(ids[i] for i in degenerate[:10])}", file=sys.stderr)
+    if invalid:
+        print(f"WARNING: {len(invalid)} valid {name} feature(s) are invalid on every grid up to "
+              f"{max_quantization}: {', '.join(ids[i] for i in invalid[:10])}", file=sys.stderr)
+
+    start_time = time.time()
+    significance = arc_significance(arcs)
+    protect_thin_rings(topology, significance)
+    significance_seconds = time.time() - start_time
+    total_vertices = sum(len(arc) for arc in arcs)
+    removable = int(sum(np.isfinite(sig).sum() for sig in significance))
+    print(f"  {len(arcs)} arcs, {total_vertices} arc vertices ({removable} removable, "
+          f"{total_vertices - removable} junction or protected) "
+          f"(topology {topology_seconds:.1f}s, significance {significance_seconds:.2f}s)")
+
+    source_valid = shapely.is_valid(np.array([geoms[i] for i in topology["sids"]], dtype=object))
+    levels = []
+    for lod, budget in enumerate(budgets):
+        start_time = time.time()
+        target = int(round(budget * total_vertices))
+        threshold = budget_threshold(significance, budget)
+        simplified = simplify_arcs(arcs, significance, threshold)
+        simplified, objects = collapse_arcs(topology, simplified, target, drop_rings)
+        level_topology = dict(topology, objects=objects)
+        document = topology_document(name, ids, properties, level_topology, simplified, id_field)
+        document["awwv_meta"] = {
+            "role": "viewer_topology_lod",
+            "version": "1.0.0",
+            "object": name,
+            "lod": lod,
+            "vertex_budget": budget,
+            "dp_tolerance": None if threshold < 0 else round(threshold * max(topology["transform"]["scale"]), 9),
+            "quantization": quantization
+        }
+        encoded = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+        output_path = derived_dir / f"viewer_topology_{name}_lod{lod}.json"
+        with open(output_path, 'wb') as f:
+            f.write(encoded)
+        seconds = time.time() - start_time
+
+        arc_vertices = int(sum(len(arc) for arc in simplified))
+        decoded = np.array([decode_feature(parts, simplified, topology["transform"]) for parts in objects], dtype=object)
+        invalid = ~shapely.is_valid(decoded)
+        level = {
+            "lod": lod,
+            "path": output_path.name,
+            "vertex_budget": budget,
+            "target_vertex_count": target,
+            "arc_vertex_count": arc_vertices,
+            "kept_fraction": round(arc_vertices / total_vertices, 6) if total_vertices else 1.0,
+            "arc_count": len(simplified),
+            "collapsed_arc_count": len(arcs) - len(simplified),
+            "target_met": arc_vertices <= target,
+            "vanished_features": [ids[i] for i, before, after in zip(topology["sids"], topology["objects"], objects) if before and not after],
+            "feature_vertex_count": int(ring_vertex_counts(level_topology, simplified).sum()),
+            "invalid_feature_count": int(invalid.sum()),
+            "newly_invalid_feature_count": int((invalid & source_valid).sum()),
+            "bytes": len(encoded),
+            "seconds": round(seconds, 3)
+        }
+        levels.append(level)
+        print(f"  LOD {lod} (budget {budget:g}): {arc_vertices} arc vertices ({level['kept_fraction']:.1%}), "
+              f"{level['collapsed_arc_count']} arcs collapsed, {len(level['vanished_features'])} features vanished, "
+              f"{level['feature_vertex_count']} feature vertices, {level['invalid_feature_count']} invalid "
+              f"({level['newly_invalid_feature_count']} newly); {len(encoded)} bytes in {seconds:.2f}s")
+        if not level["target_met"]:
+            print(f"WARNING: {name} LOD {lod}: budget {budget:g} ({target} vertices) not met; the remaining "
+                  f"arcs cannot collapse{'' if drop_rings else ' without dropping rings'}", file=sys.stderr)
+
+    return {
+        "quantization": quantization,
+        "feature_count": len(ids),
+        "arc_count": len(arcs),
+        "arc_vertex_count": total_vertices,
+        "removable_vertex_count": removable,
+        "degenerate_features": [ids[i] for i in degenerate],
+        "topology_seconds": round(topology_seconds, 3),
+        "significance_seconds": round(significance_seconds, 3),
+        "levels": levels
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Simplify the viewer layers on shared arcs into several levels of detail")
+    parser.add_argument(
+        "--budgets",
+        default="1,0.25,0.0625",
+        help="Comma-separated vertex budgets as fractions of each layer's arc vertex count (default: 1,0.25,0.0625)"
+    )
+    parser.add_argument(
+        "--quantization",
+        type=int,
+        default=DEFAULT_QUANTIZATION,
+        help=f"Grid steps across each layer's bounding box (default: {DEFAULT_QUANTIZATION})"
+    )
+    parser.add_argument(
+        "--keep-features",
+        action="store_true",
+        help="Never let a ring shrink away to meet a budget (budgets may then be missed)"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    try:
+        budgets = parse_budgets(args.budgets)
+    except ValueError as e:
+        parser.error(f"--budgets: {e}")
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    report_path = derived_dir / "simplification_report.json"
+
+    layers = {}
+    for name, filename, id_field in VIEWER_LAYERS:
+        path = derived_dir / filename
+        if not path.exists():
+            print(f"ERROR: {path} not found", file=sys.stderr)
+            sys.exit(1)
+        print(f"Loading {name} from {path}...")
+        ids, geoms, properties = load_layer(path, id_field)
+        layers[name] = simplify_layer(name, id_field, ids, geoms, properties, budgets, args.quantization, derived_dir, not args.keep_features)
+
+    report = {
+        "version": "1.0.0",
+        "quantization": args.quantization,
+        "budgets": budgets,
+        "keep_features": args.keep_features,
+        "layers": layers
+    }
+    print(f"Writing simplification report to {report_path}...")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
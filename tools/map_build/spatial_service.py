@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Long-running spatial query service over the settlement geometries.
+
+Loads settlements_polygons.geojson once (load_polygons_cached), builds one STRtree and
+answers batched queries from memory, so dev tools no longer reload and scan the GeoJSON
+for every lookup.
+
+Queries (every query is a batch; results are returned in input order):
+  {"op": "point", "points": [[x, y], ...]}
+      settlement containing each point (lowest sid on overlaps), or null
+  {"op": "knn", "points": [[x, y], ...], "k": 3}
+      k nearest settlements per point, with distances (0 for containing settlements)
+  {"op": "bbox", "boxes": [[minx, miny, maxx, maxy], ...]}
+      settlements intersecting each box, sorted by sid
+  {"op": "within", "points": [[x, y], ...], "distance": 1.0}
+      settlements within distance of each point, with distances, nearest first
+A request may also carry {"queries": [...]} to run several queries in one round trip.
+
+Transports:
+  HTTP (default): POST the request JSON to http://127.0.0.1:8765/query; GET /health.
+  Unix socket (--unix PATH): one JSON request per line, one JSON response per line.
+
+Usage:
+  python tools/map_build/spatial_service.py [derived_dir] [--geojson PATH] [--port 8765] [--unix /tmp/awwv_spatial.sock]
+  curl -s -d '{"op": "point", "points": [[670.9, 280.1]]}' http://127.0.0.1:8765/query
+"""
+
+import argparse
+import json
+import os
+import socketserver
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from adjacency import (
+    STRtree,
+    load_polygons_cached,
+    np,
+    shapely,
+    sid_ranks,
+)
+
+
+DEFAULT_PORT = 8765
+MAX_K = 100
+
+
+class SpatialIndex:
+    """Memory-resident STRtree over settlement geometries with batched query methods."""
+
+    def __init__(self, polygons: Dict[str, object]):
+        self.sids = list(polygons.keys())
+        self.geoms = np.array([polygons[sid] for sid in self.sids], dtype=object)
+        self.ranks = sid_ranks(self.sids)
+        self.tree = STRtree(self.geoms)
+        self.tree.query(self.geoms[:1])  # STRtree builds lazily on first query
+        # Typical settlement width, used as the knn search radius step
+        self.cell_size = float(np.sqrt(shapely.area(self.geoms).mean())) if len(self.geoms) else 1.0
+
+    def _points(self, points: Sequence[Sequence[float]]) -> "np.ndarray":
+        coords = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return shapely.points(coords)
+
+    def _group(self, count: int, query_idx: "np.ndarray", geom_idx: "np.ndarray", distances: Optional["np.ndarray"] = None) -> List[dict]:
+        """Split flat (query, geometry) hit arrays into one result per query, ordered by distance then sid."""
+        # np.lexsort sorts by the last key first
+        if distances is None:
+            order = np.lexsort((self.ranks[geom_idx], query_idx))
+        else:
+            order = np.lexsort((self.ranks[geom_idx], distances, query_idx))
+        query_idx, geom_idx = query_idx[order], geom_idx[order]
+        if distances is not None:
+            distances = distances[order]
+        bounds = np.searchsorted(query_idx, np.arange(count + 1))
+        results = []
+        for q in range(count):
+            hits = geom_idx[bounds[q]:bounds[q + 1]]
+            result = {"sids": [self.sids[i] for i in hits.tolist()]}
+            if distances is not None:
+                result["distances"] = np.round(distances[bounds[q]:bounds[q + 1]], 6).tolist()
+            results.append(result)
+        return results
+
+    def point(self, points: Sequence[Sequence[float]]) -> List[Optional[str]]:
+        """Settlement containing each point (lowest sid where settlements overlap), or None."""
+        geoms = self._points(points)
+        query_idx, geom_idx = self.tree.query(geoms, predicate="intersects")
+        best = {}
+        for q, g in zip(query_idx.tolist(), geom_idx.tolist()):
+            if q not in best or self.ranks[g] < self.ranks[best[q]]:
+                best[q] = g
+        return [self.sids[best[q]] if q in best else None for q in range(len(geoms))]
+
+    def knn(self, points: Sequence[Sequence[float]], k: int) -> List[dict]:
+        """
+        k nearest settlements per point. The first neighbour comes from one query_nearest call;
+        the rest from dwithin queries starting about sqrt(k) settlement widths beyond it, with
+        the radius doubling until k settlements are inside it (then the k nearest are exactly
+        the k closest hits).
+        """
+        geoms = self._points(points)
+        n = len(geoms)
+        k = max(1, min(k, len(self.sids)))
+        (q_idx, _), nearest = self.tree.query_nearest(geoms, return_distance=True, all_matches=False)
+        radius = np.zeros(n)
+        radius[q_idx] = nearest
+        radius += self.cell_size * np.sqrt(k)
+
+        found_q = []
+        found_g = []
+        found_d = []
+        pending = np.arange(n)
+        while len(pending):
+            q, g = self.tree.query(geoms[pending], predicate="dwithin", distance=radius[pending])
+            q = pending[q]
+            d = shapely.distance(geoms[q], self.geoms[g])
+            counts = np.bincount(q, minlength=n)[pending]
+            done = counts >= k
+            keep = np.isin(q, pending[done])
+            found_q.append(q[keep])
+            found_g.append(g[keep])
+            found_d.append(d[keep])
+            pending = pending[~done]
+            radius[pending] *= 2
+
+        q = np.concatenate(found_q) if found_q else np.empty(0, dtype=np.int64)
+        g = np.concatenate(found_g) if found_g else np.empty(0, dtype=np.int64)
+        d = np.concatenate(found_d) if found_d else np.empty(0)
+        results = self._group(n, q, g, d)
+        for result in results:
+            result["sids"] = result["sids"][:k]
+            result["distances"] = result["distances"][:k]
+        return results
+
+    def bbox(self, boxes: Sequence[Sequence[float]]) -> List[dict]:
+        """Settlements intersecting each (minx, miny, maxx, maxy) box, sorted by sid."""
+        coords = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        geoms = shapely.box(coords[:, 0], coords[:, 1], coords[:, 2], coords[:, 3])
+        query_idx, geom_idx = self.tree.query(geoms, predicate="intersects")
+        return self._group(len(geoms), query_idx, geom_idx)
+
+    def within(self, points: Sequence[Sequence[float]], distance: float) -> List[dict]:
+        """Settlements within distance of each point, nearest first."""
+        geoms = self._points(points)
+        query_idx, geom_idx = self.tree.query(geoms, predicate="dwithin", distance=distance)
+        distances = shapely.distance(geoms[query_idx], self.geoms[geom_idx])
+        return self._group(len(geoms), query_idx, geom_idx, distances)
+
+    def handle(self, request: dict) -> dict:
+        """Run one request dict (a single query, or {"queries": [...]}) and return the response dict."""
+        if not isinstance(request, dict):
+            return {"error": "request must be a JSON object"}
+        if "queries" in request:
+            return {"results": [self.handle(query) for query in request["queries"]]}
+        start = time.perf_counter()
+        op = request.get("op")
+        try:
+            if op == "point":
+                results = self.point(request["points"])
+            elif op == "knn":
+                k = int(request.get("k", 1))
+                if not 1 <= k <= MAX_K:
+                    raise ValueError(f"k must be between 1 and {MAX_K}")
+                results = self.knn(request["points"], k)
+            elif op == "bbox":
+                results = self.bbox(request["boxes"])
+            elif op == "within":
+                results = self.within(request["points"], float(request["distance"]))
+            else:
+                raise ValueError(f"unknown op: {op!r} (expected point, knn, bbox or within)")
+        except (KeyError, TypeError, ValueError) as e:
+            return {"op": op, "error": str(e) if not isinstance(e, KeyError) else f"missing field {e}"}
+        return {"op": op, "results": results, "elapsed_ms": round((time.perf_counter() - start) * 1000, 3)}
+
+
+def make_http_handler(index: SpatialIndex):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: dict) -> None:
+            payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_GET(self) -> None:
+            if self.path == "/health":
+                self._send(200, {"status": "ok", "settlements": len(index.sids)})
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            if self.path != "/query":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+            except (ValueError, json.JSONDecodeError) as e:
+                self._send(400, {"error": f"invalid JSON: {e}"})
+                return
+            response = index.handle(request)
+            self._send(400 if "error" in response else 200, response)
+
+        def log_message(self, format: str, *args) -> None:
+            pass  # Keep the console quiet; this is a local dev service
+
+    return Handler
+
+
+def make_unix_handler(index: SpatialIndex):
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    response = index.handle(json.loads(line))
+                except json.JSONDecodeError as e:
+                    response = {"error": f"invalid JSON: {e}"}
+                self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b"\n")
+                self.wfile.flush()
+
+    return Handler
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve batched point/knn/bbox/within queries over the settlement geometries")
+    parser.add_argument(
+        "--geojson",
+        type=Path,
+        default=None,
+        help="Settlement GeoJSON to index (default: <derived_dir>/settlements_polygons.geojson)"
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="HTTP bind address (default: 127.0.0.1)"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"HTTP port (default: {DEFAULT_PORT})"
+    )
+    parser.add_argument(
+        "--unix",
+        type=Path,
+        default=None,
+        help="Listen on this Unix socket (newline-delimited JSON) instead of HTTP"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    geojson_path = args.geojson or derived_dir / "settlements_polygons.geojson"
+    if not geojson_path.exists():
+        print(f"ERROR: {geojson_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Loading geometries from {geojson_path}...")
+    start_time = time.time()
+    polygons, _, invalid_geometry_count = load_polygons_cached(geojson_path, property_keys=())
+    index = SpatialIndex(polygons)
+    print(f"Indexed {len(index.sids)} settlements in {time.time() - start_time:.1f}s")
+    if invalid_geometry_count > 0:
+        print(f"WARNING: Skipped {invalid_geometry_count} invalid geometry feature(s)", file=sys.stderr)
+
+    if args.unix:
+        if args.unix.exists():
+            os.unlink(args.unix)
+        server = ThreadingUnixServer(str(args.unix), make_unix_handler(index))
+        print(f"Listening on unix:{args.unix}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), make_http_handler(index))
+        print(f"Listening on http://{args.host}:{args.port}/query")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.unix and args.unix.exists():
+            os.unlink(args.unix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Build an arc-node planar topology (TopoJSON-style arcs) over settlements_polygons.geojson.
+
+Coordinates are quantized to an integer grid, rings are split at junction vertices
+(vertices whose neighbours differ between the rings that use them), and shared arcs are
+de-duplicated by their canonical vertex sequence. Every arc records the settlement on its
+left and right side, so adjacency, shared border lengths, front lines and dissolves become
+lookups in the arc table instead of geometry operations.
+
+Rings are oriented so the owning settlement always lies to the left of the ring
+(exteriors counter-clockwise, holes clockwise); a ring that uses an arc forwards owns
+its left side, a ring that uses it reversed (~index, as in TopoJSON) owns its right side.
+
+Usage:
+  python tools/map_build/topology.py [derived_dir] [--quantization 1000000]
+  Writes settlement_topology.json and prints arc/junction statistics, including how many
+  settlement_edges.json line/touch edges are backed by a shared arc.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from adjacency import (
+    MultiPolygon,
+    file_sha256,
+    load_polygons_cached,
+    np,
+    shapely,
+    split_segments_at_vertices,
+)
+
+
+TOPOLOGY_VERSION = "1.0.0"
+DEFAULT_QUANTIZATION = 1_000_000
+
+
+def quantization_transform(geoms: "np.ndarray", quantization: int) -> dict:
+    """
+    TopoJSON transform mapping the geometries' bounding box onto a quantization x quantization grid.
+    Quantized x = round((x - translate[0]) / scale[0]); same for y.
+    """
+    x0, y0, x1, y1 = shapely.total_bounds(geoms).tolist()
+    kx = (x1 - x0) / (quantization - 1) if x1 > x0 else 1.0
+    ky = (y1 - y0) / (quantization - 1) if y1 > y0 else 1.0
+    return {"scale": [kx, ky], "translate": [x0, y0]}
+
+
+def iter_rings(geom) -> Iterator[Tuple[int, int, "np.ndarray"]]:
+    """Yield (part, ring, coords) for every ring of a Polygon/MultiPolygon; ring 0 is the exterior."""
+    parts = geom.geoms if isinstance(geom, MultiPolygon) else [geom]
+    for part_index, part in enumerate(parts):
+        yield part_index, 0, np.asarray(part.exterior.coords)[:, :2]
+        for ring_index, interior in enumerate(part.interiors, start=1):
+            yield part_index, ring_index, np.asarray(interior.coords)[:, :2]
+
+
+def quantize_ring(coords: "np.ndarray", transform: dict, is_exterior: bool) -> Optional["np.ndarray"]:
+    """
+    Quantize a closed ring to integer (x, y), drop repeated vertices and orient it so the
+    polygon lies to its left. Returns the open ring (no closing vertex), or None if it collapsed.
+    """
+    scale = np.array(transform["scale"])
+    translate = np.array(transform["translate"])
+    q = np.rint((coords - translate) / scale).astype(np.int64)
+    keep = np.ones(len(q), dtype=bool)
+    keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+    q = q[keep]
+    if len(q) > 1 and np.array_equal(q[0], q[-1]):
+        q = q[:-1]
+    if len(q) < 3:
+        return None
+    x, y = q[:, 0], q[:, 1]
+    doubled_area = int(np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))
+    if doubled_area == 0:
+        return None
+    if (doubled_area > 0) != is_exterior:
+        q = q[::-1]
+    return q
+
+
+def split_rings_at_vertices(rings: List["np.ndarray"]) -> List["np.ndarray"]:
+    """
+    Insert into every quantized open ring the vertices of other rings that lie on one of its
+    segments (T-junctions, within one grid step), with adjacency.split_segments_at_vertices.
+    Both sides of a shared border then carry the same vertices and are cut into the same arcs.
+    """
+    if not rings:
+        return rings
+    owner = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+    p = np.concatenate(rings).astype(np.float64)
+    q = np.concatenate([np.roll(ring, -1, axis=0) for ring in rings]).astype(np.float64)
+    p, _, owner = split_segments_at_vertices(p, q, owner, snap_grid=1.0)
+    # Sub-segments come back in segment order, so each ring's start points are its new vertices
+    return np.split(np.rint(p).astype(np.int64), np.flatnonzero(np.diff(owner)) + 1)
+
+
+def remove_spikes(ring: "np.ndarray") -> Optional["np.ndarray"]:
+    """
+    Remove zero-width spikes (a -> b -> a) and repeated vertices from an open quantized ring.
+    Thin spikes in the source become exact back-and-forth runs once T-junctions are inserted;
+    left in, the spike's arc would be claimed twice from the same side. None if the ring collapses.
+    """
+    while len(ring) >= 3:
+        keep = np.any(ring != np.roll(ring, 1, axis=0), axis=1)
+        ring = ring[keep]
+        spike = np.all(np.roll(ring, 1, axis=0) == np.roll(ring, -1, axis=0), axis=1)
+        if not spike.any():
+            break
+        # Drop the spike tips; their (now repeated) bases are merged on the next pass
+        ring = ring[~spike]
+    return ring if len(ring) >= 3 else None
+
+
+def find_junctions(keys: List["np.ndarray"]) -> "np.ndarray":
+    """
+    Sorted point keys of junction vertices, given each ring's point keys (x * key_base + y):
+    points used by rings with more than one distinct (previous, next) neighbour pair. Points
+    on a border shared by exactly two rings see the same neighbours from both sides and are
+    not junctions.
+    """
+    if not keys:
+        return np.empty(0, dtype=np.int64)
+    point = np.concatenate(keys)
+    prev = np.concatenate([np.roll(k, 1) for k in keys])
+    nxt = np.concatenate([np.roll(k, -1) for k in keys])
+    triples = np.stack([point, np.minimum(prev, nxt), np.maximum(prev, nxt)], axis=1)
+    distinct = np.unique(triples, axis=0)
+    points, counts = np.unique(distinct[:, 0], return_counts=True)
+    return points[counts > 1]
+
+
+def split_ring(keys: "np.ndarray", is_junction: "np.ndarray") -> List["np.ndarray"]:
+    """
+    Split an open ring of point keys at its junctions into arcs (index arrays into the ring,
+    both endpoints included). A ring without junctions becomes one closed arc starting at
+    its smallest key, so every ring using it produces the same canonical sequence.
+    """
+    n = len(keys)
+    junctions = np.flatnonzero(is_junction)
+    if len(junctions) == 0:
+        start = int(np.argmin(keys))
+        return [np.arange(start, start + n + 1) % n]
+    arcs = []
+    bounds = np.append(junctions, junctions[0] + n)
+    for begin, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        arcs.append(np.arange(begin, end + 1) % n)
+    return arcs
+
+
+def canonical_arc(keys: Tuple[int, ...]) -> Tuple[Tuple[int, ...], bool]:
+    """
+    Return (canonical key sequence, reversed) so an arc and its reverse share one table entry.
+    Closed arcs start and end at the same point in both directions, so the same rule applies.
+    """
+    backward = keys[::-1]
+    return (keys, False) if keys <= backward else (backward, True)
+
+
+def dissolve_internal_arcs(parts: List[List[List[int]]]) -> Tuple[List[List[List[int]]], List[int]]:
+    """
+    Remove arcs one feature uses in both directions, which happens when two of its parts
+    (or an exterior and its own hole) lie closer than a grid step and snap onto a common
+    border. Left in, the decoded parts would share an edge and the feature would be invalid;
+    the two rings are joined through the arc instead, and an arc used back and forth by one
+    ring is dropped from it. Other cases (an island touching a hole) are left alone.
+    Returns (parts, dissolved arc indices).
+    """
+    dissolved = []
+    while True:
+        uses = {}
+        for part_index, part in enumerate(parts):
+            for ring_index, ring in enumerate(part):
+                for position, ref in enumerate(ring):
+                    uses.setdefault(ref, (part_index, ring_index, position))
+        pair = next(((uses[ref], uses[~ref], ref) for ref in uses if ref >= 0 and ~ref in uses), None)
+        if pair is None:
+            return parts, dissolved
+        (p1, r1, i), (p2, r2, j), ref = pair
+        ring1 = parts[p1][r1]
+        ring2 = parts[p2][r2]
+        if (p1, r1) == (p2, r2):
+            i, j = min(i, j), max(i, j)
+            if j - i == 1 or (i == 0 and j == len(ring1) - 1):
+                # Back and forth in a row: a spike of whole arcs
+                parts[p1][r1] = [r for k, r in enumerate(ring1) if k not in (i, j)]
+            else:
+                return parts, dissolved
+        elif r1 == 0 and r2 == 0:
+            # Two exteriors: one polygon, holes of both
+            parts[p1][0] = ring1[:i] + ring2[j + 1:] + ring2[:j] + ring1[i + 1:]
+            parts[p1].extend(parts[p2][1:])
+            del parts[p2]
+        elif p1 == p2 and 0 in (r1, r2):
+            # An exterior and its own hole: the hole opens to the outside
+            exterior, hole = (i, j) if r1 == 0 else (j, i)
+            outer, inner = parts[p1][0], parts[p1][max(r1, r2)]
+            parts[p1][0] = outer[:exterior] + inner[hole + 1:] + inner[:hole] + outer[exterior + 1:]
+            del parts[p1][max(r1, r2)]
+        else:
+            return parts, dissolved
+        dissolved.append(ref)
+        parts = [part for part in parts if part and part[0]]
+
+
+def build_topology(polygons: Dict[str, object], quantization: int = DEFAULT_QUANTIZATION) -> dict:
+    """
+    Build the arc table for a sid -> Polygon/MultiPolygon mapping.
+
+    Returns a dict with:
+        sids: settlement ids in input order
+        transform: TopoJSON quantization transform
+        arcs: list of (k, 2) int64 arrays of quantized coordinates
+        left, right: int64 arrays, sid index owning each side of each arc (-1 = none)
+        lengths: arc lengths in source units
+        objects: per sid, a list of polygon parts, each a list of rings of arc references
+            (arc index, or ~index when the ring uses the arc reversed); exterior ring first,
+            parts whose exterior collapsed under quantization are left out
+        junction_count, dropped_ring_count, conflict_count, dissolved_arc_count: build statistics
+            (dissolved arcs were used both ways by one settlement, see dissolve_internal_arcs)
+    """
+    sids = list(polygons.keys())
+    geoms = np.array([polygons[sid] for sid in sids], dtype=object)
+    transform = quantization_transform(geoms, quantization)
+    key_base = quantization + 1
+
+    # Quantize and orient every ring
+    rings = []
+    ring_owner = []  # (sid index, part, ring)
+    dropped = 0
+    for sid_index, geom in enumerate(geoms):
+        dropped_parts = set()
+        for part_index, ring_index, coords in iter_rings(geom):
+            if part_index in dropped_parts:
+                continue
+            q = quantize_ring(coords, transform, ring_index == 0)
+            if q is None:
+                dropped += 1
+                if ring_index == 0:
+                    # Holes of a collapsed part have nothing to cut out of
+                    dropped_parts.add(part_index)
+                continue
+            rings.append(q)
+            ring_owner.append((sid_index, part_index, ring_index))
+
+    rings = split_rings_at_vertices(rings)
+    despiked = [remove_spikes(q) for q in rings]
+    collapsed = {owner[:2] for q, owner in zip(despiked, ring_owner) if q is None and owner[2] == 0}
+    kept = [q is not None and owner[:2] not in collapsed for q, owner in zip(despiked, ring_owner)]
+    dropped += kept.count(False)
+    ring_owner = [owner for owner, keep in zip(ring_owner, kept) if keep]
+    rings = [q for q, keep in zip(despiked, kept) if keep]
+    ring_keys = [q[:, 0] * key_base + q[:, 1] for q in rings]
+    junctions = find_junctions(ring_keys)
+    ring_offsets = np.cumsum([len(k) for k in ring_keys])[:-1]
+    junction_flags = np.split(np.isin(np.concatenate(ring_keys), junctions), ring_offsets) if rings else []
+
+    arc_index = {}
+    arcs = []
+    left = []
+    right = []
+    conflicts = 0
+    objects = [[] for _ in sids]
+    for q, keys, is_junction, (sid_index, part_index, ring_index) in zip(rings, ring_keys, junction_flags, ring_owner):
+        refs = []
+        for idx in split_ring(keys, is_junction):
+            canonical, reversed_ = canonical_arc(tuple(keys[idx].tolist()))
+            a = arc_index.get(canonical)
+            if a is None:
+                a = len(arcs)
+                arc_index[canonical] = a
+                arcs.append(q[idx][::-1] if reversed_ else q[idx])
+                left.append(-1)
+                right.append(-1)
+            # The ring's settlement lies to the left of its direction of travel
+            side = right if reversed_ else left
+            if side[a] == -1:
+                side[a] = sid_index
+            elif side[a] != sid_index:
+                conflicts += 1
+            refs.append(~a if reversed_ else a)
+        parts = objects[sid_index]
+        while len(parts) <= part_index:
+            parts.append([])
+        parts[part_index].append(refs)
+
+    # Parts whose exterior collapsed leave no rings behind
+    objects = [[part for part in parts if part] for parts in objects]
+    dissolved = 0
+    for sid_index, parts in enumerate(objects):
+        objects[sid_index], internal = dissolve_internal_arcs(parts)
+        for a in internal:
+            left[a] = right[a] = -1
+        dissolved += len(internal)
+
+    scale = np.array(transform["scale"])
+    lengths = np.array([
+        float(np.hypot(*(np.diff(arc, axis=0) * scale).T).sum()) for arc in arcs
+    ])
+
+    return {
+        "sids": sids,
+        "transform": transform,
+        "arcs": arcs,
+        "left": np.array(left, dtype=np.int64),
+        "right": np.array(right, dtype=np.int64),
+        "lengths": lengths,
+        "objects": objects,
+        "junction_count": int(len(junctions)),
+        "dropped_ring_count": dropped,
+        "conflict_count": conflicts,
+        "dissolved_arc_count": dissolved
+    }
+
+
+def shared_arc_lengths(topology: dict) -> Dict[Tuple[str, str], float]:
+    """Shared border length per settlement pair (sid1 < sid2), summed over arcs owned on both sides."""
+    sids = topology["sids"]
+    left, right, lengths = topology["left"], topology["right"], topology["lengths"]
+    both = (left >= 0) & (right >= 0) & (left != right)
+    shared = {}
+    for l, r, length in zip(left[both].tolist(), right[both].tolist(), lengths[both].tolist()):
+        pair = (sids[l], sids[r]) if sids[l] < sids[r] else (sids[r], sids[l])
+        shared[pair] = shared.get(pair, 0.0) + length
+    return shared
+
+
+def outer_boundary_arcs(topology: dict, sid_subset: Sequence[str]) -> List[int]:
+    """
+    Arcs separating sid_subset from everything else (including the outside): the boundary of
+    the dissolved subset, or a front line when sid_subset is one side's controlled settlements.
+    """
+    index_of = {sid: i for i, sid in enumerate(topology["sids"])}
+    member = np.zeros(len(topology["sids"]) + 1, dtype=bool)  # last slot: "no settlement"
+    member[[index_of[sid] for sid in sid_subset if sid in index_of]] = True
+    left_in = member[topology["left"]]
+    right_in = member[topology["right"]]
+    return np.flatnonzero(left_in != right_in).tolist()
+
+
+def topology_to_json(topology: dict, source_sha256: str, quantization: int) -> dict:
+    """Serialize build_topology output (arcs as absolute quantized coordinates)."""
+    sids = topology["sids"]
+    side = lambda i: sids[i] if i >= 0 else None
+    return {
+        "version": TOPOLOGY_VERSION,
+        "source_sha256": source_sha256,
+        "quantization": quantization,
+        "transform": topology["transform"],
+        "junction_count": topology["junction_count"],
+        "arc_count": len(topology["arcs"]),
+        "arcs": [arc.tolist() for arc in topology["arcs"]],
+        "arc_table": [
+            {"left": side(l), "right": side(r), "length": round(length, 6)}
+            for l, r, length in zip(topology["left"].tolist(), topology["right"].tolist(), topology["lengths"].tolist())
+        ],
+        "objects": {sid: topology["objects"][i] for i, sid in enumerate(sids)}
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build an arc-node topology over settlements_polygons.geojson")
+    parser.add_argument(
+        "--quantization",
+        type=int,
+        default=DEFAULT_QUANTIZATION,
+        help=f"Grid steps across the bounding box (default: {DEFAULT_QUANTIZATION})"
+    )
+    parser.add_argument(
+        "--no-geometry-cache",
+        action="store_true",
+        help="Always parse settlements_polygons.geojson instead of using the binary geometry cache"
+    )
+    parser.add_argument(
+        "derived_dir",
+        nargs="?",
+        help="Path to data/derived directory (optional)"
+    )
+    args = parser.parse_args()
+
+    if args.quantization < 2:
+        parser.error("--quantization must be at least 2")
+
+    if args.derived_dir:
+        derived_dir = Path(args.derived_dir)
+    else:
+        derived_dir = Path(__file__).resolve().parent.parent.parent / "data" / "derived"
+    polygons_path = derived_dir / "settlements_polygons.geojson"
+    edges_path = derived_dir / "settlement_edges.json"
+    topology_path = derived_dir / "settlement_topology.json"
+    if not polygons_path.exists():
+        print(f"ERROR: {polygons_path} not found", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Loading geometries from {polygons_path}...")
+    polygons, _, _ = load_polygons_cached(polygons_path, use_cache=not args.no_geometry_cache)
+
+    print(f"Building topology for {len(polygons)} settlements (quantization {args.quantization})...")
+    start_time = time.time()
+    topology = build_topology(polygons, args.quantization)
+    left, right = topology["left"], topology["right"]
+    shared = int(((left >= 0) & (right >= 0)).sum())
+    print(f"  {len(topology['arcs'])} arcs ({shared} shared, {len(topology['arcs']) - shared} outer), "
+          f"{topology['junction_count']} junctions in {time.time() - start_time:.1f}s")
+    if topology["dropped_ring_count"]:
+        print(f"WARNING: {topology['dropped_ring_count']} ring(s) collapsed under quantization and were dropped", file=sys.stderr)
+    if topology["conflict_count"]:
+        print(f"WARNING: {topology['conflict_count']} arc side(s) claimed by more than one settlement (overlaps)", file=sys.stderr)
+
+    if edges_path.exists():
+        with open(edges_path, 'r', encoding='utf-8') as f:
+            edges = {(e["a"], e["b"]) for e in json.load(f).get("edges", [])}
+        backed = set(shared_arc_lengths(topology))
+        print(f"  {len(backed & edges)} of {len(edges)} settlement edges share an arc; "
+              f"{len(backed - edges)} arc-sharing pairs are not in settlement_edges.json")
+
+    topology_json = topology_to_json(topology, file_sha256(polygons_path), args.quantization)
+    print(f"Writing topology to {topology_path}...")
+    with open(topology_path, 'w', encoding='utf-8') as f:
+        json.dump(topology_json, f, ensure_ascii=False, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    main()